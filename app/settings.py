@@ -1,7 +1,7 @@
 
 
 import os
-from decouple import config
+from decouple import Csv, config
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     'rest_framework',
     'rest_framework.authtoken',
@@ -36,7 +37,19 @@ INSTALLED_APPS = [
 
 AUTH_USER_MODEL = 'core.User'
 
+# Default page size of the paginated list endpoints, see recipe.pagination
+PAGE_SIZE = config('PAGE_SIZE', default=25, cast=int)
+
+# Proxies in front of the app whose X-Forwarded-For entries are trusted to
+# identify clients, e.g. for the login throttle. With 0 the client address is
+# REMOTE_ADDR, as the header is set by the client itself
+REST_FRAMEWORK = {
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
+}
+
 MIDDLEWARE = [
+    # first, so its timings cover the other middleware too
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,10 +90,150 @@ DATABASES = {
         'USER': config('USER'),
         'PASSWORD': config('PASSWORD'),
         'HOST': config('HOST'),
-        'PORT': config('PORT')
+        'PORT': config('PORT'),
+        # reuse a worker's connection for DB_CONN_MAX_AGE seconds (None keeps
+        # it open), checking it is alive before the first query of a request
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=lambda v: None if v == 'None' else int(v)),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
     }
 }
 
+# Per process connection pool instead of persistent connections, sized per
+# worker: workers * DB_POOL_MAX_SIZE must stay below the server's
+# max_connections. Needs psycopg 3 with psycopg_pool installed in place of
+# psycopg2; it is also the way to reuse connections under ASGI. Connections
+# are checked on checkout when DB_CONN_HEALTH_CHECKS is on.
+if config('DB_POOL', default=False, cast=bool):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            # seconds a request waits for a free connection before failing
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+            'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=3600, cast=float),
+            # requests allowed to queue for a connection, 0 is unbounded
+            'max_waiting': config('DB_POOL_MAX_WAITING', default=0, cast=int),
+        },
+    }
+
+# Read replicas as DB_REPLICAS=host[:port],... with the primary's name and
+# credentials. Recipe, tag and ingredient reads go to a random replica,
+# except for users who wrote within REPLICA_PIN_SECONDS; pins are kept in
+# the CONTENT_VERSION_CACHE_ALIAS cache, which must be shared by all workers.
+DATABASE_REPLICAS = []
+for i, replica in enumerate(config('DB_REPLICAS', default='', cast=Csv())):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica_{i}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{i}')
+
+DATABASE_ROUTERS = ['core.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# Set CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and
+# CACHE_LOCATION=redis://host:6379 to share the cache between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+RECIPE_CACHE_ALIAS = config('RECIPE_CACHE_ALIAS', default='default')
+RECIPE_CACHE_TIMEOUT = config('RECIPE_CACHE_TIMEOUT', default=60 * 60, cast=int)
+CONTENT_VERSION_CACHE_ALIAS = config('CONTENT_VERSION_CACHE_ALIAS', default='default')
+
+# Token authentication cache. The default is per process, so with several workers
+# set TOKEN_CACHE_ALIAS to a shared cache for deleted tokens and deactivated users
+# to be rejected by every worker at once.
+TOKEN_CACHE_ALIAS = config('TOKEN_CACHE_ALIAS', default='')
+TOKEN_CACHE_TTL = config('TOKEN_CACHE_TTL', default=60, cast=int)
+TOKEN_CACHE_MAX_SIZE = config('TOKEN_CACHE_MAX_SIZE', default=10000, cast=int)
+
+
+# Serve recipe list/detail and users/me GETs from async views, for ASGI
+# deployments; ORM work of one process is capped at ASYNC_DB_CONCURRENCY
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+ASYNC_DB_CONCURRENCY = config('ASYNC_DB_CONCURRENCY', default=32, cast=int)
+
+
+# Request instrumentation: Server-Timing headers and /api/metrics/ histograms,
+# requests slower than PERF_SLOW_REQUEST_MS are logged to core.performance
+# with their first PERF_CAPTURED_QUERIES queries, and the stack of those
+# slower than PERF_SLOW_QUERY_MS, at most once per route and interval
+PERF_INSTRUMENTATION = config('PERF_INSTRUMENTATION', default=True, cast=bool)
+PERF_SLOW_REQUEST_MS = config('PERF_SLOW_REQUEST_MS', default=1000, cast=int)
+PERF_SLOW_QUERY_MS = config('PERF_SLOW_QUERY_MS', default=100, cast=int)
+PERF_SLOW_SAMPLE_RATE = config('PERF_SLOW_SAMPLE_RATE', default=1.0, cast=float)
+PERF_SLOW_SAMPLE_INTERVAL = config('PERF_SLOW_SAMPLE_INTERVAL', default=60, cast=int)
+PERF_CAPTURED_QUERIES = config('PERF_CAPTURED_QUERIES', default=50, cast=int)
+# Metrics live in each process. With several workers set PERF_METRICS_DIR
+# to a directory they share, emptied when the server starts, so every
+# scrape of /api/metrics/ reports all of them; without it a scrape only
+# reports the worker that answered. Workers write their metrics there at
+# most every PERF_METRICS_FLUSH_INTERVAL seconds.
+PERF_METRICS_DIR = config('PERF_METRICS_DIR', default='')
+PERF_METRICS_FLUSH_INTERVAL = config('PERF_METRICS_FLUSH_INTERVAL', default=5, cast=float)
+
+
+# Text search configuration of recipe search documents
+SEARCH_CONFIG = config('SEARCH_CONFIG', default='english')
+
+# Tag and ingredient ?search= autocomplete, name tries of up to
+# AUTOCOMPLETE_TRIE_USERS users are kept per process, 0 disables them
+AUTOCOMPLETE_LIMIT = config('AUTOCOMPLETE_LIMIT', default=10, cast=int)
+AUTOCOMPLETE_MAX_LIMIT = config('AUTOCOMPLETE_MAX_LIMIT', default=50, cast=int)
+AUTOCOMPLETE_TRIE_USERS = config('AUTOCOMPLETE_TRIE_USERS', default=0, cast=int)
+
+
+# Admin changelists estimate row counts from the query plan once the
+# estimate passes this many rows instead of running COUNT(*) (PostgreSQL)
+ADMIN_EXACT_COUNT_LIMIT = config('ADMIN_EXACT_COUNT_LIMIT', default=10000, cast=int)
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/3.0/topics/auth/passwords/
+# PASSWORD_HASHER picks the hasher for new passwords: pbkdf2, argon2 (needs
+# argon2-cffi) or bcrypt (needs bcrypt). Hashes made by the others still
+# verify and are rehashed with it on the user's next login, as are hashes
+# made with other ARGON2_* / BCRYPT_ROUNDS costs.
+
+_PASSWORD_HASHERS = {
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+    'bcrypt': 'core.hashers.BCryptSHA256PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='pbkdf2')
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS.pop(PASSWORD_HASHER),
+    *_PASSWORD_HASHERS.values(),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=2, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=102400, cast=int)  # KiB
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=8, cast=int)
+BCRYPT_ROUNDS = config('BCRYPT_ROUNDS', default=12, cast=int)
+
+# Token logins: failed attempts allowed per account and per client address,
+# checked before any password is hashed
+LOGIN_THROTTLE_RATE = config('LOGIN_THROTTLE_RATE', default='5/min')
+LOGIN_IP_THROTTLE_RATE = config('LOGIN_IP_THROTTLE_RATE', default='30/min')
+# Repeated logins with the same verified credentials are answered from this
+# cache for ISSUED_TOKEN_CACHE_TTL seconds instead of hashing again
+ISSUED_TOKEN_CACHE_ALIAS = config('ISSUED_TOKEN_CACHE_ALIAS', default='default')
+ISSUED_TOKEN_CACHE_TTL = config('ISSUED_TOKEN_CACHE_TTL', default=10 * 60, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -123,4 +276,28 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Media responses: cache lifetime of names that are not content addressed, and
+# MEDIA_SENDFILE=x-sendfile or x-accel-redirect to let the web server send the bytes
+MEDIA_CACHE_MAX_AGE = config('MEDIA_CACHE_MAX_AGE', default=60 * 60, cast=int)
+MEDIA_SENDFILE = config('MEDIA_SENDFILE', default='')
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='/protected-media/')
+
+# Stream uploads to a temporary file instead of buffering them in memory
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+
+# Recipes read per query, and per prefetch, while streaming an export
+RECIPE_EXPORT_CHUNK_SIZE = config('RECIPE_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Recipe images are verified and resized by a background thread pool,
+# 0 processes them inline after the upload commits
+RECIPE_IMAGE_WORKERS = config('RECIPE_IMAGE_WORKERS', default=2, cast=int)
+# Seconds a stored image blob is kept after its last upload even if unreferenced
+RECIPE_IMAGE_ORPHAN_GRACE = config('RECIPE_IMAGE_ORPHAN_GRACE', default=30, cast=int)
+# Encoder quality of JPEG and WebP images written without their metadata
+RECIPE_IMAGE_QUALITY = config('RECIPE_IMAGE_QUALITY', default=90, cast=int)
+RECIPE_IMAGE_SIZES = {
+    'thumbnail': config('RECIPE_IMAGE_THUMBNAIL_SIZE', default=150, cast=int),
+    'medium': config('RECIPE_IMAGE_MEDIUM_SIZE', default=600, cast=int),
+}
\ No newline at end of file
@@ -1,10 +1,53 @@
+import json
+
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 from core import models
 
-class UserAdmin(BaseUserAdmin):
+
+def estimated_count(queryset):
+  """Return the planner's row estimate for queryset, PostgreSQL only"""
+  sql, params = queryset.query.sql_with_params()
+  with connections[queryset.db].cursor() as cursor:
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+    plan = cursor.fetchone()[0]
+  if isinstance(plan, str):
+    plan = json.loads(plan)
+  return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+  """Paginator counting large PostgreSQL results from the query plan
+
+  Results the planner expects to stay under ADMIN_EXACT_COUNT_LIMIT rows
+  are counted exactly, so small tables and narrow searches stay precise.
+  """
+
+  @cached_property
+  def count(self):
+    queryset = self.object_list
+    if connections[queryset.db].vendor == 'postgresql':
+      estimate = estimated_count(queryset)
+      if estimate >= settings.ADMIN_EXACT_COUNT_LIMIT:
+        return estimate
+    return super().count
+
+
+class EstimatedCountMixin:
+  """Changelist without COUNT(*) over large tables"""
+  paginator = EstimatedCountPaginator
+  # the "N total" next to a filtered count would be a second full count
+  show_full_result_count = False
+
+
+class UserAdmin(EstimatedCountMixin, BaseUserAdmin):
   ordering = ['id']
+  search_fields = ['email']
   list_display = ['email', 'name', 'is_staff']
   fieldsets = (
       (None, {'fields': ('email', 'password'),}),
@@ -22,7 +65,26 @@ class UserAdmin(BaseUserAdmin):
     }), # one item in the add_fieldsets therefore comma otherwise python get confused of it is object
   )
   
+
+class RecipeAttributeAdmin(EstimatedCountMixin, admin.ModelAdmin):
+  """Admin of tags and ingredients"""
+  list_display = ['name', 'user']
+  list_select_related = ['user']
+  ordering = ['-id']
+  search_fields = ['name']
+  autocomplete_fields = ['user']
+
+
+class RecipeAdmin(EstimatedCountMixin, admin.ModelAdmin):
+  list_display = ['title', 'user', 'time_minutes', 'price']
+  list_select_related = ['user']
+  ordering = ['-id']
+  search_fields = ['title']
+  # widgets load only the selected rows, not every user, tag and ingredient
+  autocomplete_fields = ['user', 'tags', 'ingredients']
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Recipe)
\ No newline at end of file
+admin.site.register(models.Tag, RecipeAttributeAdmin)
+admin.site.register(models.Ingredient, RecipeAttributeAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from core import signals  # noqa: F401 registers content version bumps
+        from core import metrics
+        from core.db import pool_metrics
+        metrics.register_collector(pool_metrics)
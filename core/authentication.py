@@ -0,0 +1,187 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.metrics import timer
+
+
+class TokenCache:
+  """Bounded LRU cache of token key to (user, token) with a TTL
+
+  Entries live in process memory, or in the TOKEN_CACHE_ALIAS cache when
+  that is set. The shared cache is then the only layer: a per-process
+  copy could not see invalidations made by other workers, and would keep
+  deleted tokens and deactivated users authenticating until its TTL.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._entries = OrderedDict()
+
+  @property
+  def shared(self):
+    alias = settings.TOKEN_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+  def _shared_key(self, key):
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+  def get(self, key):
+    """Return cached (user, token) for key or None"""
+    if self.shared is not None:
+      return self.shared.get(self._shared_key(key))
+    return self._get_local(key)
+
+  async def aget(self, key):
+    """Return cached (user, token) for key or None, from async code"""
+    if self.shared is not None:
+      return await self.shared.aget(self._shared_key(key))
+    return self._get_local(key)
+
+  def set(self, key, value):
+    """Cache (user, token) for key"""
+    if self.shared is not None:
+      self.shared.set(self._shared_key(key), value, settings.TOKEN_CACHE_TTL)
+    else:
+      self._store(key, value)
+
+  async def aset(self, key, value):
+    """Cache (user, token) for key, from async code"""
+    if self.shared is not None:
+      await self.shared.aset(self._shared_key(key), value, settings.TOKEN_CACHE_TTL)
+    else:
+      self._store(key, value)
+
+  def _get_local(self, key):
+    now = time.monotonic()
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      if entry[0] > now:
+        self._entries.move_to_end(key)
+        return entry[1]
+      del self._entries[key]
+    return None
+
+  def _store(self, key, value):
+    with self._lock:
+      self._entries[key] = (time.monotonic() + settings.TOKEN_CACHE_TTL, value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > settings.TOKEN_CACHE_MAX_SIZE:
+        self._entries.popitem(last=False)
+
+  def invalidate(self, *keys):
+    """Forget the given token keys"""
+    with self._lock:
+      for key in keys:
+        self._entries.pop(key, None)
+    if self.shared is not None and keys:
+      self.shared.delete_many([self._shared_key(key) for key in keys])
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class IssuedTokenCache:
+  """Cache of verified login credentials to the token they were issued
+
+  Entries are keyed by an HMAC of email and password, never the password
+  itself, and remember the password hash they were verified against, so a
+  password change or deactivation invalidates them.
+  """
+
+  @property
+  def cache(self):
+    return caches[settings.ISSUED_TOKEN_CACHE_ALIAS]
+
+  def _key(self, email, password):
+    return 'issued-token:' + salted_hmac('core.authentication.IssuedTokenCache', f'{email}\0{password}').hexdigest()
+
+  def get(self, email, password):
+    """Return the token issued for these credentials or None"""
+    entry = self.cache.get(self._key(email, password))
+    if entry is None:
+      return None
+    key, password_hash = entry
+    token = Token.objects.select_related('user').filter(key=key).first()
+    if token is None or not token.user.is_active or not constant_time_compare(token.user.password, password_hash):
+      return None
+    return token
+
+  def set(self, email, password, token):
+    """Remember that the credentials were verified and got token"""
+    self.cache.set(self._key(email, password), (token.key, token.user.password), settings.ISSUED_TOKEN_CACHE_TTL)
+
+
+issued_token_cache = IssuedTokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+  """Token authentication that skips the Token/User query for warm tokens"""
+
+  def authenticate(self, request):
+    with timer('auth'):
+      return super().authenticate(request)
+
+  def authenticate_credentials(self, key):
+    cached = token_cache.get(key)
+    if cached is None:
+      user, token = super().authenticate_credentials(key)
+      token_cache.set(key, (user, token))
+    else:
+      user, token = cached
+      if not user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+    # every request gets its own copy so changes to request.user stay local
+    return copy.copy(user), token
+
+
+async def aauthenticate(request):
+  """Return the user of request's token, the async counterpart of CachedTokenAuthentication
+
+  Raises NotAuthenticated without credentials and AuthenticationFailed
+  for bad ones, with the messages TokenAuthentication uses.
+  """
+  auth = request.headers.get('Authorization', '').split()
+  if not auth or auth[0].lower() != CachedTokenAuthentication.keyword.lower():
+    raise exceptions.NotAuthenticated()
+  if len(auth) != 2:
+    raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+  key = auth[1]
+
+  with timer('auth'):
+    cached = await token_cache.aget(key)
+    if cached is None:
+      try:
+        token = await Token.objects.select_related('user').aget(key=key)
+      except Token.DoesNotExist:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+      cached = (token.user, token)
+      await token_cache.aset(key, cached)
+
+  user = cached[0]
+  if not user.is_active:
+    raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+  return copy.copy(user)
+
+
+def invalidate_user_tokens(user_id):
+  """Forget cached tokens of user_id"""
+  token_cache.invalidate(*Token.objects.filter(user_id=user_id).values_list('key', flat=True))
@@ -0,0 +1,124 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from rest_framework.test import APIRequestFactory
+
+from core.models import Tag, Ingredient, Recipe
+from recipe import search
+
+
+BENCH_EMAIL_DOMAIN = 'bench.local'
+
+
+def bench_users():
+  """Return queryset of users created by the benchmark seeders"""
+  return get_user_model().objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}')
+
+
+def request_factory():
+  """Return a request factory whose host passes ALLOWED_HOSTS"""
+  hosts = [host for host in settings.ALLOWED_HOSTS if host not in ('*',) and not host.startswith('.')]
+  return APIRequestFactory(SERVER_NAME=hosts[0] if hosts else 'localhost')
+
+
+def _bulk_create(model, objs, batch_size):
+  """Insert objs in batches and return the created objects"""
+  return model.objects.bulk_create(objs, batch_size=batch_size)
+
+
+def seed(users, tags=0, ingredients=0, recipes=0, links=0, batch_size=5000, stdout=None):
+  """Seed benchmark users, each owning tags, ingredients and recipes
+
+  links is the number of tags and ingredients attached to every recipe.
+  Returns the list of seeded user ids.
+  """
+  password = make_password(None) # unusable, skips hashing per user
+  offset = bench_users().count()
+  user_objs = _bulk_create(get_user_model(), [
+    get_user_model()(email=f'user{offset + i}@{BENCH_EMAIL_DOMAIN}', password=password)
+    for i in range(users)
+  ], batch_size)
+  user_ids = [u.pk for u in user_objs]
+  if user_ids[0] is None: # backends that don't return pks from bulk_create
+    user_ids = list(bench_users().order_by('id').values_list('id', flat=True))[offset:]
+
+  TagLink = Recipe.tags.through
+  IngredientLink = Recipe.ingredients.through
+
+  for n, user_id in enumerate(user_ids, 1):
+    tag_objs = _bulk_create(Tag, [Tag(user_id=user_id, name=f'Tag {i}') for i in range(tags)], batch_size)
+    ingredient_objs = _bulk_create(Ingredient, [
+      Ingredient(user_id=user_id, name=f'Ingredient {i}') for i in range(ingredients)
+    ], batch_size)
+    recipe_objs = _bulk_create(Recipe, [
+      Recipe(user_id=user_id, title=f'Recipe {i}', time_minutes=10, price=5)
+      for i in range(recipes)
+    ], batch_size)
+
+    if links and recipe_objs:
+      tag_links = []
+      ingredient_links = []
+      for recipe in recipe_objs:
+        for tag in random.sample(tag_objs, min(links, len(tag_objs))):
+          tag_links.append(TagLink(recipe_id=recipe.pk, tag_id=tag.pk))
+        for ingredient in random.sample(ingredient_objs, min(links, len(ingredient_objs))):
+          ingredient_links.append(IngredientLink(recipe_id=recipe.pk, ingredient_id=ingredient.pk))
+      _bulk_create(TagLink, tag_links, batch_size)
+      _bulk_create(IngredientLink, ingredient_links, batch_size)
+
+    # bulk_create skips the signals that keep the search documents current
+    search.update_documents([recipe.pk for recipe in recipe_objs])
+
+    if stdout and n % 1000 == 0:
+      stdout.write(f'  seeded {n}/{len(user_ids)} users')
+
+  return user_ids
+
+
+def clear():
+  """Delete everything the seeders created"""
+  users = bench_users()
+  Recipe.tags.through.objects.filter(recipe__user__in=users).delete()
+  Recipe.ingredients.through.objects.filter(recipe__user__in=users).delete()
+  for model in (Recipe, Tag, Ingredient):
+    model.objects.filter(user__in=users).delete()
+  users.delete()
+
+
+def measure(func, repeat):
+  """Call func repeat times and return the wall time of each call in seconds"""
+  samples = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func()
+    samples.append(time.perf_counter() - start)
+  return samples
+
+
+def summarize(samples):
+  """Return mean and percentile latencies in milliseconds"""
+  samples = sorted(samples)
+  if len(samples) > 1:
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+  else:
+    p50 = p95 = p99 = samples[0]
+  return {
+    'mean': statistics.mean(samples) * 1000,
+    'p50': p50 * 1000,
+    'p95': p95 * 1000,
+    'p99': p99 * 1000,
+  }
+
+
+def format_summary(label, summary):
+  """Return a one line report for a summary"""
+  return (
+    f'{label:<28} mean={summary["mean"]:8.2f}ms p50={summary["p50"]:8.2f}ms '
+    f'p95={summary["p95"]:8.2f}ms p99={summary["p99"]:8.2f}ms'
+  )
@@ -0,0 +1,59 @@
+from django.db import connections
+
+
+def pool_stats():
+  """Return connection counters of every database alias in this process
+
+  Pooled aliases report psycopg_pool's counters, the others how their
+  persistent connections are configured.
+  """
+  stats = {}
+  for alias in connections:
+    connection = connections[alias]
+    pool = getattr(connection, 'pool', None)
+    if pool is None:
+      stats[alias] = {
+        'pooled': False,
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+        'health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+      }
+      continue
+
+    counters = pool.get_stats()
+    size = counters.get('pool_size', 0)
+    stats[alias] = {
+      'pooled': True,
+      'min_size': counters.get('pool_min', pool.min_size),
+      'max_size': counters.get('pool_max', pool.max_size),
+      'size': size,
+      'checked_out': size - counters.get('pool_available', 0),
+      'waiting': counters.get('requests_waiting', 0),
+      # requests that had to queue for a connection and their total wait
+      'waits': counters.get('requests_queued', 0),
+      'wait_ms': counters.get('requests_wait_ms', 0),
+      # requests that gave up after the pool timeout or found the queue full
+      'timeouts': counters.get('requests_errors', 0),
+      'requests': counters.get('requests_num', 0),
+      'connection_errors': counters.get('connections_errors', 0),
+      'connections_lost': counters.get('connections_lost', 0),
+    }
+  return stats
+
+
+def pool_metrics():
+  """Return pool counters of pooled aliases for core.metrics"""
+  pooled = {alias: stats for alias, stats in pool_stats().items() if stats['pooled']}
+  return [
+    ('db_pool_connections', 'gauge', 'Connections open in the pool',
+     [({'alias': alias}, stats['size']) for alias, stats in pooled.items()]),
+    ('db_pool_checked_out', 'gauge', 'Pool connections in use',
+     [({'alias': alias}, stats['checked_out']) for alias, stats in pooled.items()]),
+    ('db_pool_waiting', 'gauge', 'Requests waiting for a pool connection',
+     [({'alias': alias}, stats['waiting']) for alias, stats in pooled.items()]),
+    ('db_pool_waits_total', 'counter', 'Requests that queued for a pool connection',
+     [({'alias': alias}, stats['waits']) for alias, stats in pooled.items()]),
+    ('db_pool_wait_seconds_total', 'counter', 'Time requests queued for a pool connection',
+     [({'alias': alias}, stats['wait_ms'] / 1000) for alias, stats in pooled.items()]),
+    ('db_pool_timeouts_total', 'counter', 'Requests that got no pool connection',
+     [({'alias': alias}, stats['timeouts']) for alias, stats in pooled.items()]),
+  ]
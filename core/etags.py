@@ -0,0 +1,118 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from core.routers import pin_to_primary
+
+
+def _cache():
+  return caches[settings.CONTENT_VERSION_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+  return f'user:{user_id}:content-version'
+
+
+def content_version(user_id):
+  """Return version stamp of everything user_id owns"""
+  key = _version_key(user_id)
+  version = _cache().get(key)
+  if version is None:
+    # start from the clock so an evicted stamp never matches an old etag
+    _cache().add(key, time.time_ns(), None)
+    version = _cache().get(key)
+  return version
+
+
+async def acontent_version(user_id):
+  """Return version stamp of everything user_id owns, from async code"""
+  key = _version_key(user_id)
+  version = await _cache().aget(key)
+  if version is None:
+    await _cache().aadd(key, time.time_ns(), None)
+    version = await _cache().aget(key)
+  return version
+
+
+def make_etag(request, user_id, version):
+  """Return strong ETag of the representation request asks for at version"""
+  variant = hashlib.md5(
+    f'{request.get_host()}|{request.get_full_path()}|{request.META.get("HTTP_ACCEPT", "")}'.encode()
+  ).hexdigest()[:16]
+  return quote_etag(f'{user_id}-{version}-{variant}')
+
+
+def etag_matches(request, etag):
+  """Return whether request's If-None-Match covers etag"""
+  if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+  if not if_none_match:
+    return False
+  # If-None-Match uses weak comparison
+  etags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(if_none_match)]
+  return etag in etags or '*' in etags
+
+
+def _bump(user_id):
+  key = _version_key(user_id)
+  try:
+    _cache().incr(key)
+  except ValueError:
+    _cache().set(key, time.time_ns(), None)
+
+
+def bump_content_version(user_id):
+  """Mark everything user_id owns as changed and read it from the primary for a while
+
+  The version is bumped again when the transaction commits: until then
+  other requests read the old rows, and an ETag they derived from the
+  first bump would otherwise keep matching that old body.
+  """
+  _bump(user_id)
+  transaction.on_commit(lambda: _bump(user_id))
+  pin_to_primary(user_id)
+
+
+class NotModified(APIException):
+  status_code = status.HTTP_304_NOT_MODIFIED
+  default_detail = ''
+
+
+class ConditionalGetMixin:
+  """Answer GET requests with a per-user ETag and short-circuit to 304
+
+  The ETag is derived from the user's content version and the request,
+  so If-None-Match is checked right after authentication and before any
+  queryset or serializer work runs.
+  """
+
+  def get_etag(self, request):
+    """Return strong ETag of the representation request asks for"""
+    return make_etag(request, request.user.pk, content_version(request.user.pk))
+
+  def initial(self, request, *args, **kwargs):
+    super().initial(request, *args, **kwargs)
+    self.etag = None
+
+    if request.method in ('GET', 'HEAD') and request.user.is_authenticated:
+      self.etag = self.get_etag(request)
+      if etag_matches(request, self.etag):
+        raise NotModified()
+
+  def handle_exception(self, exc):
+    if isinstance(exc, NotModified):
+      return Response(status=status.HTTP_304_NOT_MODIFIED)
+    return super().handle_exception(exc)
+
+  def finalize_response(self, request, response, *args, **kwargs):
+    response = super().finalize_response(request, response, *args, **kwargs)
+    if getattr(self, 'etag', None) and response.status_code in (200, 304):
+      response['ETag'] = self.etag
+    return response
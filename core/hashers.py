@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+  """Argon2 with cost parameters from settings
+
+  Hashes made with other parameters are rehashed on the next login.
+  """
+
+  @property
+  def time_cost(self):
+    return settings.ARGON2_TIME_COST
+
+  @property
+  def memory_cost(self):
+    return settings.ARGON2_MEMORY_COST
+
+  @property
+  def parallelism(self):
+    return settings.ARGON2_PARALLELISM
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+  """bcrypt with the work factor from settings, rehashed on login when it changes"""
+
+  @property
+  def rounds(self):
+    return settings.BCRYPT_ROUNDS
+
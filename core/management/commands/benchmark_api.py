@@ -0,0 +1,301 @@
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import tracemalloc
+from io import BytesIO
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core import benchmark
+from core.authentication import token_cache
+from core.models import Tag, Ingredient, Recipe
+from recipe.autocomplete import trie_cache
+
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'api_benchmark_baseline.json')
+DEFAULT_DATASETS = ('5x10x5x5', '5x60x20x20')
+PASSWORD = 'bench-password-123'
+BULK_ITEMS = 10
+
+
+def _names(ids):
+  return ','.join(str(pk) for pk in ids)
+
+
+def _name(ctx):
+  return f'Benchmark {next(ctx["counter"])}'
+
+
+def _recipe(ctx):
+  return {
+    'title': _name(ctx), 'time_minutes': 5, 'price': '1.00',
+    'tags': ctx['tags'][:3], 'ingredients': ctx['ingredients'][:3],
+  }
+
+
+def _fresh(model, ctx, count=1):
+  """Return pks of new objects for endpoints that change or delete them, created before the request is timed"""
+  if model is Recipe:
+    return [Recipe.objects.create(user_id=ctx['user'], title=_name(ctx), time_minutes=5, price=1).pk for _ in range(count)]
+  return [model.objects.create(user_id=ctx['user'], name=_name(ctx)).pk for _ in range(count)]
+
+
+def _upload(ctx):
+  return SimpleUploadedFile('upload.jpg', ctx['jpeg'], content_type='image/jpeg')
+
+
+def _bulk_endpoints(basename, model, item):
+  """Return the create, update and delete endpoints of basename's bulk route"""
+  name = f'recipe:{basename}-bulk'
+  return {
+    f'{basename} bulk create': ('post', lambda ctx: (reverse(name), [item(ctx) for _ in range(BULK_ITEMS)])),
+    f'{basename} bulk update': ('patch', lambda ctx: (reverse(name), [
+      {'id': pk, **item(ctx)} for pk in _fresh(model, ctx, BULK_ITEMS)
+    ])),
+    f'{basename} bulk delete': ('delete', lambda ctx: (reverse(name), _fresh(model, ctx, BULK_ITEMS))),
+  }
+
+
+# name -> (method, path and data for a seeded user's context). Building may
+# create the objects a request changes, it is not counted or timed
+ENDPOINTS = {
+  'recipe list': ('get', lambda ctx: (reverse('recipe:recipe-list'), None)),
+  'recipe list by tags': ('get', lambda ctx: (reverse('recipe:recipe-list'), {'tags': _names(ctx['tags'][:2])})),
+  'recipe list by ingredients': (
+    'get', lambda ctx: (reverse('recipe:recipe-list'), {'ingredients': _names(ctx['ingredients'][:2])}),
+  ),
+  'recipe search': ('get', lambda ctx: (reverse('recipe:recipe-list'), {'q': 'recipe'})),
+  'recipe detail': ('get', lambda ctx: (reverse('recipe:recipe-detail', args=[ctx['recipe']]), None)),
+  'recipe export': ('get', lambda ctx: (reverse('recipe:recipe-export'), None)),
+  'recipe create': ('post', lambda ctx: (reverse('recipe:recipe-list'), _recipe(ctx))),
+  'recipe update': ('put', lambda ctx: (reverse('recipe:recipe-detail', args=_fresh(Recipe, ctx)), _recipe(ctx))),
+  'recipe partial update': (
+    'patch', lambda ctx: (reverse('recipe:recipe-detail', args=_fresh(Recipe, ctx)), {'title': _name(ctx)}),
+  ),
+  'recipe delete': ('delete', lambda ctx: (reverse('recipe:recipe-detail', args=_fresh(Recipe, ctx)), None)),
+  'recipe upload image': (
+    'multipart', lambda ctx: (reverse('recipe:recipe-upload-image', args=[ctx['recipe']]), {'image': _upload(ctx)}),
+  ),
+  **_bulk_endpoints('recipe', Recipe, _recipe),
+  'tag list': ('get', lambda ctx: (reverse('recipe:tag-list'), None)),
+  'tag list assigned only': ('get', lambda ctx: (reverse('recipe:tag-list'), {'assigned_only': 1})),
+  'tag autocomplete': ('get', lambda ctx: (reverse('recipe:tag-list'), {'search': 'tag 1'})),
+  'tag create': ('post', lambda ctx: (reverse('recipe:tag-list'), {'name': _name(ctx)})),
+  **_bulk_endpoints('tag', Tag, lambda ctx: {'name': _name(ctx)}),
+  'ingredient list': ('get', lambda ctx: (reverse('recipe:ingredient-list'), None)),
+  'ingredient list assigned only': ('get', lambda ctx: (reverse('recipe:ingredient-list'), {'assigned_only': 1})),
+  'ingredient autocomplete': ('get', lambda ctx: (reverse('recipe:ingredient-list'), {'search': 'ingredient 1'})),
+  'ingredient create': ('post', lambda ctx: (reverse('recipe:ingredient-list'), {'name': _name(ctx)})),
+  **_bulk_endpoints('ingredient', Ingredient, lambda ctx: {'name': _name(ctx)}),
+  'user profile': ('get', lambda ctx: (reverse('users:me'), None)),
+  'token login': ('post', lambda ctx: (reverse('users:token'), {'email': ctx['email'], 'password': PASSWORD})),
+  'user create': ('post', lambda ctx: (reverse('users:create'), {
+    'email': f'new{next(ctx["counter"])}@{benchmark.BENCH_EMAIL_DOMAIN}', 'password': PASSWORD, 'name': 'Benchmark',
+  })),
+}
+# sent without the token, like a client that has not logged in yet
+ANONYMOUS = {'token login', 'user create'}
+
+
+def parse_dataset(value):
+  """Return users, recipes, tags and ingredients of a UxRxTxI dataset"""
+  try:
+    users, recipes, tags, ingredients = (int(part) for part in value.lower().split('x'))
+  except ValueError:
+    raise CommandError(f'Dataset {value} is not USERSxRECIPESxTAGSxINGREDIENTS')
+  return {'users': users, 'recipes': recipes, 'tags': tags, 'ingredients': ingredients}
+
+
+class Command(BaseCommand):
+  """Django command to catch query count, latency and memory regressions of the API"""
+  help = (
+    'Seed each dataset (USERSxRECIPESxTAGSxINGREDIENTS per user) and report queries, latency percentiles '
+    'and peak memory per endpoint. Fails when an endpoint runs more queries on a larger dataset, and with '
+    '--check when it exceeds the recorded baseline. Uploaded images go to a temporary MEDIA_ROOT and are '
+    'processed within the request, so their cost is counted.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--dataset', action='append', dest='datasets', help=f'repeatable, default {" ".join(DEFAULT_DATASETS)}')
+    parser.add_argument('--links', type=int, default=3, help='tags and ingredients per recipe')
+    parser.add_argument('--samples', type=int, default=50, help='timed requests per endpoint')
+    parser.add_argument('--endpoint', action='append', dest='endpoints', choices=sorted(ENDPOINTS))
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='record the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='fail when results exceed the baseline')
+    parser.add_argument('--latency-tolerance', type=float, default=0.5, help='allowed p95 growth, 0.5 is +50%%')
+    parser.add_argument('--latency-slack', type=float, default=2.0, help='ms added to the allowed p95 for timer noise')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25, help='allowed peak memory growth')
+
+  def handle(self, *args, **options):
+    datasets = options['datasets'] or list(DEFAULT_DATASETS)
+    endpoints = options['endpoints'] or list(ENDPOINTS)
+    results = {}
+    media_root = tempfile.mkdtemp()
+    try:
+      with override_settings(MEDIA_ROOT=media_root, RECIPE_IMAGE_WORKERS=0):
+        for label in datasets:
+          self.stdout.write(self.style.MIGRATE_HEADING(f'Dataset {label}'))
+          results[label] = self.run_dataset(parse_dataset(label), endpoints, options)
+    finally:
+      shutil.rmtree(media_root)
+
+    failures = self.scaling_failures(datasets, results)
+    if options['check']:
+      failures += self.baseline_failures(results, options)
+    if options['update_baseline']:
+      self.write_baseline(results, options['baseline'])
+
+    if failures:
+      for failure in failures:
+        self.stderr.write(failure)
+      raise CommandError(f'{len(failures)} benchmark regressions')
+    self.stdout.write(self.style.SUCCESS('No regressions'))
+
+  def run_dataset(self, dataset, endpoints, options):
+    user_ids = benchmark.seed(
+      dataset['users'], recipes=dataset['recipes'], tags=dataset['tags'],
+      ingredients=dataset['ingredients'], links=options['links'],
+    )
+    try:
+      user_id = user_ids[0]
+      user = benchmark.bench_users().get(pk=user_id)
+      user.set_password(PASSWORD)
+      user.save(update_fields=['password'])
+      token = Token.objects.create(user_id=user_id)
+      server_name = benchmark.request_factory().defaults['SERVER_NAME']
+      clients = {
+        False: Client(HTTP_AUTHORIZATION=f'Token {token.key}', SERVER_NAME=server_name),
+        True: Client(SERVER_NAME=server_name),
+      }
+      buffer = BytesIO()
+      Image.new('RGB', (64, 64)).save(buffer, format='JPEG')
+      ctx = {
+        'user': user_id,
+        'email': user.email,
+        'recipe': Recipe.objects.filter(user_id=user_id).values_list('pk', flat=True).first(),
+        'tags': list(Tag.objects.filter(user_id=user_id).order_by('id').values_list('pk', flat=True)),
+        'ingredients': list(Ingredient.objects.filter(user_id=user_id).order_by('id').values_list('pk', flat=True)),
+        'counter': itertools.count(),
+        'jpeg': buffer.getvalue(),
+      }
+
+      results = {}
+      for name in endpoints:
+        method, build = ENDPOINTS[name]
+        client = clients[name in ANONYMOUS]
+
+        def send(request, name=name, method=method, client=client):
+          path, data = request
+          if method == 'get':
+            response = client.get(path, data)
+          elif method == 'multipart':
+            response = client.post(path, data)
+          elif data is None:
+            response = getattr(client, method)(path)
+          else:
+            response = getattr(client, method)(path, json.dumps(data), content_type='application/json')
+          if response.status_code >= 400:
+            raise CommandError(f'{name}: {response.status_code} {response.content[:200]!r}')
+          if response.streaming:
+            b''.join(response.streaming_content)
+
+        results[name] = self.measure(lambda: build(ctx), send, options['samples'])
+        result = results[name]
+        self.stdout.write(
+          f'  {name:<29} queries={result["queries"]:<3} peak={result["peak_kb"]:8.1f}KiB '
+          f'p50={result["p50_ms"]:7.2f}ms p95={result["p95_ms"]:7.2f}ms p99={result["p99_ms"]:7.2f}ms'
+        )
+      return results
+    finally:
+      benchmark.clear()
+
+  def clear_caches(self):
+    """Forget everything cached so each endpoint is counted from cold"""
+    for alias in settings.CACHES:
+      caches[alias].clear()
+    token_cache.clear()
+    trie_cache.clear()
+
+  def measure(self, build, send, samples):
+    """Return queries, peak memory and latency of send, with the requests made by build beforehand"""
+    queries = []
+
+    def count(execute, sql, params, many, context):
+      queries.append(sql)
+      return execute(sql, params, many, context)
+
+    # an execute wrapper rather than connection.queries, which DEBUG caps at 9000 entries
+    request = build()
+    self.clear_caches()
+    with connection.execute_wrapper(count):
+      send(request)
+
+    request = build()
+    self.clear_caches()
+    tracemalloc.start()
+    try:
+      send(request)
+      peak = tracemalloc.get_traced_memory()[1]
+    finally:
+      tracemalloc.stop()
+
+    requests = iter([build() for _ in range(samples)])
+    summary = benchmark.summarize(benchmark.measure(lambda: send(next(requests)), samples))
+    return {
+      'queries': len(queries),
+      'peak_kb': peak / 1024,
+      'p50_ms': summary['p50'],
+      'p95_ms': summary['p95'],
+      'p99_ms': summary['p99'],
+    }
+
+  def scaling_failures(self, datasets, results):
+    """Return endpoints whose query count grows with the data, i.e. N+1 queries"""
+    failures = []
+    for smaller, larger in zip(datasets, datasets[1:]):
+      for name, result in results[larger].items():
+        if result['queries'] > results[smaller][name]['queries']:
+          failures.append(
+            f'{name}: {results[smaller][name]["queries"]} queries on {smaller}, {result["queries"]} on {larger}'
+          )
+    return failures
+
+  def baseline_failures(self, results, options):
+    if not os.path.exists(options['baseline']):
+      raise CommandError(f'No baseline at {options["baseline"]}, record one with --update-baseline')
+    with open(options['baseline']) as f:
+      baseline = json.load(f)
+
+    failures = []
+    for label, endpoints in results.items():
+      for name, result in endpoints.items():
+        expected = baseline.get(label, {}).get(name)
+        if expected is None:
+          continue
+        if result['queries'] > expected['queries']:
+          failures.append(f'{label} {name}: {result["queries"]} queries, baseline {expected["queries"]}')
+        if result['p95_ms'] > expected['p95_ms'] * (1 + options['latency_tolerance']) + options['latency_slack']:
+          failures.append(f'{label} {name}: p95 {result["p95_ms"]:.2f}ms, baseline {expected["p95_ms"]:.2f}ms')
+        if result['peak_kb'] > expected['peak_kb'] * (1 + options['memory_tolerance']):
+          failures.append(f'{label} {name}: peak {result["peak_kb"]:.1f}KiB, baseline {expected["peak_kb"]:.1f}KiB')
+    return failures
+
+  def write_baseline(self, results, path):
+    with open(f'{path}.tmp', 'w') as f:
+      json.dump(results, f, indent=2, sort_keys=True)
+      f.write('\n')
+    os.replace(f'{path}.tmp', path)
+    self.stdout.write(f'Baseline written to {path}')
@@ -0,0 +1,81 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncRequestFactory, override_settings
+
+from rest_framework.authtoken.models import Token
+
+from core import benchmark
+from core.authentication import token_cache
+from recipe.views import RecipeViewSet, RecipeListAsyncView
+
+
+class Command(BaseCommand):
+  """Django command to compare the sync recipe list under threads with the async one on an event loop"""
+  help = (
+    'Seed benchmark users and report throughput and latency of concurrent recipe list requests '
+    'served by the viewset from a thread pool (WSGI workers) and by the async view (ASGI)'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--recipes', type=int, default=50, help='recipes per user')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32, help='threads, or clients on the event loop')
+    parser.add_argument('--keep', action='store_true', help='keep seeded rows afterwards')
+
+  def handle(self, *args, **options):
+    self.stdout.write('Seeding...')
+    user_ids = benchmark.seed(options['users'], recipes=options['recipes'], stdout=self.stdout)
+    keys = [Token.objects.create(user_id=user_id).key for user_id in user_ids]
+    headers = [{'Authorization': f'Token {random.choice(keys)}'} for _ in range(options['requests'])]
+
+    try:
+      for label, run in (('WSGI threads', self.run_threads), ('ASGI event loop', self.run_async)):
+        token_cache.clear()
+        started = time.perf_counter()
+        samples = run(headers, options['concurrency'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f'  throughput={len(samples) / elapsed:.0f} req/s')
+        self.stdout.write(benchmark.format_summary('  latency', benchmark.summarize(samples)))
+    finally:
+      if not options['keep']:
+        benchmark.clear()
+
+  def run_threads(self, headers, concurrency):
+    factory = benchmark.request_factory()
+    view = RecipeViewSet.as_view({'get': 'list'})
+
+    def call(request_headers):
+      start = time.perf_counter()
+      view(factory.get('/api/recipe/recipes/', headers=request_headers)).render()
+      return time.perf_counter() - start
+
+    with ThreadPoolExecutor(concurrency) as executor:
+      return list(executor.map(call, headers))
+
+  def run_async(self, headers, concurrency):
+    factory = AsyncRequestFactory()
+    view = RecipeListAsyncView.as_view()
+
+    async def client(queue, samples):
+      while queue:
+        request = factory.get('/api/recipe/recipes/', headers=queue.pop())
+        start = time.perf_counter()
+        await view(request)
+        samples.append(time.perf_counter() - start)
+
+    async def main():
+      queue = list(headers)
+      samples = []
+      await asyncio.gather(*(client(queue, samples) for _ in range(concurrency)))
+      return samples
+
+    # the async factory always sends Host: testserver
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+      return asyncio.run(main())
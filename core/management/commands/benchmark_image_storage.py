@@ -0,0 +1,61 @@
+import os
+import random
+import shutil
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+
+from core import benchmark
+from core.models import recipe_image_file_path
+from core.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+  """Django command to compare disk usage of uuid named and content addressed image storage"""
+  help = 'Store the same set of uploads with both storages and report files, bytes and save latency'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--uploads', type=int, default=2000)
+    parser.add_argument('--distinct', type=int, default=200, help='distinct images among the uploads')
+    parser.add_argument('--size', type=int, default=800, help='image edge in pixels')
+
+  def handle(self, *args, **options):
+    images = []
+    for i in range(options['distinct']):
+      buffer = BytesIO()
+      Image.effect_noise((options['size'], options['size']), 10 + i).convert('RGB').save(buffer, format='JPEG')
+      images.append(buffer.getvalue())
+    uploads = [random.choice(images) for _ in range(options['uploads'])]
+
+    for label, storage_class in (
+      ('uuid names', FileSystemStorage),
+      ('content addressed', ContentAddressedStorage),
+    ):
+      location = tempfile.mkdtemp()
+      try:
+        storage = storage_class(location=location)
+        it = iter(uploads)
+        samples = benchmark.measure(
+          lambda: storage.save(recipe_image_file_path(None, 'upload.jpg'), ContentFile(next(it))),
+          len(uploads),
+        )
+        files, size = self.usage(location)
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f'  files={files} bytes={size} ({size / 2 ** 20:.1f} MiB)')
+        self.stdout.write(benchmark.format_summary('  save latency', benchmark.summarize(samples)))
+      finally:
+        shutil.rmtree(location)
+
+  def usage(self, location):
+    """Return number of files and bytes under location"""
+    files = size = 0
+    for dirpath, _, filenames in os.walk(location):
+      for filename in filenames:
+        files += 1
+        size += os.path.getsize(os.path.join(dirpath, filename))
+    return files, size
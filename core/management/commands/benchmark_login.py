@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils.module_loading import import_string
+
+from core import benchmark
+from users.views import CreateTokenView
+
+
+PASSWORD = 'bench-password-123'
+
+
+class Command(BaseCommand):
+  """Django command to measure token login throughput"""
+  help = (
+    'Seed benchmark users and report login throughput and latency when every login checks the '
+    'password and when repeated logins are answered by the issued-token cache'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200, help='logins per scenario')
+    parser.add_argument('--hasher', help='algorithm of the stored hashes, e.g. pbkdf2_sha256, argon2, bcrypt_sha256')
+
+  def handle(self, *args, **options):
+    hashers = settings.PASSWORD_HASHERS
+    if options['hasher']:
+      preferred = [path for path in hashers if import_string(path).algorithm == options['hasher']]
+      if not preferred:
+        raise CommandError(f'{options["hasher"]} is not in PASSWORD_HASHERS')
+      hashers = preferred + [path for path in hashers if path not in preferred]
+
+    with override_settings(PASSWORD_HASHERS=hashers):
+      self.run(options)
+
+  def run(self, options):
+    benchmark.seed(options['users'])
+    # one hash for everybody, hashing per user would dominate seeding
+    encoded = make_password(PASSWORD)
+    benchmark.bench_users().update(password=encoded)
+    emails = list(benchmark.bench_users().values_list('email', flat=True))
+    self.stdout.write(f'Stored hashes: {encoded.split("$", 1)[0]}')
+
+    factory = benchmark.request_factory()
+    view = CreateTokenView.as_view()
+    logins = [emails[i % len(emails)] for i in range(options['requests'])]
+
+    def login(email):
+      response = view(factory.post('/api/users/token/', {'email': email, 'password': PASSWORD}))
+      if response.status_code != 200:
+        raise CommandError(f'Login failed: {response.data}')
+
+    try:
+      # a zero TTL keeps the issued-token cache from storing anything
+      for label, ttl in (('password checked', 0), ('issued-token cache', settings.ISSUED_TOKEN_CACHE_TTL)):
+        with override_settings(ISSUED_TOKEN_CACHE_TTL=ttl):
+          for email in emails:
+            login(email)
+          it = iter(logins)
+          started = time.perf_counter()
+          samples = benchmark.measure(lambda: login(next(it)), len(logins))
+          elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f'  throughput={len(samples) / elapsed:.1f} logins/s')
+        self.stdout.write(benchmark.format_summary('  latency', benchmark.summarize(samples)))
+    finally:
+      benchmark.clear()
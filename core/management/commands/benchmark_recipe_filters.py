@@ -0,0 +1,91 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from rest_framework.test import force_authenticate
+
+from core import benchmark
+from core.models import Tag, Ingredient
+from recipe import views
+
+
+class Command(BaseCommand):
+  """Django command to report query plans and latency of the recipe list filters"""
+  help = 'Seed benchmark users, print EXPLAIN output and time the tags, ingredients and assigned_only filters'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tags', type=int, default=40, help='tags per user')
+    parser.add_argument('--ingredients', type=int, default=40, help='ingredients per user')
+    parser.add_argument('--recipes', type=int, default=200, help='recipes per user')
+    parser.add_argument('--links', type=int, default=5, help='tags and ingredients per recipe')
+    parser.add_argument('--samples', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--keep', action='store_true', help='keep seeded rows afterwards')
+
+  def handle(self, *args, **options):
+    self.stdout.write('Seeding...')
+    user_ids = benchmark.seed(
+      options['users'],
+      tags=options['tags'],
+      ingredients=options['ingredients'],
+      recipes=options['recipes'],
+      links=options['links'],
+      stdout=self.stdout,
+    )
+    self.factory = benchmark.request_factory()
+
+    try:
+      if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+          cursor.execute('ANALYZE')
+
+      users = list(benchmark.bench_users().filter(id__in=random.sample(user_ids, min(options['samples'], len(user_ids)))))
+      for label, viewset, params in self.scenarios():
+        # Expected plans: the outer scan walks the (user, -id) index and the
+        # filters become a semi-join / EXISTS on the through table's
+        # (recipe_id, tag_id) unique index or its tag_id / ingredient_id index.
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        user_params = {user.pk: params(user) for user in users}
+        self.stdout.write(self.get_queryset(viewset, users[0], user_params[users[0].pk]).explain())
+
+        def call():
+          user = random.choice(users)
+          request = self.factory.get('/', user_params[user.pk])
+          force_authenticate(request, user=user)
+          viewset.as_view({'get': 'list'})(request).render()
+
+        summary = benchmark.summarize(benchmark.measure(call, options['samples']))
+        self.stdout.write(benchmark.format_summary('  latency', summary))
+    finally:
+      if not options['keep']:
+        self.stdout.write('Removing seeded rows...')
+        benchmark.clear()
+
+  def scenarios(self):
+    """Return (label, viewset, params factory) for every filter"""
+    def pick(model, count):
+      def params(user):
+        ids = model.objects.filter(user=user).values_list('id', flat=True)[:count]
+        return ','.join(str(pk) for pk in ids)
+      return params
+
+    tags = pick(Tag, 2)
+    ingredients = pick(Ingredient, 1)
+    return (
+      ('recipes ?tags=', views.RecipeViewSet, lambda user: {'tags': tags(user)}),
+      ('recipes ?ingredients=', views.RecipeViewSet, lambda user: {'ingredients': ingredients(user)}),
+      ('recipes ?tags=&ingredients=', views.RecipeViewSet,
+        lambda user: {'tags': tags(user), 'ingredients': ingredients(user)}),
+      ('tags ?assigned_only=1', views.TagViewSet, lambda user: {'assigned_only': 1}),
+      ('ingredients ?assigned_only=1', views.IngredientViewSet, lambda user: {'assigned_only': 1}),
+    )
+
+  def get_queryset(self, viewset, user, params):
+    """Return the list queryset viewset builds for user and params"""
+    request = self.factory.get('/', params)
+    force_authenticate(request, user=user)
+    view = viewset(action_map={'get': 'list'}, format_kwarg=None)
+    view.request = view.initialize_request(request)
+    view.request.user = user
+    return view.get_queryset()
@@ -0,0 +1,116 @@
+import os
+import random
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from rest_framework.test import force_authenticate
+
+from core import benchmark
+from core.models import Tag, Ingredient, Recipe
+from recipe import views
+
+
+# the per-user indexes the list queries are timed with and without, other
+# indexes such as core_recipe_search_gin_idx are left alone
+COMPOSITE_INDEXES = {
+  Tag: ('core_tag_user_name_idx', 'core_tag_user_id_idx'),
+  Ingredient: ('core_ingredient_user_name_idx', 'core_ingredient_user_id_idx'),
+  Recipe: ('core_recipe_user_title_idx', 'core_recipe_user_id_idx'),
+}
+
+
+def is_scratch_database():
+  """Return whether the default database is a test or benchmark one"""
+  name = os.path.basename(str(connection.settings_dict['NAME']))
+  return name.startswith(('test_', 'bench')) or 'memory' in name
+
+
+class Command(BaseCommand):
+  """Django command to benchmark per-user list latency with and without the composite indexes"""
+  help = (
+    'Seed benchmark users and report tag, ingredient and recipe list latency with the per-user composite '
+    'indexes dropped and restored. Refuses to change the schema of a database not named test_* or bench* '
+    'unless --allow-schema-changes is given.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--tags', type=int, default=40, help='tags per user')
+    parser.add_argument('--ingredients', type=int, default=40, help='ingredients per user')
+    parser.add_argument('--recipes', type=int, default=20, help='recipes per user')
+    parser.add_argument('--samples', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--keep', action='store_true', help='keep seeded rows afterwards')
+    parser.add_argument('--allow-schema-changes', action='store_true', help='drop the indexes on any database')
+
+  def handle(self, *args, **options):
+    if not options['allow_schema_changes'] and not is_scratch_database():
+      raise CommandError(
+        f'{connection.settings_dict["NAME"]} is not a test or benchmark database, pass --allow-schema-changes '
+        'to drop its indexes for the run'
+      )
+
+    users = options['users']
+    rows = users * (options['tags'] + options['ingredients'] + options['recipes'])
+    self.stdout.write(f'Seeding {rows} rows across {users} users...')
+    user_ids = benchmark.seed(
+      users,
+      tags=options['tags'],
+      ingredients=options['ingredients'],
+      recipes=options['recipes'],
+      stdout=self.stdout,
+    )
+
+    try:
+      with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+          cursor.execute('ANALYZE')
+
+      self.stdout.write('Without composite indexes:')
+      with self.indexes_dropped():
+        self.run(user_ids, options['samples'])
+
+      self.stdout.write('With composite indexes:')
+      self.run(user_ids, options['samples'])
+    finally:
+      if not options['keep']:
+        self.stdout.write('Removing seeded rows...')
+        benchmark.clear()
+
+  def run(self, user_ids, samples):
+    """Time list requests for randomly chosen users"""
+    factory = benchmark.request_factory()
+    users = list(benchmark.bench_users().filter(id__in=random.sample(user_ids, min(samples, len(user_ids)))))
+
+    for name, viewset in (
+      ('tags', views.TagViewSet),
+      ('ingredients', views.IngredientViewSet),
+      ('recipes', views.RecipeViewSet),
+    ):
+      view = viewset.as_view({'get': 'list'})
+
+      def call():
+        request = factory.get('/')
+        force_authenticate(request, user=random.choice(users))
+        view(request).render()
+
+      summary = benchmark.summarize(benchmark.measure(call, samples))
+      self.stdout.write(benchmark.format_summary(f'  {name}', summary))
+
+  @contextmanager
+  def indexes_dropped(self):
+    """Remove the composite indexes and restore them on exit"""
+    self.toggle_indexes('remove_index')
+    try:
+      yield
+    finally:
+      self.toggle_indexes('add_index')
+
+  def toggle_indexes(self, operation):
+    """Add or remove the COMPOSITE_INDEXES of the recipe models"""
+    with connection.schema_editor() as editor:
+      for model, names in COMPOSITE_INDEXES.items():
+        for index in model._meta.indexes:
+          if index.name in names:
+            getattr(editor, operation)(model, index)
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+
+from core import benchmark
+from core.authentication import CachedTokenAuthentication, token_cache
+
+
+class Command(BaseCommand):
+  """Django command to compare per-request cost of token authentication classes"""
+  help = 'Report queries and latency per authenticated request for TokenAuthentication and CachedTokenAuthentication'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--tokens', type=int, default=100, help='distinct users and tokens')
+    parser.add_argument('--requests', type=int, default=5000)
+
+  def handle(self, *args, **options):
+    user_ids = benchmark.seed(options['tokens'])
+    keys = [Token.objects.create(user_id=user_id).key for user_id in user_ids]
+    factory = benchmark.request_factory()
+    requests = [
+      Request(factory.get('/', HTTP_AUTHORIZATION=f'Token {keys[i % len(keys)]}'))
+      for i in range(options['requests'])
+    ]
+
+    try:
+      token_cache.clear()
+      for label, authenticator in (
+        ('TokenAuthentication', TokenAuthentication()),
+        ('CachedTokenAuthentication', CachedTokenAuthentication()),
+      ):
+        # the first pass over every token warms the cache
+        with CaptureQueriesContext(connection) as cold:
+          for request in requests[:len(keys)]:
+            authenticator.authenticate(request)
+
+        it = iter(requests)
+        with CaptureQueriesContext(connection) as warm:
+          samples = benchmark.measure(lambda: authenticator.authenticate(next(it)), len(requests))
+
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(f'  queries/request cold={len(cold) / len(keys):.2f} warm={len(warm) / len(requests):.2f}')
+        self.stdout.write(benchmark.format_summary('  warm latency', benchmark.summarize(samples)))
+    finally:
+      benchmark.clear()
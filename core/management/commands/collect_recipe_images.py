@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.storage import recipe_image_storage, referenced_names, collect_orphans
+
+
+class Command(BaseCommand):
+  """Django command to delete recipe image blobs no recipe references"""
+  help = 'Sweep the content addressed recipe image store for orphaned blobs'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--grace', type=int, default=None, help='keep blobs written in the last seconds')
+    parser.add_argument('--dry-run', action='store_true', help='only report orphaned blobs')
+
+  def handle(self, *args, **options):
+    root = recipe_image_storage.path(recipe_image_storage.content_dir)
+    batch = []
+    deleted = 0
+
+    def collect(names):
+      if options['dry_run']:
+        orphans = set(names) - referenced_names(names)
+        for name in sorted(orphans):
+          self.stdout.write(name)
+        return orphans
+      return collect_orphans(names, grace=options['grace'])
+
+    for dirpath, _, filenames in os.walk(root):
+      for filename in filenames:
+        if filename.endswith('.part'):
+          continue
+        path = os.path.join(dirpath, filename)
+        batch.append(os.path.relpath(path, recipe_image_storage.location).replace(os.sep, '/'))
+        if len(batch) >= options['batch_size']:
+          deleted += len(collect(batch))
+          batch = []
+
+    deleted += len(collect(batch))
+    verb = 'Found' if options['dry_run'] else 'Deleted'
+    self.stdout.write(self.style.SUCCESS(f'{verb} {deleted} orphaned images'))
@@ -0,0 +1,276 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.etags import bump_content_version
+from core.models import Tag, Ingredient, Recipe
+from core.normalization import normalize_name
+
+from recipe import search
+from recipe.export import CSV_LIST_SEPARATOR
+
+
+RECIPE_FIELDS = ('title', 'time_minutes', 'price', 'link')
+# names per IN (...) lookup, below every backend's parameter limit
+LOOKUP_CHUNK = 900
+
+
+class NameCache:
+  """normalized name -> id map of a user's tags or ingredients
+
+  Existing rows are loaded once, missing names are created per batch.
+  """
+
+  def __init__(self, model, user):
+    self.model = model
+    self.user = user
+    self.ids = dict(model.objects.filter(user=user).values_list('normalized_name', 'pk').iterator())
+
+  def resolve(self, names):
+    """Create the rows names are missing and return the whole map"""
+    missing = {}
+    for name in names:
+      normalized_name = normalize_name(name)
+      if normalized_name not in self.ids:
+        missing.setdefault(normalized_name, name)
+    if missing:
+      # rows another writer creates meanwhile are picked up by the lookup
+      self.model.objects.bulk_create(
+        [self.model(user=self.user, name=name) for name in missing.values()],
+        ignore_conflicts=True,
+      )
+      missing = list(missing)
+      for start in range(0, len(missing), LOOKUP_CHUNK):
+        self.ids.update(self.model.objects.filter(
+          user=self.user, normalized_name__in=missing[start:start + LOOKUP_CHUNK],
+        ).values_list('normalized_name', 'pk'))
+    return self.ids
+
+
+def _names(value):
+  """Return list of names from a JSON list or a CSV cell"""
+  if not value:
+    return []
+  if isinstance(value, str):
+    value = value.split(CSV_LIST_SEPARATOR)
+  return [name.strip() for name in value if name and name.strip()]
+
+
+def clean_record(record):
+  """Return (recipe field values, tag names, ingredient names) of an input record"""
+  if not isinstance(record, dict):
+    raise ValidationError('Expected an object.')
+  values = {}
+  errors = {}
+  for name in RECIPE_FIELDS:
+    field = Recipe._meta.get_field(name)
+    value = record.get(name)
+    try:
+      values[name] = field.clean('' if value is None else value, None)
+    except ValidationError as e:
+      errors[name] = e.messages
+  if errors:
+    raise ValidationError(errors)
+  return values, _names(record.get('tags')), _names(record.get('ingredients'))
+
+
+def _copy_value(value):
+  """Return value in COPY text format"""
+  if value is None:
+    return '\\N'
+  return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(table, columns, rows):
+  """Load rows into table with COPY FROM STDIN"""
+  data = ''.join('\t'.join(_copy_value(value) for value in row) + '\n' for row in rows)
+  sql = f'COPY {table} ({", ".join(columns)}) FROM STDIN'
+  with connection.cursor() as cursor:
+    if hasattr(cursor.cursor, 'copy_expert'):  # psycopg2
+      cursor.cursor.copy_expert(sql, io.StringIO(data))
+    else:
+      with cursor.cursor.copy(sql) as copy:
+        copy.write(data)
+
+
+class Command(BaseCommand):
+  """Django command to load recipes from JSON lines or CSV files"""
+  help = (
+    'Import recipes for one user from a JSON lines or CSV file ("-" for stdin, .gz is decompressed) '
+    'in the format of the recipe export.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('path')
+    parser.add_argument('--user', required=True, help='email of the user the recipes are imported for')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), help='defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=1000, help='recipes written per transaction')
+    parser.add_argument('--copy', action='store_true', help='load rows with PostgreSQL COPY')
+    parser.add_argument('--checkpoint', help='file recording progress, an interrupted import resumes from it')
+    parser.add_argument('--skip-invalid', action='store_true', help='report invalid records instead of stopping')
+
+  def handle(self, *args, **options):
+    try:
+      user = get_user_model().objects.get(email=options['user'])
+    except get_user_model().DoesNotExist:
+      raise CommandError(f'No user with email {options["user"]}')
+    if options['copy'] and connection.vendor != 'postgresql':
+      raise CommandError('--copy requires PostgreSQL')
+    fmt = options['format'] or self.guess_format(options['path'])
+
+    self.copy = options['copy']
+    self.verbosity = options['verbosity']
+    self.tags = NameCache(Tag, user)
+    self.ingredients = NameCache(Ingredient, user)
+    checkpoint = options['checkpoint']
+    done = self.read_checkpoint(checkpoint, options['path'])
+    if done:
+      self.stdout.write(f'Resuming after {done} records')
+
+    imported = skipped = 0
+    records = done
+    started = time.monotonic()
+    batch = []
+    with self.open(options['path']) as stream:
+      for number, record in enumerate(self.read(stream, fmt), 1):
+        if number <= done:
+          continue
+        records = number
+        try:
+          batch.append(clean_record(record))
+        except ValidationError as e:
+          detail = e.message_dict if hasattr(e, 'error_dict') else e.messages
+          if not options['skip_invalid']:
+            raise CommandError(f'Record {number}: {detail}')
+          skipped += 1
+          self.stderr.write(f'Skipped record {number}: {detail}')
+
+        if len(batch) >= options['batch_size']:
+          imported += self.write_batch(user, batch)
+          batch = []
+          self.write_checkpoint(checkpoint, options['path'], records)
+          self.report(records, imported, skipped, started)
+
+      if batch:
+        imported += self.write_batch(user, batch)
+        self.report(records, imported, skipped, started)
+      self.write_checkpoint(checkpoint, options['path'], records)
+
+    self.stdout.write(self.style.SUCCESS(f'Imported {imported} recipes, skipped {skipped} records'))
+
+  def guess_format(self, path):
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.csv'):
+      return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+      return 'jsonl'
+    raise CommandError('Cannot tell the input format, pass --format')
+
+  def open(self, path):
+    if path == '-':
+      return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+    if path.endswith('.gz'):
+      return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+  def read(self, stream, fmt):
+    """Yield input records one at a time"""
+    if fmt == 'csv':
+      yield from csv.DictReader(stream)
+      return
+    for number, line in enumerate(stream, 1):
+      if not line.strip():
+        continue
+      try:
+        yield json.loads(line)
+      except ValueError as e:
+        raise CommandError(f'Line {number}: {e}')
+
+  def read_checkpoint(self, checkpoint, path):
+    """Return number of records already imported from path"""
+    if not checkpoint or not os.path.exists(checkpoint):
+      return 0
+    with open(checkpoint) as f:
+      state = json.load(f)
+    if state['path'] != path:
+      raise CommandError(f'Checkpoint {checkpoint} belongs to {state["path"]}')
+    return state['records']
+
+  def write_checkpoint(self, checkpoint, path, records):
+    """Record that the first records of path are in the database"""
+    if not checkpoint:
+      return
+    # a crash between the commit and this write replays at most one batch
+    with open(f'{checkpoint}.tmp', 'w') as f:
+      json.dump({'path': path, 'records': records}, f)
+    os.replace(f'{checkpoint}.tmp', checkpoint)
+
+  def report(self, records, imported, skipped, started):
+    if self.verbosity < 1:
+      return
+    elapsed = time.monotonic() - started
+    self.stdout.write(
+      f'{records} records read, {imported} recipes imported, {skipped} skipped '
+      f'({imported / elapsed if elapsed else 0:.0f} recipes/s)'
+    )
+
+  def write_batch(self, user, batch):
+    """Write recipes of batch with their tag and ingredient links in one transaction"""
+    if not batch:
+      return 0
+    with transaction.atomic():
+      tag_ids = self.tags.resolve(name for _, tags, _ in batch for name in tags)
+      ingredient_ids = self.ingredients.resolve(name for _, _, ingredients in batch for name in ingredients)
+      recipe_ids = self.insert_recipes(user, [values for values, _, _ in batch])
+
+      tag_links = set()
+      ingredient_links = set()
+      for recipe_id, (_, tags, ingredients) in zip(recipe_ids, batch):
+        tag_links.update((recipe_id, tag_ids[normalize_name(name)]) for name in tags)
+        ingredient_links.update((recipe_id, ingredient_ids[normalize_name(name)]) for name in ingredients)
+      self.insert_links(Recipe.tags.through, 'tag_id', tag_links)
+      self.insert_links(Recipe.ingredients.through, 'ingredient_id', ingredient_links)
+      search.update_documents(recipe_ids)
+
+    bump_content_version(user.pk)
+    return len(recipe_ids)
+
+  def insert_recipes(self, user, rows):
+    """Insert recipes and return their ids in order"""
+    recipes = [Recipe(user=user, **values) for values in rows]
+    if not self.copy:
+      return [recipe.pk for recipe in Recipe.objects.bulk_create(recipes)]
+
+    # COPY returns nothing, so the ids are drawn from the sequence up front
+    table = Recipe._meta.db_table
+    with connection.cursor() as cursor:
+      cursor.execute(
+        "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+        [table, len(recipes)],
+      )
+      for recipe, (pk,) in zip(recipes, cursor.fetchall()):
+        recipe.pk = pk
+    fields = Recipe._meta.concrete_fields
+    copy_rows(
+      connection.ops.quote_name(table),
+      [connection.ops.quote_name(field.column) for field in fields],
+      [[field.get_db_prep_save(getattr(recipe, field.attname), connection) for field in fields] for recipe in recipes],
+    )
+    return [recipe.pk for recipe in recipes]
+
+  def insert_links(self, through, column, links):
+    if not links:
+      return
+    if self.copy:
+      copy_rows(connection.ops.quote_name(through._meta.db_table), ['recipe_id', column], links)
+    else:
+      through.objects.bulk_create([through(**{'recipe_id': recipe_id, column: pk}) for recipe_id, pk in links])
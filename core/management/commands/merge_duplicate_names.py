@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from core.etags import bump_content_version
+from core.models import Tag, Ingredient, Recipe
+from core.normalization import merge_duplicate_names
+
+from recipe import search
+from recipe.cache import recipe_detail_cache
+
+
+class Command(BaseCommand):
+  """Django command to merge tags and ingredients whose names only differ in case or spacing"""
+  help = (
+    'Merge duplicate tags and ingredients of each user into the oldest one, '
+    'moving their recipe links. Run it after migration core 0012 to keep 0013 short.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--batch-size', type=int, default=500, help='duplicate groups merged per transaction')
+    parser.add_argument('--dry-run', action='store_true', help='only report how many rows would be merged')
+
+  def refresh(self, user_ids, recipe_ids):
+    """Drop cached representations of the recipes whose links moved"""
+    recipe_detail_cache.invalidate(*recipe_ids)
+    search.update_documents(recipe_ids)
+    for user_id in user_ids:
+      bump_content_version(user_id)
+
+  def handle(self, *args, **options):
+    for model, relation in ((Tag, 'tags'), (Ingredient, 'ingredients')):
+      groups, merged = merge_duplicate_names(
+        model, Recipe, relation,
+        batch_size=options['batch_size'],
+        dry_run=options['dry_run'],
+        on_batch=self.refresh,
+      )
+      verb = 'Would merge' if options['dry_run'] else 'Merged'
+      self.stdout.write(self.style.SUCCESS(
+        f'{verb} {merged} duplicate {model._meta.verbose_name_plural} in {groups} groups'
+      ))
@@ -1,20 +1,78 @@
-import time 
+import itertools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 class Command(BaseCommand):
   """Django command to pause execution until database is available"""
+  help = 'Wait until the databases accept queries, retrying with exponential backoff and jitter'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--database', action='append', dest='databases', help='alias to wait for, repeatable')
+    parser.add_argument('--all', action='store_true', help='wait for every configured alias, concurrently')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds to wait in total')
+    parser.add_argument('--initial-delay', type=float, default=0.1, help='seconds before the first retry')
+    parser.add_argument('--max-delay', type=float, default=5, help='longest pause between retries')
 
   def handle(self, *args, **options):
+    aliases = list(connections) if options['all'] else options['databases'] or ['default']
+    unknown = [alias for alias in aliases if alias not in connections.settings]
+    if unknown:
+      raise CommandError(f'Unknown database {", ".join(unknown)}')
+    if options['initial_delay'] <= 0 or options['max_delay'] <= 0:
+      raise CommandError('--initial-delay and --max-delay must be positive')
+
     self.stdout.write('Waiting for database...')
-    db_conn = None
+    started = time.monotonic()
+    self.deadline = started + options['timeout']
+    self.initial_delay = options['initial_delay']
+    self.max_delay = options['max_delay']
+
+    if len(aliases) == 1:
+      results = [self.wait(aliases[0])]
+    else:
+      with ThreadPoolExecutor(len(aliases)) as executor:
+        results = list(executor.map(self.wait_in_thread, aliases))
+
+    failed = [alias for alias, ready in zip(aliases, results) if not ready]
+    if failed:
+      raise CommandError(f'Database {", ".join(failed)} unavailable after {options["timeout"]:g}s')
+    self.stdout.write(self.style.SUCCESS(f'Database is available! ({time.monotonic() - started:.2f}s)'))
+
+  def probe(self, alias):
+    """Connect to alias and run a query"""
+    with connections[alias].cursor() as cursor:
+      cursor.execute('SELECT 1')
+      cursor.fetchone()
 
-    while not db_conn:
+  def wait(self, alias):
+    """Probe alias until it answers or the deadline passes, return whether it answered"""
+    started = time.monotonic()
+    for attempt in itertools.count(1):
       try:
-        db_conn = connections['defaults']
-      except OperationalError:
-        self.stdout.write('Database unavailable, waiting for 1 second...')
-        time.sleep(1)
+        self.probe(alias)
+      except OperationalError as e:
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+          self.stderr.write(f'Database {alias} unavailable: {e}')
+          return False
+        # full jitter keeps workers started together from retrying in step
+        # the capped exponent keeps long waits from overflowing the float
+        backoff = self.initial_delay * 2 ** min(attempt - 1, 32)
+        delay = min(remaining, random.uniform(0, min(self.max_delay, backoff)))
+        self.stdout.write(f'Database {alias} unavailable, retrying in {delay:.2f}s...')
+        time.sleep(delay)
+      else:
+        self.stdout.write(f'Database {alias} ready after {time.monotonic() - started:.2f}s ({attempt} attempts)')
+        return True
 
-    self.stdout.write(self.style.SUCCESS('Database is available!'))
\ No newline at end of file
+  def wait_in_thread(self, alias):
+    try:
+      return self.wait(alias)
+    finally:
+      # connections are per thread, don't leave this one open
+      connections[alias].close()
@@ -0,0 +1,326 @@
+import bisect
+import contextlib
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+import traceback
+
+from django.conf import settings
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# parts of a request timed separately, overlapping: auth and serializer time include their queries
+PHASES = ('db', 'auth', 'serializer')
+
+# collector values of processes that wrote no snapshot for this long are
+# left out, their worker most likely exited
+STALE_SNAPSHOT_SECONDS = 300
+
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class Histogram:
+  """Prometheus histogram with one series per label values"""
+  kind = 'histogram'
+
+  def __init__(self, name, help, labels, buckets):
+    self.name = name
+    self.help = help
+    self.labels = labels
+    self.buckets = buckets
+    self._lock = threading.Lock()
+    self._series = {}
+
+  def observe(self, value, *label_values):
+    with self._lock:
+      series = self._series.get(label_values)
+      if series is None:
+        series = self._series[label_values] = [[0] * len(self.buckets), 0, 0]
+      # counts per bucket, made cumulative when rendered
+      index = bisect.bisect_left(self.buckets, value)
+      if index < len(self.buckets):
+        series[0][index] += 1
+      series[1] += 1
+      series[2] += value
+
+  def dump(self):
+    """Return the series as JSON serializable rows"""
+    with self._lock:
+      return [[list(labels), list(counts), count, total] for labels, (counts, count, total) in self._series.items()]
+
+  def merge(self, dumps):
+    """Return the series of dumps, summed per label values"""
+    merged = {}
+    for dump in dumps:
+      for labels, counts, count, total in dump:
+        series = merged.setdefault(tuple(labels), [[0] * len(self.buckets), 0, 0])
+        series[0] = [a + b for a, b in zip(series[0], counts)]
+        series[1] += count
+        series[2] += total
+    return merged
+
+  def samples(self, series=None):
+    if series is None:
+      series = self.merge([self.dump()])
+    for label_values, (counts, count, total) in sorted(series.items()):
+      labels = list(zip(self.labels, label_values))
+      cumulative = 0
+      for bound, bucket_count in zip(self.buckets, counts):
+        cumulative += bucket_count
+        yield '_bucket', labels + [('le', f'{bound:g}')], cumulative
+      yield '_bucket', labels + [('le', '+Inf')], count
+      yield '_count', labels, count
+      yield '_sum', labels, total
+
+  def clear(self):
+    with self._lock:
+      self._series.clear()
+
+
+class Counter:
+  """Prometheus counter with one series per label values"""
+  kind = 'counter'
+
+  def __init__(self, name, help, labels):
+    self.name = name
+    self.help = help
+    self.labels = labels
+    self._lock = threading.Lock()
+    self._series = {}
+
+  def inc(self, *label_values, amount=1):
+    with self._lock:
+      self._series[label_values] = self._series.get(label_values, 0) + amount
+
+  def dump(self):
+    """Return the series as JSON serializable rows"""
+    with self._lock:
+      return [[list(labels), value] for labels, value in self._series.items()]
+
+  def merge(self, dumps):
+    """Return the series of dumps, summed per label values"""
+    merged = {}
+    for dump in dumps:
+      for labels, value in dump:
+        merged[tuple(labels)] = merged.get(tuple(labels), 0) + value
+    return merged
+
+  def samples(self, series=None):
+    if series is None:
+      series = self.merge([self.dump()])
+    for label_values, value in sorted(series.items()):
+      yield '', list(zip(self.labels, label_values)), value
+
+  def clear(self):
+    with self._lock:
+      self._series.clear()
+
+
+REQUEST_DURATION = Histogram(
+  'http_request_duration_seconds', 'Wall time of requests', ('route', 'method'), DURATION_BUCKETS,
+)
+REQUEST_PHASE_DURATION = Histogram(
+  'http_request_phase_duration_seconds', 'Time requests spent in database queries, authentication and serializers',
+  ('route', 'method', 'phase'), DURATION_BUCKETS,
+)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Size of response bodies', ('route', 'method'), SIZE_BUCKETS)
+REQUESTS = Counter('http_requests_total', 'Requests answered', ('route', 'method', 'status'))
+DB_QUERIES = Counter('http_request_db_queries_total', 'Database queries run by requests', ('route', 'method'))
+
+METRICS = (REQUEST_DURATION, REQUEST_PHASE_DURATION, RESPONSE_SIZE, REQUESTS, DB_QUERIES)
+
+
+def _escape(value):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+  if not pairs:
+    return ''
+  return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format(name, kind, help, samples):
+  lines = [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+  for suffix, pairs, value in samples:
+    lines.append(f'{name}{suffix}{_labels(pairs)} {value:g}')
+  return lines
+
+
+# callables returning (name, kind, help, [(labels dict, value)]) for
+# values other modules count themselves, like cache and pool counters
+collectors = []
+
+
+def register_collector(collector):
+  """Include collector's values in render()"""
+  if collector not in collectors:
+    collectors.append(collector)
+  return collector
+
+
+def render():
+  """Return the metrics in the Prometheus text format
+
+  Without PERF_METRICS_DIR these are the metrics of this process only.
+  With it, request metrics are summed over the snapshots every process
+  writes there, and collector values get a pid label per process.
+  """
+  if settings.PERF_METRICS_DIR:
+    flush(force=True)
+    return _render_snapshots(_read_snapshots())
+
+  lines = []
+  for metric in METRICS:
+    lines += _format(metric.name, metric.kind, metric.help, metric.samples())
+  for collector in collectors:
+    for name, kind, help, values in collector():
+      lines += _format(name, kind, help, (('', list(labels.items()), value) for labels, value in values))
+  return '\n'.join(lines) + '\n'
+
+
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def _snapshot_path(pid):
+  return os.path.join(settings.PERF_METRICS_DIR, f'metrics-{pid}.json')
+
+
+def flush(force=False):
+  """Write this process's metrics to PERF_METRICS_DIR, at most every PERF_METRICS_FLUSH_INTERVAL seconds"""
+  global _last_flush
+  if not settings.PERF_METRICS_DIR:
+    return
+  if not _flush_lock.acquire(blocking=force):
+    return
+  try:
+    now = time.monotonic()
+    if not force and now - _last_flush < settings.PERF_METRICS_FLUSH_INTERVAL:
+      return
+    _last_flush = now
+    snapshot = {
+      'pid': os.getpid(),
+      'written': time.time(),
+      'metrics': {metric.name: metric.dump() for metric in METRICS},
+      'collected': [
+        [name, kind, help, [[labels, value] for labels, value in values]]
+        for collector in collectors
+        for name, kind, help, values in collector()
+      ],
+    }
+    path = _snapshot_path(os.getpid())
+    with open(f'{path}.tmp', 'w') as f:
+      json.dump(snapshot, f)
+    # readers never see a half written file
+    os.replace(f'{path}.tmp', path)
+  finally:
+    _flush_lock.release()
+
+
+def _read_snapshots():
+  snapshots = []
+  for path in sorted(glob.glob(os.path.join(settings.PERF_METRICS_DIR, 'metrics-*.json'))):
+    try:
+      with open(path) as f:
+        snapshots.append(json.load(f))
+    except (OSError, ValueError):
+      # removed or replaced while listing
+      continue
+  return snapshots
+
+
+def _render_snapshots(snapshots):
+  lines = []
+  for metric in METRICS:
+    series = metric.merge(snapshot['metrics'].get(metric.name, []) for snapshot in snapshots)
+    lines += _format(metric.name, metric.kind, metric.help, metric.samples(series))
+
+  # gauges like pool sizes cannot be summed, each process keeps its own series
+  collected = {}
+  fresh_after = time.time() - STALE_SNAPSHOT_SECONDS
+  for snapshot in snapshots:
+    if snapshot['written'] < fresh_after:
+      continue
+    for name, kind, help, values in snapshot['collected']:
+      entry = collected.setdefault(name, (kind, help, []))
+      entry[2].extend(
+        ('', list(labels.items()) + [('pid', snapshot['pid'])], value) for labels, value in values
+      )
+  for name, (kind, help, samples) in collected.items():
+    lines += _format(name, kind, help, samples)
+  return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+  """Timings collected while one request is handled"""
+
+  def __init__(self):
+    self.started = time.perf_counter()
+    self.db_queries = 0
+    # seconds per phase, see PHASES
+    self.timings = dict.fromkeys(PHASES, 0.0)
+    # (sql, seconds, stack or None) of the first PERF_CAPTURED_QUERIES queries
+    self.queries = []
+
+
+def start_request():
+  """Start collecting timings for the current request and return them"""
+  stats = RequestStats()
+  return stats, _request_stats.set(stats)
+
+
+def end_request(token):
+  _request_stats.reset(token)
+
+
+@contextlib.contextmanager
+def timer(phase):
+  """Add the time spent in the block to phase of the current request"""
+  stats = _request_stats.get()
+  if stats is None:
+    yield
+    return
+  started = time.perf_counter()
+  try:
+    yield
+  finally:
+    stats.timings[phase] += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+  """Database execute wrapper adding each query to the current request's stats"""
+  stats = _request_stats.get()
+  if stats is None:
+    return execute(sql, params, many, context)
+  started = time.perf_counter()
+  try:
+    return execute(sql, params, many, context)
+  finally:
+    elapsed = time.perf_counter() - started
+    stats.db_queries += 1
+    stats.timings['db'] += elapsed
+    if len(stats.queries) < settings.PERF_CAPTURED_QUERIES:
+      # stacks are only worth their cost for the slow queries
+      stack = traceback.format_stack()[:-2] if elapsed * 1000 >= settings.PERF_SLOW_QUERY_MS else None
+      stats.queries.append((sql, elapsed, stack))
+
+
+def install_query_recorder(connection):
+  """Add record_query to connection"""
+  if record_query not in connection.execute_wrappers:
+    connection.execute_wrappers.append(record_query)
+
+
+class TimedSerializerMixin:
+  """Count serializer.data towards the request's serializer time"""
+
+  @property
+  def data(self):
+    with timer('serializer'):
+      return super().data
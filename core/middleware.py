@@ -0,0 +1,110 @@
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+
+from core import metrics
+
+
+logger = logging.getLogger('core.performance')
+
+
+class PerformanceMiddleware:
+  """Record wall, database, authentication and serializer time and response size per route
+
+  Each request updates the Prometheus histograms in core.metrics and gets
+  a Server-Timing header. Requests slower than PERF_SLOW_REQUEST_MS are
+  sampled to the core.performance log with their SQL and the stacks of
+  slow queries, at most once per route every PERF_SLOW_SAMPLE_INTERVAL
+  seconds, and only PERF_SLOW_SAMPLE_RATE of them. With PERF_METRICS_DIR
+  set, the metrics are also written there for /api/metrics/ to merge.
+  Works for sync and async views without a thread hop.
+  """
+  sync_capable = True
+  async_capable = True
+
+  def __init__(self, get_response):
+    self.get_response = get_response
+    self._lock = threading.Lock()
+    self._last_sample = {}
+    if iscoroutinefunction(get_response):
+      markcoroutinefunction(self)
+
+  def __call__(self, request):
+    if iscoroutinefunction(self):
+      return self.__acall__(request)
+    if not settings.PERF_INSTRUMENTATION:
+      return self.get_response(request)
+    stats, token = metrics.start_request()
+    try:
+      response = self.get_response(request)
+    finally:
+      metrics.end_request(token)
+    return self.finish(request, response, stats)
+
+  async def __acall__(self, request):
+    if not settings.PERF_INSTRUMENTATION:
+      return await self.get_response(request)
+    stats, token = metrics.start_request()
+    try:
+      response = await self.get_response(request)
+    finally:
+      metrics.end_request(token)
+    return self.finish(request, response, stats)
+
+  def route(self, request):
+    match = getattr(request, 'resolver_match', None)
+    # view names keep the label set small, paths would not
+    return match.view_name if match else 'unmatched'
+
+  def finish(self, request, response, stats):
+    elapsed = time.perf_counter() - stats.started
+    route = self.route(request)
+    labels = (route, request.method)
+
+    metrics.REQUEST_DURATION.observe(elapsed, *labels)
+    for phase, seconds in stats.timings.items():
+      metrics.REQUEST_PHASE_DURATION.observe(seconds, *labels, phase)
+    metrics.REQUESTS.inc(*labels, response.status_code)
+    metrics.DB_QUERIES.inc(*labels, amount=stats.db_queries)
+    if not response.streaming:
+      metrics.RESPONSE_SIZE.observe(len(response.content), *labels)
+
+    response['Server-Timing'] = ', '.join(
+      [f'db;dur={stats.timings["db"] * 1000:.1f};desc="{stats.db_queries} queries"']
+      + [f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in stats.timings.items() if phase != 'db']
+      + [f'total;dur={elapsed * 1000:.1f}']
+    )
+    if elapsed * 1000 >= settings.PERF_SLOW_REQUEST_MS and self.should_sample(route):
+      self.sample(request, response, route, elapsed, stats)
+    metrics.flush()
+    return response
+
+  def should_sample(self, route):
+    if random.random() >= settings.PERF_SLOW_SAMPLE_RATE:
+      return False
+    now = time.monotonic()
+    with self._lock:
+      last = self._last_sample.get(route)
+      if last is not None and now - last < settings.PERF_SLOW_SAMPLE_INTERVAL:
+        return False
+      self._last_sample[route] = now
+    return True
+
+  def sample(self, request, response, route, elapsed, stats):
+    lines = [
+      f'Slow request {request.method} {request.path} ({route}) {response.status_code}: '
+      f'{elapsed * 1000:.0f}ms, {stats.db_queries} queries in {stats.timings["db"] * 1000:.0f}ms, '
+      f'auth {stats.timings["auth"] * 1000:.0f}ms, serializer {stats.timings["serializer"] * 1000:.0f}ms'
+    ]
+    for sql, duration, stack in stats.queries:
+      lines.append(f'  {duration * 1000:8.1f}ms {sql}')
+      if stack:
+        lines.extend('    ' + line for frame in stack for line in frame.rstrip().splitlines())
+    if stats.db_queries > len(stats.queries):
+      lines.append(f'  ... {stats.db_queries - len(stats.queries)} more queries')
+    logger.warning('\n'.join(lines))
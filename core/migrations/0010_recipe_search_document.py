@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:26
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+def populate_search_documents(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        # other databases use recipe.search's in-process index
+        return
+    schema_editor.execute(
+        '''
+        UPDATE core_recipe r SET search_document =
+            setweight(to_tsvector(%(config)s::regconfig, r.title), 'A') ||
+            setweight(to_tsvector(%(config)s::regconfig, coalesce((
+                SELECT string_agg(t.name, ' ') FROM core_tag t
+                JOIN core_recipe_tags rt ON rt.tag_id = t.id WHERE rt.recipe_id = r.id
+            ), '')), 'B') ||
+            setweight(to_tsvector(%(config)s::regconfig, coalesce((
+                SELECT string_agg(i.name, ' ') FROM core_ingredient i
+                JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id WHERE ri.recipe_id = r.id
+            ), '')), 'C')
+        ''',
+        {'config': getattr(settings, 'SEARCH_CONFIG', 'english')},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_image_content_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_document'], name='core_recipe_search_gin_idx'),
+        ),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+from core.normalization import populate_normalized_names
+
+
+def populate(apps, schema_editor):
+    for model_name in ('Tag', 'Ingredient'):
+        populate_normalized_names(apps.get_model('core', model_name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
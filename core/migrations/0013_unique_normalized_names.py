@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+from core.normalization import merge_duplicate_names
+
+
+def merge(apps, schema_editor):
+    # large tables are better merged ahead with the merge_duplicate_names
+    # command, which commits per batch, leaving nothing to do here
+    recipe = apps.get_model('core', 'Recipe')
+    merge_duplicate_names(apps.get_model('core', 'Tag'), recipe, 'tags')
+    merge_duplicate_names(apps.get_model('core', 'Ingredient'), recipe, 'ingredients')
+    if schema_editor.connection.vendor == 'postgresql':
+        # run the deferred foreign key checks of the deletes before the tables are altered
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_normalized_names'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='core_ingredient_user_normalized_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='core_tag_user_normalized_name_uniq'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+# admin search_fields use icontains, i.e. UPPER(column) LIKE UPPER('%term%')
+TRIGRAM_INDEXES = (
+    ('core_recipe_title_trgm_idx', 'core_recipe', 'title'),
+    ('core_user_email_trgm_idx', 'core_user', 'email'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # like 0011, PostgreSQL only and kept out of the model state
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ((UPPER("{column}")) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_unique_normalized_names'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
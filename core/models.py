@@ -7,14 +7,18 @@ from django.contrib.auth.models import(
   PermissionsMixin
   )
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+
+from core.storage import recipe_image_storage
+from core.normalization import normalize_name
 
 
 def recipe_image_file_path(instance, filename):
   """Generate filepath for new recipe image"""
   ext = filename.split('.')[-1]
   filename = f'{uuid.uuid4()}.{ext}'
-  print(instance._meta.model.__name__)
-  # if(instance._meta.model.__name__ == 'Recipe')
+  # only a placeholder, the storage renames the file after its content hash
   return os.path.join('uploads/recipe/', filename)
 
 
@@ -41,6 +45,7 @@ class UserManager(BaseUserManager):
 
 class User(AbstractBaseUser, PermissionsMixin):
   """Custom user model that supports email instead of username"""
+  # admin search also has core_user_email_trgm_idx on UPPER(email), migration 0014 on PostgreSQL
   email = models.EmailField(max_length=255, unique=True)
   name = models.CharField(max_length=255)
   is_active = models.BooleanField(default=True)
@@ -51,19 +56,65 @@ class User(AbstractBaseUser, PermissionsMixin):
   USERNAME_FIELD = 'email'
 
 
+class NormalizedNameManager(models.Manager):
+
+  def bulk_create(self, objs, *args, **kwargs):
+    """Fill normalized_name, which bulk_create would skip by not calling save()"""
+    objs = list(objs)
+    for obj in objs:
+      obj.normalized_name = normalize_name(obj.name)
+    return super().bulk_create(objs, *args, **kwargs)
+
+
 class Tag(models.Model):
   """Tag to be userd for recipe"""
   name = models.CharField(max_length=255)
+  # name folded by normalize_name, unique per user so "Salt" and "salt " are one row
+  normalized_name = models.CharField(max_length=255, editable=False)
   user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+  objects = NormalizedNameManager()
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=['user', 'normalized_name'], name='core_tag_user_normalized_name_uniq'),
+    ]
+    indexes = [
+      models.Index(fields=['user', 'name'], name='core_tag_user_name_idx'),
+      models.Index(fields=['user', '-id'], name='core_tag_user_id_idx'),
+      # core_tag_name_trgm_idx on UPPER(name) is created by migration 0011 on PostgreSQL
+    ]
+
+  def save(self, *args, **kwargs):
+    self.normalized_name = normalize_name(self.name)
+    super().save(*args, **kwargs)
+
   def __str__(self):
     return self.name
 
 class Ingredient(models.Model):
   """Ingredienta to be used in recipe"""
   name = models.CharField(max_length=255)
+  # name folded by normalize_name, unique per user so "Salt" and "salt " are one row
+  normalized_name = models.CharField(max_length=255, editable=False)
   user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+  objects = NormalizedNameManager()
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=['user', 'normalized_name'], name='core_ingredient_user_normalized_name_uniq'),
+    ]
+    indexes = [
+      models.Index(fields=['user', 'name'], name='core_ingredient_user_name_idx'),
+      models.Index(fields=['user', '-id'], name='core_ingredient_user_id_idx'),
+      # core_ingredient_name_trgm_idx on UPPER(name) is created by migration 0011 on PostgreSQL
+    ]
+
+  def save(self, *args, **kwargs):
+    self.normalized_name = normalize_name(self.name)
+    super().save(*args, **kwargs)
+
   def __str__(self):
       return self.name
   
@@ -75,7 +126,37 @@ class Recipe(models.Model):
   link = models.CharField(max_length=255, blank=True)
   ingredients = models.ManyToManyField('Ingredient')
   tags = models.ManyToManyField('Tag') # quote because without it class needs to be in order i.e recipe above Ingredient
-  image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+  image = models.ImageField(null=True, upload_to=recipe_image_file_path, storage=recipe_image_storage, db_index=True)
+
+  class ImageStatus(models.TextChoices):
+    NONE = 'none'
+    PENDING = 'pending'
+    READY = 'ready'
+    FAILED = 'failed'
+
+  image_status = models.CharField(max_length=10, choices=ImageStatus.choices, default=ImageStatus.NONE)
+  image_thumbnail = models.ImageField(null=True, blank=True, storage=recipe_image_storage, db_index=True)
+  image_medium = models.ImageField(null=True, blank=True, storage=recipe_image_storage, db_index=True)
+  # title, tag and ingredient names, kept up to date by recipe.search
+  search_document = SearchVectorField(null=True, editable=False)
+
+  class Meta:
+    indexes = [
+      models.Index(fields=['user', 'title'], name='core_recipe_user_title_idx'),
+      models.Index(fields=['user', '-id'], name='core_recipe_user_id_idx'),
+      GinIndex(fields=['search_document'], name='core_recipe_search_gin_idx'),
+      # core_recipe_title_trgm_idx on UPPER(title) is created by migration 0014 on PostgreSQL
+    ]
+
+  @classmethod
+  def from_db(cls, db, field_names, values):
+    instance = super().from_db(db, field_names, values)
+    # remember stored image names to find blobs a save orphans
+    instance._loaded_images = {
+      name: value for name, value in zip(field_names, values)
+      if name in ('image', 'image_thumbnail', 'image_medium')
+    }
+    return instance
 
   def __str__(self):
       return self.title
@@ -0,0 +1,86 @@
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Count, Min, Q
+
+
+def normalize_name(name):
+  """Return the form of a tag or ingredient name that duplicates share"""
+  return ' '.join(unicodedata.normalize('NFKC', name).split()).casefold()
+
+
+def recipe_relation(recipe_model, relation):
+  """Return (through model, column) linking recipes to relation's model"""
+  field = recipe_model._meta.get_field(relation)
+  return field.remote_field.through, f'{field.m2m_reverse_field_name()}_id'
+
+
+def populate_normalized_names(model, batch_size=1000):
+  """Fill normalized_name of every row of model"""
+  last_id = 0
+  while True:
+    rows = list(model.objects.filter(pk__gt=last_id).order_by('pk').only('pk', 'name')[:batch_size])
+    if not rows:
+      return
+    for row in rows:
+      row.normalized_name = normalize_name(row.name)
+    model.objects.bulk_update(rows, ['normalized_name'])
+    last_id = rows[-1].pk
+
+
+def merge_duplicate_names(model, recipe_model, relation, batch_size=500, dry_run=False, on_batch=None):
+  """Merge rows of model sharing a user and normalized_name into the oldest one
+
+  Recipe links of the duplicates are moved to the kept row before the
+  duplicates are deleted, one transaction per batch of duplicate groups.
+  on_batch(user_ids, recipe_ids) is called after each batch commits.
+  Returns (groups, rows) merged.
+  """
+  duplicate_groups = (
+    model.objects.values('user_id', 'normalized_name')
+    .annotate(count=Count('pk'), keep=Min('pk')).filter(count__gt=1)
+    .order_by('user_id', 'normalized_name')
+  )
+  if dry_run:
+    counts = [group['count'] for group in duplicate_groups.iterator()]
+    return len(counts), sum(counts) - len(counts)
+
+  through, column = recipe_relation(recipe_model, relation)
+  groups = merged = 0
+  while True:
+    duplicates = list(duplicate_groups[:batch_size])
+    if not duplicates:
+      break
+
+    keep = {(group['user_id'], group['normalized_name']): group['keep'] for group in duplicates}
+    match = Q()
+    for user_id, normalized_name in keep:
+      match |= Q(user_id=user_id, normalized_name=normalized_name)
+    replace = {
+      pk: keep[(user_id, normalized_name)]
+      for pk, user_id, normalized_name in model.objects.filter(match).values_list('pk', 'user_id', 'normalized_name')
+      if pk != keep[(user_id, normalized_name)]
+    }
+    groups += len(duplicates)
+    merged += len(replace)
+
+    recipe_ids = set()
+    with transaction.atomic():
+      pks = list(replace)
+      # chunked so no statement exceeds the database's parameter limit
+      for start in range(0, len(pks), batch_size):
+        chunk = pks[start:start + batch_size]
+        links = list(through.objects.filter(**{f'{column}__in': chunk}).values_list('recipe_id', column))
+        through.objects.bulk_create(
+          [through(**{'recipe_id': recipe_id, column: replace[pk]}) for recipe_id, pk in links],
+          ignore_conflicts=True,
+          batch_size=batch_size,
+        )
+        through.objects.filter(**{f'{column}__in': chunk}).delete()
+        model.objects.filter(pk__in=chunk).delete()
+        recipe_ids.update(recipe_id for recipe_id, _ in links)
+
+    if on_batch:
+      on_batch({user_id for user_id, _ in keep}, recipe_ids)
+
+  return groups, merged
@@ -0,0 +1,79 @@
+import contextlib
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def _cache():
+  return caches[settings.CONTENT_VERSION_CACHE_ALIAS]
+
+
+def _pin_key(user_id):
+  return f'user:{user_id}:primary-pinned'
+
+
+def pin_to_primary(user_id):
+  """Send reads of user_id to the primary until replicas caught up with a write"""
+  if settings.DATABASE_REPLICAS:
+    _cache().set(_pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def pinned_to_primary(user_id):
+  """Return whether user_id wrote within the last REPLICA_PIN_SECONDS"""
+  return bool(settings.DATABASE_REPLICAS) and _cache().get(_pin_key(user_id), False)
+
+
+async def apinned_to_primary(user_id):
+  """Return whether user_id wrote within the last REPLICA_PIN_SECONDS, from async code"""
+  return bool(settings.DATABASE_REPLICAS) and await _cache().aget(_pin_key(user_id), False)
+
+
+@contextlib.contextmanager
+def replica_reads(enabled=True):
+  """Let queries run in the block read from a replica"""
+  token = _replica_reads.set(enabled)
+  try:
+    yield
+  finally:
+    _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+  """Send reads inside replica_reads() to a random replica, everything else to the primary"""
+
+  def db_for_read(self, model, **hints):
+    if _replica_reads.get() and settings.DATABASE_REPLICAS:
+      return random.choice(settings.DATABASE_REPLICAS)
+    return 'default'
+
+  def db_for_write(self, model, **hints):
+    return 'default'
+
+  def allow_relation(self, obj1, obj2, **hints):
+    # replicas hold the same rows as the primary
+    return True
+
+  def allow_migrate(self, db, app_label, model_name=None, **hints):
+    # replicas get their schema through replication
+    return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaReadMixin:
+  """Serve safe requests of a viewset from a replica unless the user wrote recently"""
+
+  def dispatch(self, request, *args, **kwargs):
+    # closed whatever happens, an exception escaping the handler must not
+    # leave the thread reading from replicas
+    with contextlib.ExitStack() as self._replica_scope:
+      return super().dispatch(request, *args, **kwargs)
+
+  def initial(self, request, *args, **kwargs):
+    super().initial(request, *args, **kwargs)
+    # authentication and the ETag check ran above, against the primary
+    if request.method in ('GET', 'HEAD') and not pinned_to_primary(request.user.pk):
+      self._replica_scope.enter_context(replica_reads())
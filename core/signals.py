@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Tag, Ingredient, Recipe
+from core.etags import bump_content_version
+from core.authentication import token_cache, invalidate_user_tokens
+from core.metrics import install_query_recorder
+from core.storage import RECIPE_IMAGE_FIELDS, collect_orphans
+
+
+@receiver(connection_created)
+def record_request_queries(sender, connection, **kwargs):
+  """Time the queries of instrumented requests on every new connection"""
+  install_query_recorder(connection)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_owner_version(sender, instance, **kwargs):
+  """Change the content version of the owner of a changed row"""
+  bump_content_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_recipe_relations_version(sender, instance, action, **kwargs):
+  """Change the content version when recipe tags or ingredients change"""
+  if action.startswith('post_'):
+    bump_content_version(instance.user_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def bump_user_version(sender, instance, **kwargs):
+  """Change the content version when the user profile changes"""
+  bump_content_version(instance.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_token_cache(sender, instance, created, **kwargs):
+  """Drop cached tokens so deactivation and password changes apply at once"""
+  if not created:
+    invalidate_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+  """Drop a deleted token from the cache"""
+  token_cache.invalidate(instance.key)
+
+
+def _image_names(instance):
+  return {field: getattr(instance, field).name for field in RECIPE_IMAGE_FIELDS}
+
+
+@receiver(post_save, sender=Recipe)
+def collect_replaced_images(sender, instance, **kwargs):
+  """Delete image blobs a recipe stopped referencing once nobody else does"""
+  current = _image_names(instance)
+  loaded = getattr(instance, '_loaded_images', {})
+  replaced = [name for field, name in loaded.items() if name and name != current[field]]
+  instance._loaded_images = current
+  if replaced:
+    transaction.on_commit(lambda: collect_orphans(replaced))
+
+
+@receiver(post_delete, sender=Recipe)
+def collect_deleted_images(sender, instance, **kwargs):
+  """Delete image blobs of a deleted recipe once nobody else references them"""
+  names = list(_image_names(instance).values())
+  transaction.on_commit(lambda: collect_orphans(names))
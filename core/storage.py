@@ -0,0 +1,108 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db.models import Q
+from django.utils.deconstruct import deconstructible
+
+
+RECIPE_IMAGE_FIELDS = ('image', 'image_thumbnail', 'image_medium')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+  """File storage that names every file after the SHA-256 of its content
+
+  Uploads are hashed while they are streamed to a temporary file next to
+  their destination. Identical content therefore maps to one blob,
+  stored once under `<content_dir>/<h[:2]>/<h><ext>`. Deleting blobs is
+  left to `collect_orphans`, which checks no recipe still references them.
+  """
+
+  def __init__(self, content_dir='uploads/recipe', **kwargs):
+    self.content_dir = content_dir
+    super().__init__(**kwargs)
+
+  def get_available_name(self, name, max_length=None):
+    # the final name is only known once the content is hashed
+    return name
+
+  def _save(self, name, content):
+    ext = os.path.splitext(name)[1].lower()
+    tmp_dir = self.path(self.content_dir)
+    os.makedirs(tmp_dir, exist_ok=True)
+    hasher = hashlib.sha256()
+
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix='.part')
+    try:
+      with os.fdopen(fd, 'wb') as tmp:
+        for chunk in content.chunks():
+          hasher.update(chunk)
+          tmp.write(chunk)
+
+      digest = hasher.hexdigest()
+      final_name = f'{self.content_dir}/{digest[:2]}/{digest}{ext}'
+      final_path = self.path(final_name)
+      if os.path.exists(final_path):
+        # already stored, refresh mtime so a concurrent orphan sweep keeps it
+        os.utime(final_path)
+        os.remove(tmp_path)
+      else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+          os.chmod(tmp_path, self.file_permissions_mode)
+        os.replace(tmp_path, final_path)
+    except BaseException:
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+      raise
+
+    return final_name
+
+  def is_recent(self, name, seconds):
+    """Return whether name was written or re-uploaded in the last seconds"""
+    try:
+      return time.time() - os.path.getmtime(self.path(name)) < seconds
+    except FileNotFoundError:
+      return False
+
+
+recipe_image_storage = ContentAddressedStorage()
+
+
+def referenced_names(names):
+  """Return which of names a recipe image field still points to"""
+  Recipe = apps.get_model('core', 'Recipe')
+  query = Q()
+  for field in RECIPE_IMAGE_FIELDS:
+    query |= Q(**{f'{field}__in': names})
+
+  referenced = set()
+  for row in Recipe.objects.filter(query).values_list(*RECIPE_IMAGE_FIELDS):
+    referenced.update(row)
+  return referenced
+
+
+def collect_orphans(names, grace=None):
+  """Delete the blobs in names no recipe references any more
+
+  Blobs written within the grace period are kept, since an upload of the
+  same content may not have committed its reference yet. Returns the
+  deleted names.
+  """
+  if grace is None:
+    grace = settings.RECIPE_IMAGE_ORPHAN_GRACE
+  names = {name for name in names if name}
+  if not names:
+    return []
+
+  deleted = []
+  for name in sorted(names - referenced_names(names)):
+    if not recipe_image_storage.is_recent(name, grace):
+      recipe_image_storage.delete(name)
+      deleted.append(name)
+  return deleted
@@ -1,7 +1,14 @@
+from unittest.mock import patch
+
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.admin import EstimatedCountPaginator
+from core.models import Recipe, Tag, Ingredient
+
 class AdminSiteTests(TestCase):
 
   def setUp(self):
@@ -38,4 +45,66 @@ class AdminSiteTests(TestCase):
     url = reverse('admin:core_user_add')
     res = self.client.get(url)
 
-    self.assertEqual(res.status_code, 200)
\ No newline at end of file
+    self.assertEqual(res.status_code, 200)
+
+
+class RecipeAdminTests(TestCase):
+  """Test the recipe, tag and ingredient admin pages"""
+
+  def setUp(self):
+    self.client = Client()
+    self.admin_user = get_user_model().objects.create_superuser('admin@gmail.com', 'admin123')
+    self.client.force_login(self.admin_user)
+
+  def create_recipes(self, count):
+    for i in range(count):
+      user = get_user_model().objects.create_user(f'user{Recipe.objects.count()}@gmail.com', 'testpass123')
+      recipe = Recipe.objects.create(user=user, title=f'Recipe {i}', time_minutes=5, price=1.00)
+      recipe.tags.add(Tag.objects.create(user=user, name=f'Tag {i}'))
+      recipe.ingredients.add(Ingredient.objects.create(user=user, name=f'Ingredient {i}'))
+
+  def queries(self, url):
+    with CaptureQueriesContext(connection) as ctx:
+      res = self.client.get(url)
+    self.assertEqual(res.status_code, 200)
+    return len(ctx.captured_queries)
+
+  def test_changelist_queries_constant(self):
+    """Test changelists run the same queries however many rows they show"""
+    for name in ('recipe', 'tag', 'ingredient'):
+      url = reverse(f'admin:core_{name}_changelist')
+      self.create_recipes(2)
+      few = self.queries(url)
+      self.create_recipes(5)
+      self.assertEqual(self.queries(url), few, name)
+
+  def test_change_form_loads_selected_relations_only(self):
+    """Test the recipe form does not list every tag and ingredient"""
+    self.create_recipes(5)
+    recipe = Recipe.objects.first()
+
+    res = self.client.get(reverse('admin:core_recipe_change', args=[recipe.id]))
+
+    self.assertContains(res, recipe.tags.get().name)
+    self.assertNotContains(res, Tag.objects.exclude(recipe=recipe).first().name)
+
+  def test_search(self):
+    """Test recipes can be searched by title"""
+    self.create_recipes(3)
+
+    res = self.client.get(reverse('admin:core_recipe_changelist'), {'q': 'recipe 1'})
+
+    self.assertContains(res, 'Recipe 1')
+    self.assertNotContains(res, 'Recipe 2')
+
+  def test_estimated_count_on_postgres(self):
+    """Test large PostgreSQL results are counted from the plan and small ones exactly"""
+    self.create_recipes(2)
+    queryset = Recipe.objects.order_by('-id')
+
+    with patch.object(connection, 'vendor', 'postgresql'), \
+         patch('core.admin.estimated_count', return_value=5_000_000):
+      self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 5_000_000)
+
+    with patch.object(connection, 'vendor', 'postgresql'), patch('core.admin.estimated_count', return_value=3):
+      self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 2)
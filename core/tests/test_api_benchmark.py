@@ -0,0 +1,111 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core import benchmark
+from core.management.commands.benchmark_api import ENDPOINTS as BENCHMARK_ENDPOINTS, Command, parse_dataset
+from core.models import Recipe
+
+
+ENDPOINTS = ('recipe list', 'recipe detail', 'tag create', 'user profile')
+
+
+class BenchmarkApiCommandTests(TestCase):
+  """Test the benchmark_api command"""
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.baseline = os.path.join(self.dir, 'baseline.json')
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def call(self, *args):
+    out = StringIO()
+    options = ['--dataset', '1x2x2x2', '--dataset', '2x6x4x4', '--samples', '2', '--baseline', self.baseline]
+    for endpoint in ENDPOINTS:
+      options += ['--endpoint', endpoint]
+    call_command('benchmark_api', *options, *args, stdout=out, stderr=StringIO())
+    return out.getvalue()
+
+  def test_update_and_check_baseline(self):
+    """Test results are recorded per dataset and endpoint and pass against themselves"""
+    self.call('--update-baseline')
+
+    with open(self.baseline) as f:
+      baseline = json.load(f)
+    self.assertEqual(sorted(baseline), ['1x2x2x2', '2x6x4x4'])
+    self.assertEqual(sorted(baseline['2x6x4x4']), sorted(ENDPOINTS))
+    self.assertGreater(baseline['2x6x4x4']['recipe list']['queries'], 0)
+    self.assertEqual(
+      set(baseline['2x6x4x4']['recipe list']),
+      {'queries', 'peak_kb', 'p50_ms', 'p95_ms', 'p99_ms'},
+    )
+    self.assertIn('No regressions', self.call('--check', '--latency-tolerance', '100', '--memory-tolerance', '100'))
+    self.assertFalse(Recipe.objects.exists())
+
+  def test_every_endpoint_runs(self):
+    """Test every endpoint answers without an error and leaves no data behind"""
+    out = StringIO()
+    call_command(
+      'benchmark_api', '--dataset', '1x2x3x3', '--samples', '1', '--baseline', self.baseline,
+      stdout=out, stderr=StringIO(),
+    )
+
+    for name in BENCHMARK_ENDPOINTS:
+      self.assertIn(name, out.getvalue())
+    self.assertFalse(Recipe.objects.exists())
+
+  def test_query_regression_fails(self):
+    """Test running more queries than the baseline fails the run"""
+    self.call('--update-baseline')
+    with open(self.baseline) as f:
+      baseline = json.load(f)
+    baseline['1x2x2x2']['recipe list']['queries'] -= 1
+    with open(self.baseline, 'w') as f:
+      json.dump(baseline, f)
+
+    with self.assertRaises(CommandError):
+      self.call('--check', '--latency-tolerance', '100', '--memory-tolerance', '100')
+
+  def test_missing_baseline(self):
+    """Test checking without a recorded baseline fails"""
+    with self.assertRaisesMessage(CommandError, 'No baseline'):
+      self.call('--check')
+
+  def test_queries_growing_with_data(self):
+    """Test endpoints running more queries on the larger dataset are reported"""
+    results = {
+      'small': {'recipe list': {'queries': 4}},
+      'large': {'recipe list': {'queries': 9}},
+    }
+
+    failures = Command().scaling_failures(['small', 'large'], results)
+
+    self.assertEqual(failures, ['recipe list: 4 queries on small, 9 on large'])
+
+  def test_parse_dataset(self):
+    """Test datasets are read as users x recipes x tags x ingredients"""
+    self.assertEqual(parse_dataset('2x10x3x4'), {'users': 2, 'recipes': 10, 'tags': 3, 'ingredients': 4})
+    with self.assertRaises(CommandError):
+      parse_dataset('2x10')
+
+
+class BenchmarkSeedTests(TestCase):
+  """Test the benchmark seeders"""
+
+  def test_seed_updates_search_documents(self):
+    """Test seeded recipes get search documents, bulk_create skips the signals"""
+    with patch('core.benchmark.search.update_documents') as update_documents:
+      user_id, = benchmark.seed(1, tags=2, ingredients=2, recipes=3, links=1)
+
+    recipe_ids = Recipe.objects.filter(user_id=user_id).values_list('pk', flat=True)
+    update_documents.assert_called_once()
+    self.assertEqual(sorted(update_documents.call_args.args[0]), sorted(recipe_ids))
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import TokenCache, token_cache
+
+
+ME_URL = reverse('users:me')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+  """Test token authentication through the token cache"""
+
+  def setUp(self):
+    token_cache.clear()
+    self.user = get_user_model().objects.create_user(email='test@gmail.com', password='testpass123', name='Test')
+    self.token = Token.objects.create(user=self.user)
+    self.client = APIClient()
+    self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+  def test_warm_token_skips_query(self):
+    """Test a cached token authenticates without querying the database"""
+    self.client.get(ME_URL)
+
+    with self.assertNumQueries(0):
+      res = self.client.get(ME_URL)
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertEqual(res.data['email'], self.user.email)
+
+  def test_deleted_token_rejected(self):
+    """Test a deleted token stops authenticating"""
+    self.client.get(ME_URL)
+
+    self.token.delete()
+    res = self.client.get(ME_URL)
+
+    self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+  def test_deactivated_user_rejected(self):
+    """Test deactivating a user stops their cached token"""
+    self.client.get(ME_URL)
+
+    self.user.is_active = False
+    self.user.save()
+    res = self.client.get(ME_URL)
+
+    self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+  def test_password_change_refreshes_user(self):
+    """Test changing password through the API invalidates the cached user"""
+    self.client.get(ME_URL)
+
+    self.client.patch(ME_URL, {'password': 'newpassword123'})
+    self.client.get(ME_URL)
+    user, _ = token_cache.get(self.token.key)
+
+    self.assertTrue(user.check_password('newpassword123'))
+
+  def test_cache_is_bounded(self):
+    """Test the least recently used tokens are evicted"""
+    with self.settings(TOKEN_CACHE_MAX_SIZE=1):
+      self.client.get(ME_URL)
+      other = get_user_model().objects.create_user(email='new@gmail.com', password='new12333')
+      other_token = Token.objects.create(user=other)
+      self.client.credentials(HTTP_AUTHORIZATION=f'Token {other_token.key}')
+      self.client.get(ME_URL)
+
+    self.assertIsNone(token_cache.get(self.token.key))
+    self.assertIsNotNone(token_cache.get(other_token.key))
+
+  @override_settings(TOKEN_CACHE_ALIAS='default')
+  def test_shared_invalidation_reaches_other_workers(self):
+    """Test deleting a token in one worker stops it in another that cached it"""
+    cache.clear()
+    other_worker = TokenCache()
+    key = self.token.key
+    self.client.get(ME_URL)
+    self.assertIsNotNone(other_worker.get(key))
+
+    self.token.delete()
+
+    self.assertIsNone(other_worker.get(key))
+
+  @override_settings(TOKEN_CACHE_ALIAS='default')
+  def test_shared_deactivation_reaches_other_workers(self):
+    """Test deactivating a user in one worker rejects their token in another"""
+    cache.clear()
+    self.client.get(ME_URL)
+    other_worker = TokenCache()
+    other_worker.get(self.token.key)
+
+    self.user.is_active = False
+    self.user.save()
+
+    self.assertIsNone(other_worker.get(self.token.key))
+    self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
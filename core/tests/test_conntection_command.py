@@ -1,23 +1,67 @@
+from io import StringIO
 from unittest.mock import patch
 
 from django.core.management import call_command # allows us to call the command in our source code
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError # allows to  throws if databse is unavailable
 from django.test import TestCase
 
+ENSURE_CONNECTION = 'django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection'
+
 class CommandTests(TestCase):
 
+  def call(self, *args, **options):
+    out = StringIO()
+    call_command('wait_for_db', *args, stdout=out, stderr=StringIO(), **options)
+    return out.getvalue()
+
   def test_wait_for_db_ready(self):
     """Test for db when db is available"""
-    with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-      gi.return_value = True
-      call_command('wait_for_db')
-      self.assertEqual(gi.call_count, 1)
+    with patch(ENSURE_CONNECTION) as ec:
+      out = self.call()
+      self.assertEqual(ec.call_count, 1)
+    self.assertIn('Database default ready', out)
+    self.assertIn('Database is available!', out)
 
   @patch('time.sleep', return_value=True)
   def test_wait_for_db(self, ts):
-    """Test waiting for db""" 
-    with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-      gi.side_effect = [OperationalError] * 5 + [True]
-      """call to getitem raisers five times the operational error and on the sixth time it returns"""
-      call_command('wait_for_db')
-      self.assertEqual(gi.call_count, 6)
\ No newline at end of file
+    """Test waiting for db"""
+    with patch(ENSURE_CONNECTION) as ec:
+      ec.side_effect = [OperationalError] * 5 + [None]
+      """connecting raises the operational error five times and on the sixth time it succeeds"""
+      out = self.call()
+      self.assertEqual(ec.call_count, 6)
+    self.assertEqual(ts.call_count, 5)
+    self.assertIn('(6 attempts)', out)
+
+  @patch('time.sleep', return_value=True)
+  def test_backoff_is_capped(self, ts):
+    """Test retry delays grow exponentially up to max_delay"""
+    with patch(ENSURE_CONNECTION) as ec, patch('random.uniform', side_effect=lambda a, b: b):
+      ec.side_effect = [OperationalError] * 6 + [None]
+      self.call(initial_delay=0.5, max_delay=4)
+    self.assertEqual([c.args[0] for c in ts.call_args_list], [0.5, 1, 2, 4, 4, 4])
+
+  @patch('time.sleep', return_value=True)
+  def test_many_attempts(self, ts):
+    """Test the backoff does not overflow after more than a thousand retries"""
+    with patch(ENSURE_CONNECTION) as ec:
+      ec.side_effect = [OperationalError] * 1100 + [None]
+      out = self.call(initial_delay=0.001)
+    self.assertIn('(1101 attempts)', out)
+
+  def test_delay_must_be_positive(self):
+    """Test a zero initial delay, which would retry without pausing, is refused"""
+    with self.assertRaisesMessage(CommandError, 'must be positive'):
+      self.call(initial_delay=0)
+
+  def test_timeout(self):
+    """Test the command fails once the timeout passed"""
+    with patch(ENSURE_CONNECTION, side_effect=OperationalError):
+      with self.assertRaisesMessage(CommandError, 'default unavailable'):
+        self.call(timeout=0)
+
+  def test_unknown_database(self):
+    """Test unknown aliases are refused"""
+    with self.assertRaisesMessage(CommandError, 'Unknown database replica'):
+      self.call(databases=['replica'])
@@ -0,0 +1,69 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db import pool_stats
+
+
+DB_STATS_URL = reverse('db-stats')
+
+
+class FakePool:
+  min_size = 2
+  max_size = 10
+
+  def get_stats(self):
+    return {
+      'pool_min': 2, 'pool_max': 10, 'pool_size': 4, 'pool_available': 1,
+      'requests_waiting': 3, 'requests_num': 50, 'requests_queued': 7,
+      'requests_wait_ms': 120, 'requests_errors': 2,
+    }
+
+
+class DatabaseStatsTests(TestCase):
+  """Test connection and pool counters"""
+
+  def setUp(self):
+    self.client = APIClient()
+
+  def test_unpooled_alias(self):
+    """Test aliases without a pool report their persistent connection settings"""
+    stats = pool_stats()
+
+    self.assertEqual(stats['default'], {
+      'pooled': False,
+      'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+      'health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+    })
+
+  def test_pooled_alias(self):
+    """Test pool counters are reported as checked out, waits and timeouts"""
+    with patch.object(connection, 'pool', FakePool(), create=True):
+      stats = pool_stats()['default']
+
+    self.assertTrue(stats['pooled'])
+    self.assertEqual(stats['checked_out'], 3)
+    self.assertEqual(stats['waiting'], 3)
+    self.assertEqual(stats['waits'], 7)
+    self.assertEqual(stats['wait_ms'], 120)
+    self.assertEqual(stats['timeouts'], 2)
+    self.assertEqual(stats['connections_lost'], 0)
+
+  def test_stats_admin_only(self):
+    """Test only admins can read the counters"""
+    user = get_user_model().objects.create_user('test@gmail.com', 'testpass123')
+    self.client.force_authenticate(user)
+    self.assertEqual(self.client.get(DB_STATS_URL).status_code, status.HTTP_403_FORBIDDEN)
+
+    admin = get_user_model().objects.create_superuser('admin@gmail.com', 'admin123')
+    self.client.force_authenticate(admin)
+    res = self.client.get(DB_STATS_URL)
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertIn('default', res.data)
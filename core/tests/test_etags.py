@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENT_URL = reverse('recipe:ingredient-list')
+ME_URL = reverse('users:me')
+
+
+class ConditionalGetTests(TestCase):
+  """Test ETag and If-None-Match handling on the API"""
+
+  def setUp(self):
+    cache.clear()
+    self.client = APIClient()
+    self.user = get_user_model().objects.create_user(email='test@gmail.com', password='testpass123', name='Test')
+    self.client.force_authenticate(self.user)
+    self.recipe = Recipe.objects.create(user=self.user, title='Pad thai', time_minutes=20, price=8.00)
+
+  def test_unchanged_returns_not_modified(self):
+    """Test a matching If-None-Match returns 304 without touching the database"""
+    for url in (RECIPE_URL, TAGS_URL, INGREDIENT_URL, ME_URL, reverse('recipe:recipe-detail', args=[self.recipe.id])):
+      res = self.client.get(url)
+      self.assertEqual(res.status_code, status.HTTP_200_OK)
+      self.assertIn('ETag', res)
+
+      with self.assertNumQueries(0):
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+
+      self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+      self.assertEqual(res.content, b'')
+
+  def test_change_produces_new_etag(self):
+    """Test changing owned rows changes the ETag"""
+    etag = self.client.get(RECIPE_URL)['ETag']
+
+    tag = Tag.objects.create(user=self.user, name='Thai')
+    self.recipe.tags.add(tag)
+    res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertNotEqual(res['ETag'], etag)
+
+  def test_etag_from_before_commit_not_reused(self):
+    """Test an ETag handed out between a write and its commit stops matching"""
+    with self.captureOnCommitCallbacks(execute=True):
+      Tag.objects.create(user=self.user, name='Thai')
+      # a concurrent request gets the new version but may still read the old rows
+      etag = self.client.get(TAGS_URL)['ETag']
+
+    res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+  def test_other_user_change_keeps_etag(self):
+    """Test another user's writes do not change the ETag"""
+    etag = self.client.get(INGREDIENT_URL)['ETag']
+    user2 = get_user_model().objects.create_user(email='new@gmail.com', password='new12333')
+
+    Ingredient.objects.create(user=user2, name='Salt')
+    res = self.client.get(INGREDIENT_URL, HTTP_IF_NONE_MATCH=etag)
+
+    self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+  def test_etag_differs_per_query(self):
+    """Test different query strings get different ETags"""
+    first = self.client.get(RECIPE_URL)['ETag']
+    second = self.client.get(RECIPE_URL, {'page_size': 1})['ETag']
+
+    self.assertNotEqual(first, second)
+
+  def test_profile_update_changes_etag(self):
+    """Test updating the profile changes the ETag of me"""
+    etag = self.client.get(ME_URL)['ETag']
+
+    self.client.patch(ME_URL, {'name': 'New name'})
+    res = self.client.get(ME_URL, HTTP_IF_NONE_MATCH=etag)
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertEqual(res.data['name'], 'New name')
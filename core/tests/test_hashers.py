@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase, override_settings
+
+from core.hashers import Argon2PasswordHasher, BCryptSHA256PasswordHasher
+
+
+class HasherSettingsTests(SimpleTestCase):
+  """Test hasher costs come from settings"""
+
+  @override_settings(ARGON2_TIME_COST=3, ARGON2_MEMORY_COST=65536, ARGON2_PARALLELISM=2)
+  def test_argon2_costs(self):
+    """Test the Argon2 parameters follow settings"""
+    hasher = Argon2PasswordHasher()
+
+    self.assertEqual((hasher.time_cost, hasher.memory_cost, hasher.parallelism), (3, 65536, 2))
+
+  @override_settings(BCRYPT_ROUNDS=13)
+  def test_bcrypt_rounds_change_rehashes(self):
+    """Test hashes with another work factor are marked for rehashing"""
+    hasher = BCryptSHA256PasswordHasher()
+    encoded = 'bcrypt_sha256$$2b$12$' + 'a' * 53
+
+    self.assertTrue(hasher.must_update(encoded))
+    with override_settings(BCRYPT_ROUNDS=12):
+      self.assertFalse(hasher.must_update(encoded))
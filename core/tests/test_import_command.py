@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import Tag, Ingredient, Recipe
+
+
+class ImportRecipesCommandTests(TestCase):
+  """Test the import_recipes command"""
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.user = get_user_model().objects.create_user('test@gmail.com', 'testpass123')
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def write(self, name, content):
+    path = os.path.join(self.dir, name)
+    with open(path, 'w', encoding='utf-8') as f:
+      f.write(content)
+    return path
+
+  def write_jsonl(self, name, records):
+    return self.write(name, ''.join(json.dumps(record) + '\n' for record in records))
+
+  def call(self, path, **options):
+    out = StringIO()
+    call_command('import_recipes', path, user='test@gmail.com', stdout=out, stderr=StringIO(), **options)
+    return out.getvalue()
+
+  def test_import_jsonl(self):
+    """Test recipes are created with their tags and ingredients"""
+    existing = Tag.objects.create(user=self.user, name='Vegan')
+    path = self.write_jsonl('recipes.jsonl', [
+      {'title': 'Dal', 'time_minutes': 30, 'price': '4.50', 'tags': ['vegan', 'Indian'], 'ingredients': ['Lentils']},
+      {'title': 'Chili', 'time_minutes': 60, 'price': 7, 'link': 'https://example.com', 'ingredients': ['Beans', 'lentils ']},
+    ])
+
+    out = self.call(path, batch_size=1)
+
+    self.assertIn('Imported 2 recipes', out)
+    dal = Recipe.objects.get(user=self.user, title='Dal')
+    chili = Recipe.objects.get(user=self.user, title='Chili')
+    self.assertEqual(str(dal.price), '4.50')
+    self.assertEqual(chili.link, 'https://example.com')
+    self.assertEqual(set(dal.tags.values_list('name', flat=True)), {'Vegan', 'Indian'})
+    self.assertIn(existing, dal.tags.all())
+    self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 2)
+    self.assertEqual(set(chili.ingredients.values_list('name', flat=True)), {'Beans', 'Lentils'})
+
+  def test_import_csv(self):
+    """Test CSV rows in the export format are imported"""
+    path = self.write(
+      'recipes.csv',
+      'id,title,time_minutes,price,link,image,tags,ingredients\n'
+      '7,"Rice, beans",15,3.00,,,Vegan|Quick,Rice|Beans\n',
+    )
+
+    self.call(path)
+
+    recipe = Recipe.objects.get(user=self.user)
+    self.assertEqual(recipe.title, 'Rice, beans')
+    self.assertEqual(set(recipe.tags.values_list('name', flat=True)), {'Vegan', 'Quick'})
+
+  def test_invalid_record_stops_import(self):
+    """Test an invalid record is reported with its number"""
+    path = self.write_jsonl('recipes.jsonl', [{'title': 'Dal', 'time_minutes': 'long', 'price': 1}])
+
+    with self.assertRaisesMessage(CommandError, 'Record 1'):
+      self.call(path)
+
+    self.assertFalse(Recipe.objects.exists())
+
+  def test_skip_invalid(self):
+    """Test --skip-invalid imports the valid records"""
+    path = self.write_jsonl('recipes.jsonl', [
+      {'title': '', 'time_minutes': 5, 'price': 1},
+      {'title': 'Toast', 'time_minutes': 5, 'price': 1},
+    ])
+
+    out = self.call(path, skip_invalid=True)
+
+    self.assertIn('Imported 1 recipes, skipped 1 records', out)
+    self.assertEqual(Recipe.objects.get().title, 'Toast')
+
+  def test_resume_from_checkpoint(self):
+    """Test a rerun with a checkpoint only imports records it has not seen"""
+    records = [{'title': f'Recipe {i}', 'time_minutes': 5, 'price': 1} for i in range(3)]
+    path = self.write_jsonl('recipes.jsonl', records)
+    checkpoint = os.path.join(self.dir, 'import.checkpoint')
+    self.call(path, checkpoint=checkpoint, batch_size=2)
+
+    self.write_jsonl('recipes.jsonl', records + [{'title': 'Recipe 3', 'time_minutes': 5, 'price': 1}])
+    out = self.call(path, checkpoint=checkpoint, batch_size=2)
+
+    self.assertIn('Resuming after 3 records', out)
+    self.assertEqual(
+      sorted(Recipe.objects.values_list('title', flat=True)),
+      ['Recipe 0', 'Recipe 1', 'Recipe 2', 'Recipe 3'],
+    )
+
+  def test_copy_requires_postgres(self):
+    """Test --copy is refused on other databases"""
+    path = self.write_jsonl('recipes.jsonl', [])
+
+    with self.assertRaisesMessage(CommandError, 'PostgreSQL'):
+      self.call(path, copy=True)
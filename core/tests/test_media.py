@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, Client, override_settings
+from django.utils.http import http_date
+
+from core.storage import recipe_image_storage
+
+
+CONTENT = bytes(range(256)) * 4
+
+
+class MediaViewTests(TestCase):
+  """Test serving uploaded media"""
+
+  def setUp(self):
+    self.media_root = tempfile.mkdtemp()
+    self.settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_SENDFILE='')
+    self.settings_override.enable()
+    self.client = Client()
+    self.name = recipe_image_storage.save('uploads/recipe/x.jpg', ContentFile(CONTENT))
+    self.url = f'/media/{self.name}'
+
+  def tearDown(self):
+    self.settings_override.disable()
+    shutil.rmtree(self.media_root)
+
+  def test_serve_content_addressed_immutable(self):
+    """Test content addressed files are served with immutable caching"""
+    res = self.client.get(self.url)
+
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(b''.join(res.streaming_content), CONTENT)
+    self.assertEqual(res['Content-Type'], 'image/jpeg')
+    self.assertIn('immutable', res['Cache-Control'])
+    self.assertEqual(res['Accept-Ranges'], 'bytes')
+
+  def test_serve_legacy_name_short_cache(self):
+    """Test files with other names get a bounded cache lifetime"""
+    os.makedirs(os.path.join(self.media_root, 'uploads/recipe'), exist_ok=True)
+    with open(os.path.join(self.media_root, 'uploads/recipe/legacy.jpg'), 'wb') as f:
+      f.write(CONTENT)
+
+    res = self.client.get('/media/uploads/recipe/legacy.jpg')
+
+    self.assertEqual(res.status_code, 200)
+    self.assertNotIn('immutable', res['Cache-Control'])
+
+  def test_if_none_match(self):
+    """Test a matching ETag returns 304"""
+    etag = self.client.get(self.url)['ETag']
+
+    res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+    self.assertEqual(res.status_code, 304)
+
+  def test_if_modified_since(self):
+    """Test an unchanged file since the given date returns 304"""
+    mtime = os.path.getmtime(recipe_image_storage.path(self.name))
+
+    res = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(mtime + 1))
+
+    self.assertEqual(res.status_code, 304)
+
+  def test_range(self):
+    """Test byte ranges are served partially"""
+    res = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+    self.assertEqual(res.status_code, 206)
+    self.assertEqual(res['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+    self.assertEqual(b''.join(res.streaming_content), CONTENT[10:20])
+
+  def test_suffix_range(self):
+    """Test a suffix range returns the end of the file"""
+    res = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+
+    self.assertEqual(res.status_code, 206)
+    self.assertEqual(b''.join(res.streaming_content), CONTENT[-5:])
+
+  def test_unsatisfiable_range(self):
+    """Test a range past the end returns 416"""
+    res = self.client.get(self.url, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+
+    self.assertEqual(res.status_code, 416)
+    self.assertEqual(res['Content-Range'], f'bytes */{len(CONTENT)}')
+
+  def test_missing_file(self):
+    """Test unknown and escaping paths return 404"""
+    self.assertEqual(self.client.get('/media/uploads/recipe/missing.jpg').status_code, 404)
+    self.assertEqual(self.client.get('/media/../app/settings.py').status_code, 404)
+
+  def test_accel_redirect(self):
+    """Test the bytes are handed to the web server when configured"""
+    with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+      res = self.client.get(self.url)
+
+    self.assertEqual(res.status_code, 200)
+    self.assertEqual(res['X-Accel-Redirect'], f'/protected-media/{self.name}')
+    self.assertEqual(res.content, b'')
@@ -0,0 +1,178 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import reverse
+from django.test import AsyncRequestFactory, TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.authentication import token_cache
+from core.middleware import PerformanceMiddleware
+from core.models import Recipe
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+class HistogramTests(TestCase):
+  """Test the Prometheus text rendering"""
+
+  def test_cumulative_buckets(self):
+    """Test buckets count observations up to their bound"""
+    histogram = metrics.Histogram('test_seconds', 'Test', ('route',), (0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3):
+      histogram.observe(value, 'a"b')
+
+    lines = metrics._format(histogram.name, histogram.kind, histogram.help, histogram.samples())
+
+    self.assertEqual(lines, [
+      '# HELP test_seconds Test',
+      '# TYPE test_seconds histogram',
+      'test_seconds_bucket{route="a\\"b",le="0.1"} 1',
+      'test_seconds_bucket{route="a\\"b",le="1"} 3',
+      'test_seconds_bucket{route="a\\"b",le="+Inf"} 4',
+      'test_seconds_count{route="a\\"b"} 4',
+      'test_seconds_sum{route="a\\"b"} 4.05',
+    ])
+
+  def test_merge(self):
+    """Test dumps of several processes are summed per label values"""
+    histogram = metrics.Histogram('test_seconds', 'Test', ('route',), (0.1, 1))
+    histogram.observe(0.05, 'a')
+    other = [[['a'], [0, 1], 1, 0.5], [['b'], [1, 0], 1, 0.01]]
+
+    merged = histogram.merge([histogram.dump(), other])
+
+    self.assertEqual(merged, {('a',): [[1, 1], 2, 0.55], ('b',): [[1, 0], 1, 0.01]})
+
+
+class MultiprocessMetricsTests(TestCase):
+  """Test metrics of all workers are merged through PERF_METRICS_DIR"""
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.settings_override = override_settings(PERF_METRICS_DIR=self.dir)
+    self.settings_override.enable()
+    for metric in metrics.METRICS:
+      metric.clear()
+
+  def tearDown(self):
+    self.settings_override.disable()
+    shutil.rmtree(self.dir)
+    for metric in metrics.METRICS:
+      metric.clear()
+
+  def write_worker(self, pid, requests, written=None):
+    """Write the snapshot of another worker that answered requests"""
+    with open(os.path.join(self.dir, f'metrics-{pid}.json'), 'w') as f:
+      json.dump({
+        'pid': pid,
+        'written': time.time() if written is None else written,
+        'metrics': {metrics.REQUESTS.name: [[['recipe:recipe-list', 'GET', 200], requests]]},
+        'collected': [['db_pool_waiting', 'gauge', 'Waiting', [[{'alias': 'default'}, 3]]]],
+      }, f)
+
+  def test_counters_summed_over_workers(self):
+    """Test request counters add up the snapshots of every worker"""
+    metrics.REQUESTS.inc('recipe:recipe-list', 'GET', 200, amount=2)
+    self.write_worker(999999, 5)
+
+    body = metrics.render()
+
+    self.assertIn('http_requests_total{route="recipe:recipe-list",method="GET",status="200"} 7', body)
+    self.assertIn('db_pool_waiting{alias="default",pid="999999"} 3', body)
+    self.assertTrue(os.path.exists(os.path.join(self.dir, f'metrics-{os.getpid()}.json')))
+
+  def test_stale_collector_values_dropped(self):
+    """Test gauges of workers that stopped writing are left out, their counters kept"""
+    self.write_worker(999999, 5, written=time.time() - metrics.STALE_SNAPSHOT_SECONDS - 1)
+
+    body = metrics.render()
+
+    self.assertIn('status="200"} 5', body)
+    self.assertNotIn('pid="999999"', body)
+
+
+class PerformanceMiddlewareTests(TestCase):
+  """Test request instrumentation"""
+
+  def setUp(self):
+    cache.clear()
+    token_cache.clear()
+    self.user = get_user_model().objects.create_user('test@gmail.com', 'testpass123')
+    self.token = Token.objects.create(user=self.user)
+    self.client = APIClient()
+    self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+    Recipe.objects.create(user=self.user, title='Toast', time_minutes=5, price=1.00)
+
+  def test_server_timing(self):
+    """Test responses report database, auth and serializer time"""
+    res = self.client.get(RECIPE_URL)
+
+    timing = res['Server-Timing']
+    self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+    self.assertRegex(timing, r'auth;dur=[\d.]+')
+    self.assertRegex(timing, r'serializer;dur=[\d.]+')
+    self.assertRegex(timing, r'total;dur=[\d.]+')
+
+  def test_metrics_endpoint(self):
+    """Test admins can scrape per-route histograms and cache counters"""
+    self.client.get(RECIPE_URL)
+    admin = get_user_model().objects.create_superuser('admin@gmail.com', 'admin123')
+    admin_client = APIClient()
+    admin_client.force_authenticate(admin)
+
+    res = admin_client.get(METRICS_URL)
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertTrue(res['Content-Type'].startswith('text/plain; version=0.0.4'))
+    body = res.content.decode()
+    self.assertIn('http_request_duration_seconds_bucket{route="recipe:recipe-list",method="GET",le="+Inf"}', body)
+    self.assertIn('http_requests_total{route="recipe:recipe-list",method="GET",status="200"}', body)
+    self.assertIn('http_request_phase_duration_seconds_count{route="recipe:recipe-list",method="GET",phase="db"}', body)
+    self.assertIn('recipe_detail_cache_requests_total{result="hit"}', body)
+
+  def test_metrics_admin_only(self):
+    """Test regular users cannot read the metrics"""
+    self.assertEqual(self.client.get(METRICS_URL).status_code, status.HTTP_403_FORBIDDEN)
+
+  @override_settings(PERF_SLOW_REQUEST_MS=0, PERF_SLOW_QUERY_MS=0)
+  def test_slow_request_sampled(self):
+    """Test slow requests are logged with their SQL and query stacks, once per interval"""
+    with self.assertLogs('core.performance', 'WARNING') as logs:
+      self.client.get(RECIPE_URL)
+      self.client.get(RECIPE_URL)
+
+    self.assertEqual(len(logs.output), 1)
+    self.assertIn('Slow request GET /api/recipe/recipes/ (recipe:recipe-list) 200', logs.output[0])
+    self.assertIn('FROM "core_recipe"', logs.output[0])
+    self.assertIn('File "', logs.output[0])
+
+  @override_settings(PERF_INSTRUMENTATION=False)
+  def test_disabled(self):
+    """Test instrumentation can be switched off"""
+    self.assertNotIn('Server-Timing', self.client.get(RECIPE_URL))
+
+  def test_async_views(self):
+    """Test async requests are timed without leaving the event loop"""
+    async def view(request):
+      with metrics.timer('serializer'):
+        pass
+      return HttpResponse('ok')
+
+    middleware = PerformanceMiddleware(view)
+    response = async_to_sync(middleware)(AsyncRequestFactory().get('/'))
+
+    self.assertIn('serializer;dur=', response['Server-Timing'])
@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+
+from core.models import Tag, Ingredient, Recipe
+from core.normalization import normalize_name
+
+
+class NormalizeNameTests(TestCase):
+  """Test tag and ingredient names are normalized and unique per user"""
+
+  def setUp(self):
+    self.user = get_user_model().objects.create_user('test@gmail.com', 'testpass123')
+
+  def test_normalize_name(self):
+    """Test case, surrounding and repeated whitespace and width are folded"""
+    self.assertEqual(normalize_name('  Sea   SALT '), 'sea salt')
+    self.assertEqual(normalize_name('Ｓａｌｔ'), 'salt')
+
+  def test_save_sets_normalized_name(self):
+    """Test saving fills normalized_name from name"""
+    tag = Tag.objects.create(user=self.user, name='Gluten Free ')
+
+    self.assertEqual(tag.normalized_name, 'gluten free')
+
+  def test_normalized_name_unique_per_user(self):
+    """Test a user cannot have two names that normalize alike"""
+    other = get_user_model().objects.create_user('other@gmail.com', 'testpass123')
+    Ingredient.objects.create(user=self.user, name='Salt')
+    Ingredient.objects.create(user=other, name='salt')
+
+    with self.assertRaises(IntegrityError):
+      Ingredient.objects.create(user=self.user, name='SALT ')
+
+
+class MergeDuplicateNamesTests(TransactionTestCase):
+  """Test merging duplicates left from before the unique constraints"""
+
+  def setUp(self):
+    # the command runs between migrations 0012 and 0013, before the constraints exist
+    MigrationExecutor(connection).migrate([('core', '0012_normalized_names')])
+    self.user = get_user_model().objects.create_user('test@gmail.com', 'testpass123')
+
+  def tearDown(self):
+    Recipe.objects.all().delete()
+    Tag.objects.all().delete()
+    Ingredient.objects.all().delete()
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
+
+  def sample_recipe(self, title):
+    return Recipe.objects.create(user=self.user, title=title, time_minutes=10, price=5.00)
+
+  def test_merge_moves_recipe_links_to_oldest_row(self):
+    """Test duplicates are deleted and their recipes linked to the kept row once"""
+    salt, upper, spaced = [Ingredient.objects.create(user=self.user, name=name) for name in ('Salt', 'SALT', ' salt ')]
+    pepper = Ingredient.objects.create(user=self.user, name='Pepper')
+    soup, stew = self.sample_recipe('Soup'), self.sample_recipe('Stew')
+    soup.ingredients.add(salt, upper, pepper)
+    stew.ingredients.add(spaced)
+
+    out = StringIO()
+    call_command('merge_duplicate_names', batch_size=1, stdout=out)
+
+    self.assertEqual(list(Ingredient.objects.order_by('pk')), [salt, pepper])
+    self.assertEqual(set(soup.ingredients.all()), {salt, pepper})
+    self.assertEqual(list(stew.ingredients.all()), [salt])
+    self.assertIn('Merged 2 duplicate ingredients in 1 groups', out.getvalue())
+
+  def test_dry_run_changes_nothing(self):
+    """Test --dry-run only reports the duplicates"""
+    for name in ('Vegan', 'vegan', 'VEGAN'):
+      Tag.objects.create(user=self.user, name=name)
+
+    out = StringIO()
+    call_command('merge_duplicate_names', dry_run=True, stdout=out)
+
+    self.assertEqual(Tag.objects.count(), 3)
+    self.assertIn('Would merge 2 duplicate tags in 1 groups', out.getvalue())
@@ -0,0 +1,38 @@
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from core import benchmark
+from core.management.commands.benchmark_recipe_list import COMPOSITE_INDEXES, Command, is_scratch_database
+
+
+class BenchmarkRecipeListCommandTests(TestCase):
+  """Test the benchmark_recipe_list command"""
+
+  def test_refuses_other_databases(self):
+    """Test indexes of a database not named like a test or benchmark one are left alone"""
+    with patch.dict(connection.settings_dict, {'NAME': '/srv/app/db.sqlite3'}):
+      self.assertFalse(is_scratch_database())
+      with self.assertRaisesMessage(CommandError, '--allow-schema-changes'):
+        call_command('benchmark_recipe_list', '--users', '1', stdout=StringIO())
+
+    self.assertFalse(benchmark.bench_users().exists())
+
+  def test_test_database_allowed(self):
+    """Test the test database counts as a scratch database"""
+    self.assertTrue(is_scratch_database())
+
+  def test_toggles_composite_indexes_only(self):
+    """Test only the per-user composite indexes are dropped, not the search index"""
+    with patch('core.management.commands.benchmark_recipe_list.connection') as mock_connection:
+      mock_connection.schema_editor.return_value = MagicMock()
+      Command().toggle_indexes('remove_index')
+
+    editor = mock_connection.schema_editor.return_value.__enter__.return_value
+    removed = {call.args[1].name for call in editor.remove_index.call_args_list}
+    self.assertEqual(removed, {name for names in COMPOSITE_INDEXES.values() for name in names})
+    self.assertNotIn('core_recipe_search_gin_idx', removed)
@@ -0,0 +1,117 @@
+import random
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import AsyncRequestFactory, TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_cache
+from core.etags import bump_content_version
+from core.models import Recipe, Tag
+from core import routers
+from core.routers import PrimaryReplicaRouter, pinned_to_primary, replica_reads
+
+from recipe.views import RecipeListAsyncView, RecipeViewSet
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+class PrimaryReplicaRouterTests(TestCase):
+  """Test reads are routed to replicas only where allowed"""
+
+  def setUp(self):
+    self.router = PrimaryReplicaRouter()
+
+  def test_reads_default_to_primary(self):
+    """Test reads outside replica_reads() go to the primary"""
+    self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+  def test_replica_reads(self):
+    """Test reads inside replica_reads() go to a replica and writes do not"""
+    with replica_reads():
+      self.assertIn(self.router.db_for_read(Recipe), ('replica_0', 'replica_1'))
+      self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+  @override_settings(DATABASE_REPLICAS=[])
+  def test_without_replicas(self):
+    """Test everything goes to the primary when there are no replicas"""
+    with replica_reads():
+      self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+  def test_no_migrations_on_replicas(self):
+    """Test replicas are left to replication"""
+    self.assertTrue(self.router.allow_migrate('default', 'core'))
+    self.assertFalse(self.router.allow_migrate('replica_0', 'core'))
+
+
+# the test database has no replica, 'default' stands in for one
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaReadViewTests(TestCase):
+  """Test viewset reads use replicas until the user writes"""
+
+  def setUp(self):
+    cache.clear()
+    token_cache.clear()
+    self.user = get_user_model().objects.create_user('test@gmail.com', 'testpass123')
+    self.client = APIClient()
+    self.client.force_authenticate(self.user)
+    Recipe.objects.create(user=self.user, title='Toast', time_minutes=5, price=1.00)
+    cache.clear()
+
+  def replica_reads_of(self, func):
+    """Return number of reads func sent to a replica"""
+    with patch('core.routers.random.choice', wraps=random.choice) as choice:
+      func()
+    return choice.call_count
+
+  def test_reads_use_replicas(self):
+    """Test list requests read from a replica"""
+    self.assertGreater(self.replica_reads_of(lambda: self.client.get(RECIPE_URL)), 0)
+    self.assertGreater(self.replica_reads_of(lambda: self.client.get(TAGS_URL)), 0)
+
+  def test_writes_pin_user_to_primary(self):
+    """Test a user reads from the primary right after writing"""
+    res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+    self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    self.assertTrue(pinned_to_primary(self.user.pk))
+    self.assertEqual(self.replica_reads_of(lambda: self.client.get(RECIPE_URL)), 0)
+
+    cache.clear()  # the pin expired
+    self.assertGreater(self.replica_reads_of(lambda: self.client.get(RECIPE_URL)), 0)
+
+  def test_exception_leaves_primary_reads(self):
+    """Test a view raising an unhandled exception does not leave the thread on replicas"""
+    with patch.object(RecipeViewSet, 'list', side_effect=RuntimeError):
+      with self.assertRaises(RuntimeError):
+        self.client.get(RECIPE_URL)
+
+    self.assertFalse(routers._replica_reads.get())
+
+  def test_bulk_writes_pin_user_to_primary(self):
+    """Test writes that skip signals pin too"""
+    Tag.objects.bulk_create([Tag(user=self.user, name='Vegan')])
+    bump_content_version(self.user.pk)
+
+    self.assertTrue(pinned_to_primary(self.user.pk))
+
+  def test_async_reads_use_replicas(self):
+    """Test the async list reads from a replica until the user writes"""
+    key = Token.objects.create(user=self.user).key
+    request = lambda: AsyncRequestFactory().get(RECIPE_URL, headers={'Authorization': f'Token {key}'})
+    view = RecipeListAsyncView.as_view()
+
+    self.assertGreater(self.replica_reads_of(lambda: async_to_sync(view)(request())), 0)
+
+    bump_content_version(self.user.pk)
+    self.assertEqual(self.replica_reads_of(lambda: async_to_sync(view)(request())), 0)
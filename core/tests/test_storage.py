@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from core.models import Recipe
+from core.storage import recipe_image_storage, collect_orphans
+
+
+def sample_recipe(user, title='Sample Recipe'):
+  """Create and return a sample recipe"""
+  return Recipe.objects.create(user=user, title=title, time_minutes=10, price=5.00)
+
+
+@override_settings(RECIPE_IMAGE_ORPHAN_GRACE=0)
+class ContentAddressedStorageTests(TestCase):
+  """Test recipe images are stored once per content and collected when orphaned"""
+
+  def setUp(self):
+    self.media_root = tempfile.mkdtemp()
+    self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+    self.settings_override.enable()
+    self.user = get_user_model().objects.create_user('test@gmail.com', 'testpass123')
+
+  def tearDown(self):
+    self.settings_override.disable()
+    shutil.rmtree(self.media_root)
+
+  def set_image(self, recipe, content):
+    """Save content as the image of recipe"""
+    with self.captureOnCommitCallbacks(execute=True):
+      recipe.image.save('photo.jpg', ContentFile(content))
+    return recipe.image.name
+
+  def test_identical_uploads_share_blob(self):
+    """Test uploading the same bytes twice stores one file"""
+    name1 = self.set_image(sample_recipe(self.user), b'same bytes')
+    name2 = self.set_image(sample_recipe(self.user), b'same bytes')
+
+    self.assertEqual(name1, name2)
+    self.assertRegex(name1, r'^uploads/recipe/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+    files = [f for _, _, fs in os.walk(self.media_root) for f in fs]
+    self.assertEqual(len(files), 1)
+
+  def test_shared_blob_kept_until_last_reference(self):
+    """Test a blob is deleted only when its last recipe goes"""
+    recipe1 = sample_recipe(self.user)
+    recipe2 = sample_recipe(self.user)
+    name = self.set_image(recipe1, b'shared')
+    self.set_image(recipe2, b'shared')
+
+    with self.captureOnCommitCallbacks(execute=True):
+      recipe1.delete()
+    self.assertTrue(recipe_image_storage.exists(name))
+
+    with self.captureOnCommitCallbacks(execute=True):
+      recipe2.delete()
+    self.assertFalse(recipe_image_storage.exists(name))
+
+  def test_replaced_image_collected(self):
+    """Test replacing an image deletes the old blob"""
+    recipe = sample_recipe(self.user)
+    old = self.set_image(recipe, b'old image')
+
+    recipe = Recipe.objects.get(id=recipe.id)
+    new = self.set_image(recipe, b'new image')
+
+    self.assertNotEqual(old, new)
+    self.assertFalse(recipe_image_storage.exists(old))
+    self.assertTrue(recipe_image_storage.exists(new))
+
+  def test_recent_blobs_survive_collection(self):
+    """Test unreferenced blobs inside the grace period are kept"""
+    name = recipe_image_storage.save('uploads/recipe/x.jpg', ContentFile(b'pending upload'))
+
+    self.assertEqual(collect_orphans([name], grace=60), [])
+    self.assertEqual(collect_orphans([name], grace=0), [name])
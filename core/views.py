@@ -0,0 +1,248 @@
+import asyncio
+import mimetypes
+import os
+import re
+import stat
+import weakref
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+  Http404,
+  HttpResponse,
+  HttpResponseNotModified,
+  StreamingHttpResponse,
+  FileResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe
+
+from rest_framework import exceptions
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import metrics
+from core.authentication import CachedTokenAuthentication, aauthenticate
+from core.db import pool_stats
+from core.etags import acontent_version, etag_matches, make_etag
+from core.routers import apinned_to_primary, replica_reads
+
+
+CONTENT_ADDRESSED_RE = re.compile(r'(?:^|/)([0-9a-f]{64})\.\w+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def _file_chunks(path, start, length):
+  """Yield length bytes of path from start"""
+  with open(path, 'rb') as f:
+    f.seek(start)
+    while length > 0:
+      chunk = f.read(min(CHUNK_SIZE, length))
+      if not chunk:
+        break
+      length -= len(chunk)
+      yield chunk
+
+
+def _parse_range(header, size):
+  """Return (start, end) of a single byte range, None for the whole file, False if unsatisfiable"""
+  match = RANGE_RE.match(header.replace(' ', ''))
+  if not match or match.groups() == ('', ''):
+    # malformed and multi-range requests get the full file
+    return None
+  first, last = match.groups()
+  if first == '':
+    start, end = max(size - int(last), 0), size - 1
+  else:
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+  if start >= size or start > end:
+    return False
+  return start, end
+
+
+@require_safe
+def serve_media(request, path):
+  """Serve an uploaded file with conditional GET, Range and cache headers
+
+  Content addressed names never change content, so they are served as
+  immutable. With MEDIA_SENDFILE set only headers are produced and the
+  front end web server sends the bytes.
+  """
+  try:
+    full_path = safe_join(settings.MEDIA_ROOT, path)
+    st = os.stat(full_path)
+  except (OSError, ValueError, SuspiciousFileOperation):
+    raise Http404('File not found')
+  if not stat.S_ISREG(st.st_mode):
+    raise Http404('File not found')
+
+  match = CONTENT_ADDRESSED_RE.search(path)
+  etag = quote_etag(match.group(1) if match else f'{st.st_mtime_ns:x}-{st.st_size:x}')
+  headers = {
+    'ETag': etag,
+    'Last-Modified': http_date(st.st_mtime),
+    'Accept-Ranges': 'bytes',
+    'Cache-Control': (
+      'public, max-age=31536000, immutable' if match
+      else f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+    ),
+  }
+
+  if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+  if if_none_match:
+    if etag in parse_etags(if_none_match) or if_none_match.strip() == '*':
+      return _with_headers(HttpResponseNotModified(), headers)
+  else:
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    if since is not None and int(st.st_mtime) <= since:
+      return _with_headers(HttpResponseNotModified(), headers)
+
+  content_type, encoding = mimetypes.guess_type(full_path)
+  content_type = content_type or 'application/octet-stream'
+
+  if settings.MEDIA_SENDFILE:
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+      response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + path
+    else:
+      response['X-Sendfile'] = full_path
+    return _with_headers(response, headers)
+
+  byte_range = None
+  range_header = request.META.get('HTTP_RANGE')
+  if_range = request.META.get('HTTP_IF_RANGE')
+  if range_header and (not if_range or if_range == etag):
+    byte_range = _parse_range(range_header, st.st_size)
+
+  if byte_range is False:
+    response = HttpResponse(status=416)
+    response['Content-Range'] = f'bytes */{st.st_size}'
+    return _with_headers(response, headers)
+
+  if byte_range:
+    start, end = byte_range
+    response = StreamingHttpResponse(
+      _file_chunks(full_path, start, end - start + 1),
+      status=206,
+      content_type=content_type,
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+    response['Content-Length'] = str(end - start + 1)
+  else:
+    # FileResponse lets the WSGI server use its sendfile file_wrapper
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+  if encoding:
+    response['Content-Encoding'] = encoding
+  return _with_headers(response, headers)
+
+
+def _with_headers(response, headers):
+  for key, value in headers.items():
+    response[key] = value
+  return response
+
+
+_db_slots = weakref.WeakKeyDictionary()
+
+
+def db_slot():
+  """Return the semaphore capping ORM work of the running event loop
+
+  Django runs async ORM calls in threads, each with its own database
+  connection, so without a cap every waiting client would hold both.
+  """
+  loop = asyncio.get_running_loop()
+  slot = _db_slots.get(loop)
+  if slot is None:
+    slot = _db_slots[loop] = asyncio.Semaphore(settings.ASYNC_DB_CONCURRENCY)
+  return slot
+
+
+class AsyncReadView(View):
+  """Answer GET on the event loop and hand everything else to a sync DRF view
+
+  Token authentication, the ETag check and cache hits never leave the
+  loop and ORM calls wait for a db_slot(), so thousands of slow clients
+  cost coroutines instead of threads. Responses, ETags and pagination
+  cursors match the sync view's, so clients cannot tell them apart.
+  """
+  sync_view = None
+  # answer from a replica unless the user wrote recently, see core.routers
+  read_from_replicas = False
+  renderer = JSONRenderer()
+
+  @classmethod
+  def as_view(cls, **initkwargs):
+    # like the DRF views it stands in for, token authenticated views need no CSRF check
+    return csrf_exempt(super().as_view(**initkwargs))
+
+  def delegate(self, request):
+    """Return whether sync_view should answer request"""
+    return request.method != 'GET' or 'text/html' in request.headers.get('Accept', '')
+
+  def render(self, data, status=200, headers=None):
+    response = HttpResponse(self.renderer.render(data), status=status, content_type='application/json', headers=headers)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+  def render_exception(self, exc, headers=None):
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return self.render(data, status=exc.status_code, headers=headers)
+
+  async def dispatch(self, request, *args, **kwargs):
+    if self.delegate(request):
+      return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    try:
+      request.user = await aauthenticate(request)
+    except exceptions.APIException as exc:
+      return self.render_exception(exc, headers={'WWW-Authenticate': 'Token'})
+
+    etag = make_etag(request, request.user.pk, await acontent_version(request.user.pk))
+    if etag_matches(request, etag):
+      return HttpResponseNotModified(headers={'ETag': etag})
+
+    replicas = self.read_from_replicas and not await apinned_to_primary(request.user.pk)
+    try:
+      with replica_reads(replicas):
+        response = await self.get(request, *args, **kwargs)
+    except exceptions.APIException as exc:
+      return self.render_exception(exc)
+    response['ETag'] = etag
+    return response
+
+  def drf_request(self, request):
+    """Return request wrapped for serializers and viewset helpers"""
+    drf_request = Request(request)
+    drf_request.user = request.user
+    return drf_request
+
+
+class DatabaseStatsView(APIView):
+  """Expose database connection and pool counters of this process"""
+  authentication_classes = (CachedTokenAuthentication,)
+  permission_classes = (IsAdminUser,)
+
+  def get(self, request):
+    return Response(pool_stats())
+
+
+class MetricsView(APIView):
+  """Expose request, cache and pool metrics in the Prometheus text format, see metrics.render()"""
+  authentication_classes = (CachedTokenAuthentication,)
+  permission_classes = (IsAdminUser,)
+
+  def get(self, request):
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
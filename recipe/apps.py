@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = 'recipe'
+
+    def ready(self):
+        from recipe import signals  # noqa: F401 registers cache invalidation
+        from core import metrics
+        from recipe.cache import cache_metrics
+        metrics.register_collector(cache_metrics)
@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Lower, Upper
+
+from core.etags import content_version
+
+
+# prefix matches always rank above fuzzy ones, whose trigram similarity is at most 1
+PREFIX_SCORE = 2.0
+
+
+class NameTrie:
+  """Prefix tree of (id, name) pairs keyed on lower cased names"""
+
+  def __init__(self, items):
+    self.root = {}
+    for pk, name in items:
+      node = self.root
+      for char in name.lower():
+        node = node.setdefault(char, {})
+      # the None key holds the names ending at this node
+      node.setdefault(None, []).append((pk, name))
+
+  def search(self, prefix, limit):
+    """Return up to limit (id, name) pairs starting with prefix, in name order"""
+    node = self.root
+    for char in prefix.lower():
+      node = node.get(char)
+      if node is None:
+        return []
+
+    matches = []
+    stack = [node]
+    while stack and len(matches) < limit:
+      node = stack.pop()
+      matches.extend(sorted(node.get(None, ())))
+      stack.extend(node[char] for char in sorted((c for c in node if c is not None), reverse=True))
+    return matches[:limit]
+
+
+class TrieCache:
+  """Per-process LRU of the name tries of recently active users
+
+  Each trie is stamped with the owner's content version, so any write to
+  their tags or ingredients, from this process or another, makes it stale
+  without an explicit invalidation.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._tries = OrderedDict()
+
+  def get(self, model, user_id, load):
+    """Return trie of user_id's model names, building it with load() when stale"""
+    max_users = settings.AUTOCOMPLETE_TRIE_USERS
+    if max_users <= 0:
+      return None
+
+    key = (model._meta.label, user_id)
+    version = content_version(user_id)
+    with self._lock:
+      entry = self._tries.get(key)
+      if entry and entry[0] == version:
+        self._tries.move_to_end(key)
+        return entry[1]
+
+    trie = NameTrie(load())
+    with self._lock:
+      self._tries[key] = (version, trie)
+      self._tries.move_to_end(key)
+      while len(self._tries) > max_users:
+        self._tries.popitem(last=False)
+    return trie
+
+  def clear(self):
+    with self._lock:
+      self._tries.clear()
+
+
+trie_cache = TrieCache()
+
+
+def autocomplete(queryset, query, limit):
+  """Return up to limit rows of queryset whose name contains or resembles query
+
+  Prefix matches come first in name order, followed by the other names
+  containing query and on PostgreSQL trigram matches, by similarity. The
+  lookups run against UPPER(name), which the gin_trgm_ops indexes of
+  migration 0011 cover.
+  """
+  prefix = Q(upper_name__startswith=query.upper())
+  substring = Q(upper_name__contains=query.upper())
+  queryset = queryset.alias(upper_name=Upper('name'))
+
+  if connection.vendor == 'postgresql':
+    queryset = queryset.filter(substring | Q(upper_name__trigram_similar=query.upper()))
+    fuzzy_score = TrigramSimilarity(Upper('name'), query.upper())
+  else:
+    queryset = queryset.filter(substring)
+    fuzzy_score = Value(1.0)
+
+  return queryset.annotate(match_score=Case(
+    When(prefix, then=Value(PREFIX_SCORE)),
+    default=fuzzy_score,
+    output_field=FloatField(),
+  )).order_by('-match_score', Lower('name'), 'id')[:limit]
@@ -0,0 +1,129 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class RecipeDetailCache:
+  """Read-through cache of serialized recipe detail responses
+
+  Entries are keyed on the recipe id and a per-recipe version stamp.
+  Invalidating a recipe bumps its version, which makes every cached
+  entry for it unreachable at once, including one a concurrent request
+  is about to write from data read before the change. The version is
+  bumped again when the writing transaction commits, since until then
+  other requests still read the old rows and may cache them under the
+  first bump.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  @property
+  def cache(self):
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+  def _version_key(self, pk):
+    # int() so '01' from a URL and 1 from a signal share their keys
+    return f'recipe:detail:{int(pk)}:version'
+
+  def _entry_key(self, pk, version, request):
+    return f'recipe:detail:{int(pk)}:{version}:{request.get_host()}'
+
+  def _count(self, attr):
+    with self._lock:
+      setattr(self, attr, getattr(self, attr) + 1)
+
+  def version(self, pk):
+    """Return current version stamp of recipe pk"""
+    key = self._version_key(pk)
+    version = self.cache.get(key)
+    if version is None:
+      # start from the clock, not 1, so an evicted stamp never revives stale entries
+      self.cache.add(key, time.time_ns(), None)
+      version = self.cache.get(key)
+    return version
+
+  def get(self, pk, request):
+    """Return (data, version) for recipe pk, data is None on a miss"""
+    version = self.version(pk)
+    entry = self.cache.get(self._entry_key(pk, version, request))
+
+    if entry is None or entry['user'] != request.user.pk:
+      self._count('misses')
+      return None, version
+
+    self._count('hits')
+    return entry['data'], version
+
+  async def aversion(self, pk):
+    """Return current version stamp of recipe pk, from async code"""
+    key = self._version_key(pk)
+    version = await self.cache.aget(key)
+    if version is None:
+      await self.cache.aadd(key, time.time_ns(), None)
+      version = await self.cache.aget(key)
+    return version
+
+  async def aget(self, pk, request):
+    """Return (data, version) for recipe pk like get, from async code"""
+    version = await self.aversion(pk)
+    entry = await self.cache.aget(self._entry_key(pk, version, request))
+    if entry is None or entry['user'] != request.user.pk:
+      self._count('misses')
+      return None, version
+
+    self._count('hits')
+    return entry['data'], version
+
+  async def aset(self, pk, version, request, data):
+    """Store data for recipe pk under version, from async code"""
+    await self.cache.aset(
+      self._entry_key(pk, version, request),
+      {'user': request.user.pk, 'data': data},
+      settings.RECIPE_CACHE_TIMEOUT,
+    )
+
+  def set(self, pk, version, request, data):
+    """Store data for recipe pk under version"""
+    self.cache.set(
+      self._entry_key(pk, version, request),
+      {'user': request.user.pk, 'data': data},
+      settings.RECIPE_CACHE_TIMEOUT,
+    )
+
+  def invalidate(self, *pks):
+    """Bump the version stamp of every given recipe, now and once the transaction commits"""
+    if not pks:
+      return
+    self._bump(pks)
+    transaction.on_commit(lambda: self._bump(pks))
+
+  def _bump(self, pks):
+    for pk in pks:
+      key = self._version_key(pk)
+      try:
+        self.cache.incr(key)
+      except ValueError:
+        self.cache.set(key, time.time_ns(), None)
+
+  def stats(self):
+    """Return hit and miss counters of this process"""
+    with self._lock:
+      return {'hits': self.hits, 'misses': self.misses}
+
+
+recipe_detail_cache = RecipeDetailCache()
+
+
+def cache_metrics():
+  """Return recipe detail cache counters for core.metrics"""
+  stats = recipe_detail_cache.stats()
+  return [
+    ('recipe_detail_cache_requests_total', 'counter', 'Recipe detail cache lookups',
+     [({'result': 'hit'}, stats['hits']), ({'result': 'miss'}, stats['misses'])]),
+  ]
@@ -0,0 +1,87 @@
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from rest_framework.renderers import BaseRenderer
+
+from core.models import Tag, Ingredient
+
+
+EXPORT_FIELDS = ('id', 'title', 'time_minutes', 'price', 'link', 'image', 'tags', 'ingredients')
+# tags and ingredients share one CSV cell each, joined by this separator
+CSV_LIST_SEPARATOR = '|'
+
+
+def export_queryset(queryset):
+  """Return queryset ready to be streamed by export_rows"""
+  return queryset.only('id', 'title', 'time_minutes', 'price', 'link', 'image').prefetch_related(
+    Prefetch('tags', queryset=Tag.objects.only('id', 'name').order_by('name')),
+    Prefetch('ingredients', queryset=Ingredient.objects.only('id', 'name').order_by('name')),
+  )
+
+
+def export_rows(queryset, request, chunk_size):
+  """Yield one dict per recipe of queryset, reading chunk_size rows at a time
+
+  iterator() streams rows through a server side cursor where the database
+  has one, and runs the prefetches once per chunk, so memory use does not
+  grow with the number of recipes.
+  """
+  for recipe in export_queryset(queryset).iterator(chunk_size=chunk_size):
+    yield {
+      'id': recipe.id,
+      'title': recipe.title,
+      'time_minutes': recipe.time_minutes,
+      'price': str(recipe.price),
+      'link': recipe.link,
+      'image': request.build_absolute_uri(recipe.image.url) if recipe.image else None,
+      'tags': [tag.name for tag in recipe.tags.all()],
+      'ingredients': [ingredient.name for ingredient in recipe.ingredients.all()],
+    }
+
+
+class NDJSONRenderer(BaseRenderer):
+  """Render export rows as newline delimited JSON"""
+  media_type = 'application/x-ndjson'
+  format = 'ndjson'
+  charset = 'utf-8'
+
+  def stream(self, rows):
+    for row in rows:
+      yield json.dumps(row, ensure_ascii=False) + '\n'
+
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    if not isinstance(data, list):
+      # error responses are single objects
+      return json.dumps(data, ensure_ascii=False)
+    return ''.join(self.stream(data))
+
+
+class _Echo:
+  """File-like object whose write returns what it was given"""
+
+  def write(self, value):
+    return value
+
+
+class CSVRenderer(BaseRenderer):
+  """Render export rows as CSV with a header line"""
+  media_type = 'text/csv'
+  format = 'csv'
+  charset = 'utf-8'
+
+  def stream(self, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+      yield writer.writerow([
+        CSV_LIST_SEPARATOR.join(row[field]) if field in ('tags', 'ingredients') else row[field]
+        for field in EXPORT_FIELDS
+      ])
+
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    if not isinstance(data, list):
+      writer = csv.writer(_Echo())
+      return ''.join(writer.writerow([key, value]) for key, value in data.items())
+    return ''.join(self.stream(data))
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connections, transaction
+
+from core.models import Recipe
+from core.etags import bump_content_version
+from core.storage import collect_orphans
+
+from recipe.cache import recipe_detail_cache
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+  """Return the shared image worker pool"""
+  global _executor
+  if _executor is None:
+    _executor = ThreadPoolExecutor(
+      max_workers=settings.RECIPE_IMAGE_WORKERS,
+      thread_name_prefix='recipe-image',
+    )
+  return _executor
+
+
+def schedule_image_processing(recipe):
+  """Process the uploaded image of recipe once the upload is committed"""
+  args = (recipe.pk, recipe.image.name)
+
+  def submit():
+    if settings.RECIPE_IMAGE_WORKERS:
+      get_executor().submit(_process_in_worker, *args)
+    else:
+      process_recipe_image(*args)
+
+  transaction.on_commit(submit)
+
+
+def _process_in_worker(recipe_id, name):
+  """Run process_recipe_image in a pool thread"""
+  # pool threads outlive requests, so they drop connections past
+  # CONN_MAX_AGE or broken ones the way request signals do
+  close_old_connections()
+  try:
+    process_recipe_image(recipe_id, name)
+  finally:
+    close_old_connections()
+
+
+def collect_after_grace(names):
+  """Delete names once RECIPE_IMAGE_ORPHAN_GRACE has passed, if no recipe references them then"""
+  # a second past the grace period, file times may be rounded to the second
+  timer = threading.Timer(settings.RECIPE_IMAGE_ORPHAN_GRACE + 1, _collect_in_thread, args=(names,))
+  timer.daemon = True
+  timer.start()
+
+
+def _collect_in_thread(names):
+  try:
+    collect_orphans(names)
+  except Exception:
+    # collect_recipe_images deletes whatever is left behind
+    logger.exception('Collecting images %s failed', names)
+  finally:
+    # the timer thread ends here, don't leave its connection open
+    connections.close_all()
+
+
+def _encode(img, fmt):
+  """Return img encoded as fmt without any metadata"""
+  if fmt == 'JPEG' and img.mode not in ('RGB', 'L'):
+    img = img.convert('RGB')
+  options = {}
+  if fmt in ('JPEG', 'WEBP'):
+    # Pillow's default of 75 would visibly degrade the full size image
+    options['quality'] = settings.RECIPE_IMAGE_QUALITY
+  buffer = BytesIO()
+  # only pixel data is written, EXIF/XMP/ICC and text chunks are dropped
+  img.save(buffer, format=fmt, **options)
+  return ContentFile(buffer.getvalue())
+
+
+def process_recipe_image(recipe_id, name):
+  """Verify the raw upload, strip its metadata and write resized variants"""
+  storage = Recipe._meta.get_field('image').storage
+  root, ext = os.path.splitext(name)
+  written = []
+
+  try:
+    with storage.open(name) as f:
+      Image.open(f).verify()
+
+    with storage.open(name) as f:
+      img = Image.open(f)
+      fmt = img.format
+      img.load()
+    img = ImageOps.exif_transpose(img)
+
+    names = {'image': storage.save(name, _encode(img, fmt))}
+    written.append(names['image'])
+    for variant, size in settings.RECIPE_IMAGE_SIZES.items():
+      resized = img.copy()
+      resized.thumbnail((size, size))
+      names[f'image_{variant}'] = storage.save(f'{root}_{variant}{ext}', _encode(resized, fmt))
+      written.append(names[f'image_{variant}'])
+    names['image_status'] = Recipe.ImageStatus.READY
+  except Exception:
+    logger.exception('Processing image %s of recipe %s failed', name, recipe_id)
+    collect_orphans(written)
+    written = []
+    names = {'image_status': Recipe.ImageStatus.FAILED}
+
+  # only apply if no newer upload replaced the image meanwhile
+  updated = Recipe.objects.filter(pk=recipe_id, image=name).update(**names)
+  if not updated:
+    collect_orphans(written)
+    return
+
+  if names.get('image') and names['image'] != name:
+    # the raw upload still has its metadata, it must not stay online. Another
+    # recipe may have stored the same bytes under this name and not committed
+    # its reference yet, so it is only deleted after the grace period
+    collect_after_grace([name])
+  user_id = Recipe.objects.filter(pk=recipe_id).values_list('user_id', flat=True).first()
+  recipe_detail_cache.invalidate(recipe_id)
+  if user_id is not None:
+    bump_content_version(user_id)
@@ -0,0 +1,33 @@
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class UserKeysetPagination(CursorPagination):
+  """Cursor pagination over the (user, -id) indexes
+
+  Pages are fetched with `id < cursor` instead of OFFSET, so latency
+  stays the same however deep the client pages.
+  """
+  ordering = '-id'
+  page_size = settings.PAGE_SIZE
+  page_size_query_param = 'page_size'
+  max_page_size = 100
+
+  async def apaginate_queryset(self, queryset, request, view=None):
+    """paginate_queryset from async code, pages and cursors are the sync view's"""
+    # the async ORM runs queries in a thread too, this is the same hop
+    return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+
+
+class RankedSearchPagination(LimitOffsetPagination):
+  """Offset pagination of search results ordered by rank
+
+  Ranks are floats many rows share, so unlike ids they cannot mark a
+  cursor position. Pages take the same page_size parameter.
+  """
+  default_limit = UserKeysetPagination.page_size
+  limit_query_param = 'page_size'
+  max_limit = UserKeysetPagination.max_page_size
@@ -0,0 +1,165 @@
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Value, When
+
+from core.models import Recipe
+
+
+# weights of the document parts, matching ts_rank's defaults for A, B and C
+FIELD_WEIGHTS = (('title', 'A', 1.0), ('tags', 'B', 0.4), ('ingredients', 'C', 0.2))
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def uses_postgres():
+  return connection.vendor == 'postgresql'
+
+
+def tokenize(text):
+  return TOKEN_RE.findall(text.lower())
+
+
+def document_parts(recipe_ids):
+  """Return {recipe_id: {'title': str, 'tags': str, 'ingredients': str}} for recipe_ids"""
+  parts = {
+    pk: {'title': title, 'tags': [], 'ingredients': []}
+    for pk, title in Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', 'title')
+  }
+  for relation in ('tags', 'ingredients'):
+    through = getattr(Recipe, relation).through
+    column = getattr(Recipe, relation).field.m2m_reverse_field_name()
+    for recipe_id, name in through.objects.filter(recipe_id__in=parts).values_list('recipe_id', f'{column}__name'):
+      parts[recipe_id][relation].append(name)
+  for doc in parts.values():
+    doc['tags'] = ' '.join(doc['tags'])
+    doc['ingredients'] = ' '.join(doc['ingredients'])
+  return parts
+
+
+class InvertedIndex:
+  """In-process inverted index used where PostgreSQL full text search is unavailable
+
+  Postings are loaded per user on first search and then kept in step by
+  update_documents, so searches never rescan the recipe table.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._postings = defaultdict(dict)  # (user_id, token) -> {recipe_id: weight}
+    self._documents = {}  # recipe_id -> (user_id, {token: weight})
+    self._loaded_users = set()
+
+  def _index(self, recipe_id, user_id, doc):
+    weights = defaultdict(float)
+    for field, _, weight in FIELD_WEIGHTS:
+      for token in tokenize(doc[field]):
+        weights[token] += weight
+    self._remove(recipe_id)
+    self._documents[recipe_id] = (user_id, weights)
+    for token, weight in weights.items():
+      self._postings[(user_id, token)][recipe_id] = weight
+
+  def _remove(self, recipe_id):
+    old = self._documents.pop(recipe_id, None)
+    if old:
+      user_id, weights = old
+      for token in weights:
+        self._postings[(user_id, token)].pop(recipe_id, None)
+
+  def _load_user(self, user_id):
+    if user_id in self._loaded_users:
+      return
+    ids = list(Recipe.objects.filter(user_id=user_id).values_list('pk', flat=True))
+    for recipe_id, doc in document_parts(ids).items():
+      self._index(recipe_id, user_id, doc)
+    self._loaded_users.add(user_id)
+
+  def update(self, recipe_ids):
+    """Reindex recipe_ids of users whose postings are loaded"""
+    owners = dict(Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', 'user_id'))
+    with self._lock:
+      for recipe_id in recipe_ids:
+        if recipe_id not in owners:
+          self._remove(recipe_id)
+      loaded = [pk for pk, user_id in owners.items() if user_id in self._loaded_users]
+      for recipe_id, doc in document_parts(loaded).items():
+        self._index(recipe_id, owners[recipe_id], doc)
+
+  def search(self, user_id, query):
+    """Return {recipe_id: score} of recipes containing every query token"""
+    tokens = tokenize(query)
+    if not tokens:
+      return {}
+    with self._lock:
+      self._load_user(user_id)
+      postings = [self._postings.get((user_id, token), {}) for token in tokens]
+      postings.sort(key=len)
+      hits = set(postings[0])
+      for posting in postings[1:]:
+        hits &= posting.keys()
+      return {pk: sum(posting[pk] for posting in postings) for pk in hits}
+
+  def clear(self):
+    with self._lock:
+      self._postings.clear()
+      self._documents.clear()
+      self._loaded_users.clear()
+
+
+inverted_index = InvertedIndex()
+
+
+def update_documents(recipe_ids):
+  """Refresh the search documents of recipe_ids after they or their tags and ingredients changed"""
+  recipe_ids = list(set(recipe_ids))
+  if not recipe_ids:
+    return
+  if not uses_postgres():
+    # the in-process index is not rolled back with the transaction
+    transaction.on_commit(lambda: inverted_index.update(recipe_ids))
+    return
+
+  with connection.cursor() as cursor:
+    cursor.execute(_document_sql(), {'config': settings.SEARCH_CONFIG, 'ids': recipe_ids})
+
+
+def _document_sql():
+  """Return an UPDATE rebuilding the search_document of the recipes in %(ids)s"""
+  parts = []
+  for field, weight, _ in FIELD_WEIGHTS:
+    if field == 'title':
+      text = 'r.title'
+    else:
+      relation = getattr(Recipe, field).field
+      through = relation.remote_field.through._meta
+      column = through.get_field(relation.m2m_reverse_field_name()).column
+      text = (
+        f"coalesce((SELECT string_agg(o.name, ' ') FROM {relation.related_model._meta.db_table} o "
+        f"JOIN {through.db_table} t ON t.{column} = o.id WHERE t.recipe_id = r.id), '')"
+      )
+    parts.append(f"setweight(to_tsvector(%(config)s::regconfig, {text}), '{weight}')")
+  # one statement for the whole batch, the vectors are built by the database
+  return (
+    f"UPDATE {Recipe._meta.db_table} r SET search_document = {' || '.join(parts)} "
+    f"WHERE r.id = ANY(%(ids)s)"
+  )
+
+
+def search(queryset, user, query):
+  """Filter queryset to recipes of user matching query, annotated with search_rank"""
+  if uses_postgres():
+    search_query = SearchQuery(query, search_type='websearch', config=settings.SEARCH_CONFIG)
+    return queryset.filter(search_document=search_query).annotate(
+      search_rank=SearchRank(F('search_document'), search_query)
+    )
+
+  scores = inverted_index.search(user.pk, query)
+  return queryset.filter(pk__in=list(scores)).annotate(search_rank=Case(
+    *[When(pk=pk, then=Value(score)) for pk, score in scores.items()],
+    default=Value(0.0),
+    output_field=FloatField(),
+  ))
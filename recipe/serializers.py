@@ -1,40 +1,249 @@
+from django.core.validators import validate_image_file_extension
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+
+from django.utils.translation import gettext_lazy as _
+
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from core.metrics import TimedSerializerMixin
 from core.models import Tag, Ingredient, Recipe
+from core.normalization import normalize_name
+
+from recipe.cache import recipe_detail_cache
+from recipe import search
+
+
+class BulkAttributeListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+  """Create and update tags or ingredients with one statement per batch"""
+
+  def create(self, validated_data):
+    """Return the objects named in validated_data, creating the missing ones"""
+    if not validated_data:
+      return []
+    model = self.child.Meta.model
+    new = {}
+    for attrs in validated_data:
+      new.setdefault(normalize_name(attrs['name']), attrs)
+    # names the user already has, or another request creates meanwhile, are skipped
+    model.objects.bulk_create([model(**attrs) for attrs in new.values()], ignore_conflicts=True)
+    objects = {
+      obj.normalized_name: obj
+      for obj in model.objects.filter(user=validated_data[0]['user'], normalized_name__in=list(new))
+    }
+    return [objects[normalize_name(attrs['name'])] for attrs in validated_data]
+
+  def validate_unique_names(self, instances):
+    """Raise per item errors for renames onto a name the user already has"""
+    model = self.child.Meta.model
+    taken = set(model.objects.filter(
+      user_id=instances[0].user_id,
+      normalized_name__in=[instance.normalized_name for instance in instances],
+    ).exclude(pk__in=[instance.pk for instance in instances]).values_list('normalized_name', flat=True))
+
+    errors = []
+    for instance in instances:
+      if instance.normalized_name in taken:
+        errors.append({'name': [_('A %s with this name already exists.') % model._meta.verbose_name]})
+      else:
+        errors.append({})
+      taken.add(instance.normalized_name)
+    if any(errors):
+      raise serializers.ValidationError(errors)
 
-class TagSerializer(serializers.ModelSerializer):
+  def update(self, instances, validated_data):
+    for instance, attrs in zip(instances, validated_data):
+      for attr, value in attrs.items():
+        setattr(instance, attr, value)
+      instance.normalized_name = normalize_name(instance.name)
+    self.validate_unique_names(instances)
+    try:
+      with transaction.atomic():
+        self.child.Meta.model.objects.bulk_update(instances, ['name', 'normalized_name'])
+    except IntegrityError:
+      # e.g. two names swapped in one request, which the row by row unique check rejects
+      raise serializers.ValidationError({'non_field_errors': [_('Names must be unique after the update.')]})
+
+    # renamed tags and ingredients show up in cached recipe details
+    field = getattr(Recipe, self.child.recipe_relation).field
+    recipe_ids = set(field.remote_field.through.objects.filter(
+      **{f'{field.m2m_reverse_field_name()}_id__in': [i.pk for i in instances]}
+    ).values_list('recipe_id', flat=True))
+    recipe_detail_cache.invalidate(*recipe_ids)
+    search.update_documents(recipe_ids)
+    return instances
+
+
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
   """Serializer for tag objects"""
+  recipe_relation = 'tags'
 
   class Meta:
     model = Tag
     fields = ('id', 'name')
     read_only_fields = ('id',)
+    list_serializer_class = BulkAttributeListSerializer
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
   """Serializer for ingredient objects"""
+  recipe_relation = 'ingredients'
 
   class Meta:
     model = Ingredient
     fields = ('id', 'name')
     read_only_fields = ('id',)
+    list_serializer_class = BulkAttributeListSerializer
+
+
+class UserManyRelatedField(serializers.ManyRelatedField):
+  """Many related field that resolves the whole id list with one query"""
+  default_error_messages = {
+    'does_not_exist': _('Invalid pks {pk_values} - objects do not exist.'),
+  }
+
+  def to_internal_value(self, data):
+    if isinstance(data, str) or not hasattr(data, '__iter__'):
+      self.fail('not_a_list', input_type=type(data).__name__)
+    if not self.allow_empty and len(data) == 0:
+      self.fail('empty')
+
+    pks = []
+    for item in data:
+      if isinstance(item, bool):
+        self.child_relation.fail('incorrect_type', data_type=type(item).__name__)
+      try:
+        pks.append(int(item))
+      except (TypeError, ValueError):
+        self.child_relation.fail('incorrect_type', data_type=type(item).__name__)
+
+    # a bulk request resolves the ids of every item up front
+    resolved = self.context.get('resolved_pks', {}).get(self.child_relation.queryset.model)
+    if resolved is None:
+      resolved = self.child_relation.get_queryset().in_bulk(pks) if pks else {}
 
+    missing = [pk for pk in pks if pk not in resolved]
+    if missing:
+      self.fail('does_not_exist', pk_values=missing)
+    return [resolved[pk] for pk in pks]
 
-class RecipeSerializer(serializers.ModelSerializer):
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+  """Primary key field limited to objects of the requesting user"""
+
+  @classmethod
+  def many_init(cls, *args, **kwargs):
+    list_kwargs = {'child_relation': cls(*args, **kwargs)}
+    for key in kwargs:
+      if key in MANY_RELATION_KWARGS:
+        list_kwargs[key] = kwargs[key]
+    return UserManyRelatedField(**list_kwargs)
+
+  def get_queryset(self):
+    queryset = super().get_queryset()
+    request = self.context.get('request')
+    if request is not None:
+      queryset = queryset.filter(user=request.user)
+    return queryset
+
+
+class BulkRecipeListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+  """Validate and write a batch of recipes with a fixed number of queries"""
+  related_fields = ('ingredients', 'tags')
+
+  def to_internal_value(self, data):
+    if isinstance(data, list):
+      self.resolve_related(data)
+    return super().to_internal_value(data)
+
+  def resolve_related(self, data):
+    """Look up every related id of the batch with one query per model"""
+    resolved = {}
+    for name in self.related_fields:
+      relation = self.child.fields[name].child_relation
+      ids = set()
+      for item in data:
+        values = item.get(name, []) if isinstance(item, dict) else []
+        ids.update(v for v in values if isinstance(v, int) or str(v).isdigit())
+      resolved[relation.queryset.model] = relation.get_queryset().in_bulk([int(i) for i in ids])
+    self.context['resolved_pks'] = resolved
+
+  def write_relations(self, recipes, validated_data, replace=True):
+    """Set the given relations of recipes with bulk inserts of through rows"""
+    for name in self.related_fields:
+      field = getattr(Recipe, name).field
+      through = field.remote_field.through
+      column = f'{field.m2m_reverse_field_name()}_id'
+      changed = [(recipe, attrs[name]) for recipe, attrs in zip(recipes, validated_data) if name in attrs]
+      if not changed:
+        continue
+      if replace:
+        through.objects.filter(recipe_id__in=[recipe.pk for recipe, _ in changed]).delete()
+      through.objects.bulk_create([
+        through(recipe_id=recipe.pk, **{column: related.pk})
+        for recipe, values in changed
+        # repeated ids are linked once, like .set() does
+        for related in dict.fromkeys(values)
+      ])
+
+  def refetch(self, recipes):
+    """Return recipes reloaded with the prefetches the child needs to render"""
+    pks = [recipe.pk for recipe in recipes]
+    loaded = self.child.setup_eager_loading(Recipe.objects.all()).in_bulk(pks)
+    return [loaded[pk] for pk in pks]
+
+  def create(self, validated_data):
+    recipes = Recipe.objects.bulk_create([
+      Recipe(**{k: v for k, v in attrs.items() if k not in self.related_fields})
+      for attrs in validated_data
+    ])
+    self.write_relations(recipes, validated_data, replace=False)
+    search.update_documents([recipe.pk for recipe in recipes])
+    return self.refetch(recipes)
+
+  def update(self, instances, validated_data):
+    fields = set()
+    for instance, attrs in zip(instances, validated_data):
+      for attr, value in attrs.items():
+        if attr not in self.related_fields:
+          setattr(instance, attr, value)
+          fields.add(attr)
+    if fields:
+      Recipe.objects.bulk_update(instances, sorted(fields))
+    self.write_relations(instances, validated_data)
+    recipe_detail_cache.invalidate(*[instance.pk for instance in instances])
+    search.update_documents([instance.pk for instance in instances])
+    return self.refetch(instances)
+
+
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
   """Serailize recipe"""
-  ingredients = serializers.PrimaryKeyRelatedField(
+  ingredients = UserPrimaryKeyRelatedField(
     many=True, 
     queryset=Ingredient.objects.all()
     ) 
   
-  tags = serializers.PrimaryKeyRelatedField(
+  tags = UserPrimaryKeyRelatedField(
     many=True, 
     queryset=Tag.objects.all()
     ) 
 
   class Meta:
     model = Recipe
-    fields = ('id', 'title', 'image', 'ingredients', 'tags', 'time_minutes', 'price', 'link')
-    read_only_fields = ('id',)
+    fields = (
+      'id', 'title', 'image', 'image_status', 'image_thumbnail', 'image_medium',
+      'ingredients', 'tags', 'time_minutes', 'price', 'link',
+    )
+    read_only_fields = ('id', 'image_status', 'image_thumbnail', 'image_medium')
+    list_serializer_class = BulkRecipeListSerializer
+
+  @staticmethod
+  def setup_eager_loading(queryset):
+    """Prefetch related pks so the list costs a fixed number of queries"""
+    return queryset.prefetch_related(
+      Prefetch('ingredients', queryset=Ingredient.objects.only('id')),
+      Prefetch('tags', queryset=Tag.objects.only('id')),
+    )
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -42,11 +251,18 @@ class RecipeDetailSerializer(RecipeSerializer):
   ingredients = IngredientSerializer(many=True, read_only=True)
   tags = TagSerializer(many=True, read_only=True)
 
+  @staticmethod
+  def setup_eager_loading(queryset):
+    """Prefetch full related rows for the nested serializers"""
+    return queryset.prefetch_related('ingredients', 'tags')
+
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
   """Serializer for uploading images"""
+  # only the extension is checked here, decoding happens in the image workers
+  image = serializers.FileField(validators=[validate_image_file_extension])
 
   class Meta:
     model = Recipe
-    fields = ('id', 'image',)
-    read_only_fields = ('id',)
\ No newline at end of file
+    fields = ('id', 'image', 'image_status', 'image_thumbnail', 'image_medium')
+    read_only_fields = ('id', 'image_status', 'image_thumbnail', 'image_medium')
\ No newline at end of file
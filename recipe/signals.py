@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from core.models import Tag, Ingredient, Recipe
+
+from recipe.cache import recipe_detail_cache
+from recipe import search
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+  """Invalidate cached detail and search document of a changed recipe"""
+  recipe_detail_cache.invalidate(instance.pk)
+  search.update_documents([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_relations(sender, instance, action, reverse, pk_set, **kwargs):
+  """Invalidate cached detail and search document of recipes whose tags or ingredients changed"""
+  if action == 'pre_clear' and reverse:
+    # pk_set is not provided on clear, collect recipes before the rows go
+    instance._cleared_recipe_ids = list(instance.recipe_set.values_list('pk', flat=True))
+    return
+  if not action.startswith('post_'):
+    return
+
+  if not reverse:
+    recipe_ids = [instance.pk]
+  elif action == 'post_clear':
+    recipe_ids = getattr(instance, '_cleared_recipe_ids', [])
+  else:
+    recipe_ids = list(pk_set or [])
+
+  recipe_detail_cache.invalidate(*recipe_ids)
+  search.update_documents(recipe_ids)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def invalidate_attribute_recipes(sender, instance, **kwargs):
+  """Invalidate cached detail and search document of recipes that show a changed tag or ingredient"""
+  if kwargs.get('created'):
+    return
+  recipe_ids = list(instance.recipe_set.values_list('pk', flat=True))
+  recipe_detail_cache.invalidate(*recipe_ids)
+
+  if kwargs.get('signal') is pre_delete:
+    # the through rows are only gone once the delete has run
+    transaction.on_commit(lambda: search.update_documents(recipe_ids))
+  else:
+    search.update_documents(recipe_ids)
@@ -0,0 +1,115 @@
+import json
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import AsyncRequestFactory, TestCase
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import token_cache
+from core.models import Recipe, Tag
+
+from recipe.views import RecipeListAsyncView, RecipeDetailAsyncView
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+  """Return recipe detail url"""
+  return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class RecipeAsyncViewTests(TestCase):
+  """Test the async recipe read views answer like the viewset"""
+
+  def setUp(self):
+    cache.clear()
+    token_cache.clear()
+    self.user = get_user_model().objects.create_user(email='test@gmail.com', password='testpass123')
+    self.token = Token.objects.create(user=self.user)
+    self.client = APIClient()
+    self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+    self.factory = AsyncRequestFactory()
+    self.headers = {'Authorization': f'Token {self.token.key}'}
+    tag = Tag.objects.create(user=self.user, name='Vegan')
+    for i in range(3):
+      Recipe.objects.create(user=self.user, title=f'Recipe {i}', time_minutes=10, price=5.00).tags.add(tag)
+
+  async def list(self, path=RECIPE_URL, **headers):
+    request = self.factory.get(path, headers={**self.headers, **headers})
+    return await RecipeListAsyncView.as_view()(request)
+
+  async def detail(self, pk):
+    request = self.factory.get(detail_url(pk), headers=self.headers)
+    return await RecipeDetailAsyncView.as_view()(request, pk=pk)
+
+  async def test_list_matches_viewset(self):
+    """Test pages and cursors are the same as the sync list's"""
+    sync = await self.client_get(RECIPE_URL + '?page_size=2')
+    res = await self.list(RECIPE_URL + '?page_size=2')
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertEqual(json.loads(res.content), json.loads(json.dumps(sync.data)))
+    self.assertEqual(res['ETag'], sync['ETag'])
+
+    following = await self.list(json.loads(res.content)['next'])
+    self.assertEqual([r['title'] for r in json.loads(following.content)['results']], ['Recipe 0'])
+
+  async def client_get(self, url):
+    return await sync_to_async(self.client.get)(url)
+
+  async def test_list_requires_token(self):
+    """Test requests without a valid token are refused"""
+    request = AsyncRequestFactory().get(RECIPE_URL)
+    res = await RecipeListAsyncView.as_view()(request)
+    self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    res = await self.list(Authorization='Token wrong')
+    self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+  async def test_list_not_modified(self):
+    """Test a matching If-None-Match is answered with 304"""
+    first = await self.list()
+
+    res = await self.list(**{'If-None-Match': first['ETag']})
+
+    self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+  async def test_list_invalid_filter(self):
+    """Test filter errors are reported like the viewset does"""
+    res = await self.list(RECIPE_URL + '?tags=x')
+
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertIn('tags', json.loads(res.content))
+
+  async def test_detail(self):
+    """Test the detail matches the viewset and is limited to the user"""
+    recipe = await Recipe.objects.afirst()
+    sync = await self.client_get(detail_url(recipe.id))
+
+    res = await self.detail(recipe.id)
+
+    self.assertEqual(json.loads(res.content), json.loads(json.dumps(sync.data)))
+
+    other = await get_user_model().objects.acreate(email='other@gmail.com')
+    theirs = await Recipe.objects.acreate(user=other, title='Theirs', time_minutes=5, price=1.00)
+    res = await self.detail(theirs.id)
+    self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+  async def test_writes_reach_viewset(self):
+    """Test other methods are handled by the sync viewset"""
+    request = self.factory.post(
+      RECIPE_URL, {'title': 'New', 'time_minutes': 5, 'price': '2.00', 'tags': [], 'ingredients': []},
+      content_type='application/json', headers=self.headers,
+    )
+
+    res = await RecipeListAsyncView.as_view()(request)
+
+    self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+    self.assertTrue(await Recipe.objects.filter(title='New').aexists())
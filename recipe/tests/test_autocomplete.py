@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient
+
+from recipe.autocomplete import NameTrie, trie_cache
+
+
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+class NameTrieTests(TestCase):
+  """Test the prefix tree behind cached autocomplete"""
+
+  def test_search_returns_prefix_matches_in_name_order(self):
+    """Test matches are case insensitive, in name order and limited"""
+    trie = NameTrie([(1, 'Tomato'), (2, 'tofu'), (3, 'Tom yum paste'), (4, 'Basil'), (5, 'Tom')])
+
+    self.assertEqual(trie.search('TO', 10), [(2, 'tofu'), (5, 'Tom'), (3, 'Tom yum paste'), (1, 'Tomato')])
+    self.assertEqual(trie.search('tom', 2), [(5, 'Tom'), (3, 'Tom yum paste')])
+    self.assertEqual(trie.search('x', 10), [])
+
+
+class AutocompleteApiTests(TestCase):
+  """Test ?search= autocomplete of tags and ingredients"""
+
+  def setUp(self):
+    cache.clear()
+    trie_cache.clear()
+    self.user = get_user_model().objects.create_user(email='test@gmail.com', password='testpass')
+    self.client = APIClient()
+    self.client.force_authenticate(self.user)
+    for name in ('Tomato', 'Cherry tomato', 'Tofu', 'Basil', 'Tomatillo'):
+      Ingredient.objects.create(user=self.user, name=name)
+
+  def names(self, res):
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    return [item['name'] for item in res.data['results']]
+
+  def test_prefix_matches_ranked_first(self):
+    """Test names starting with the query come before other matches"""
+    res = self.client.get(INGREDIENTS_URL, {'search': 'tomat'})
+
+    self.assertEqual(self.names(res), ['Tomatillo', 'Tomato', 'Cherry tomato'])
+
+  def test_limit(self):
+    """Test the number of matches is limited and capped"""
+    res = self.client.get(INGREDIENTS_URL, {'search': 'to', 'limit': 2})
+
+    self.assertEqual(self.names(res), ['Tofu', 'Tomatillo'])
+
+    res = self.client.get(INGREDIENTS_URL, {'search': 'to', 'limit': 'many'})
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+  def test_search_limited_to_user(self):
+    """Test other users' names are never suggested"""
+    other = get_user_model().objects.create_user(email='other@gmail.com', password='testpass')
+    Tag.objects.create(user=other, name='Vegan')
+    Tag.objects.create(user=self.user, name='Vegetarian')
+
+    res = self.client.get(TAGS_URL, {'search': 'veg'})
+
+    self.assertEqual(self.names(res), ['Vegetarian'])
+
+  @override_settings(AUTOCOMPLETE_TRIE_USERS=10)
+  def test_trie_serves_repeated_prefixes_without_queries(self):
+    """Test a cached trie answers prefix searches it can fill and follows writes"""
+    self.assertEqual(
+      self.names(self.client.get(INGREDIENTS_URL, {'search': 'tom'})), ['Tomatillo', 'Tomato', 'Cherry tomato'],
+    )
+
+    with self.assertNumQueries(0):
+      res = self.client.get(INGREDIENTS_URL, {'search': 'tom', 'limit': 2})
+    self.assertEqual(self.names(res), ['Tomatillo', 'Tomato'])
+
+    Ingredient.objects.create(user=self.user, name='Tomato paste')
+    res = self.client.get(INGREDIENTS_URL, {'search': 'tom'})
+
+    self.assertEqual(self.names(res), ['Tomatillo', 'Tomato', 'Tomato paste', 'Cherry tomato'])
+
+  def test_trie_matches_database(self):
+    """Test results are the same whether or not the trie is enabled"""
+    for query, limit in (('tomat', 10), ('to', 3), ('mato', 10), ('x', 10)):
+      params = {'search': query, 'limit': limit}
+      with self.settings(AUTOCOMPLETE_TRIE_USERS=0):
+        expected = self.names(self.client.get(INGREDIENTS_URL, params))
+      with self.settings(AUTOCOMPLETE_TRIE_USERS=10):
+        self.assertEqual(self.names(self.client.get(INGREDIENTS_URL, params)), expected, query)
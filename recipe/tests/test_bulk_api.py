@@ -0,0 +1,213 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe.cache import recipe_detail_cache
+
+
+RECIPE_BULK_URL = reverse('recipe:recipe-bulk')
+TAG_BULK_URL = reverse('recipe:tag-bulk')
+INGREDIENT_BULK_URL = reverse('recipe:ingredient-bulk')
+
+
+def recipe_payload(**params):
+  """Return a recipe payload"""
+  payload = {'title': 'Sample Recipe', 'time_minutes': 10, 'price': '5.00'}
+  payload.update(params)
+  return payload
+
+
+class BulkApiTests(TestCase):
+  """Test the bulk create, update and delete endpoints"""
+
+  def setUp(self):
+    self.client = APIClient()
+    self.user = get_user_model().objects.create_user(email='test@gmail.com', password='testpass123')
+    self.client.force_authenticate(self.user)
+
+  def test_bulk_create_tags(self):
+    """Test creating a list of tags"""
+    res = self.client.post(TAG_BULK_URL, [{'name': 'Vegan'}, {'name': 'Dessert'}], format='json')
+
+    self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+    self.assertEqual(
+      sorted(Tag.objects.filter(user=self.user).values_list('name', flat=True)),
+      ['Dessert', 'Vegan'],
+    )
+
+  def test_bulk_create_reuses_existing_names(self):
+    """Test names matching existing or earlier items return the same tag"""
+    tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    res = self.client.post(TAG_BULK_URL, [{'name': 'vegan'}, {'name': 'Dessert'}, {'name': 'DESSERT'}], format='json')
+
+    self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+    self.assertEqual(res.data[0]['id'], tag.id)
+    self.assertEqual(res.data[1]['id'], res.data[2]['id'])
+    self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+  def test_bulk_create_reports_item_errors(self):
+    """Test invalid items are reported by position and nothing is saved"""
+    res = self.client.post(INGREDIENT_BULK_URL, [{'name': 'Salt'}, {'name': ''}], format='json')
+
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(res.data[0], {})
+    self.assertIn('name', res.data[1])
+    self.assertFalse(Ingredient.objects.exists())
+
+  def test_bulk_create_requires_list(self):
+    """Test a single object is rejected"""
+    res = self.client.post(TAG_BULK_URL, {'name': 'Vegan'}, format='json')
+
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+  def test_bulk_create_recipes_fixed_queries(self):
+    """Test creating recipes costs the same number of queries for any batch size"""
+    tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(3)]
+    ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+
+    def create(count):
+      payload = [
+        recipe_payload(title=f'Recipe {i}', tags=[t.id for t in tags], ingredients=[ingredient.id])
+        for i in range(count)
+      ]
+      with CaptureQueriesContext(connection) as queries:
+        res = self.client.post(RECIPE_BULK_URL, payload, format='json')
+      self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+      return res, len(queries)
+
+    # the total differs per database backend, e.g. PostgreSQL also updates the search vectors
+    _, small = create(2)
+    res, large = create(20)
+
+    self.assertEqual(small, large)
+    self.assertEqual(Recipe.objects.filter(user=self.user).count(), 22)
+    recipe = Recipe.objects.get(id=res.data[5]['id'])
+    self.assertEqual(recipe.title, 'Recipe 5')
+    self.assertEqual(recipe.tags.count(), 3)
+    self.assertEqual(res.data[5]['ingredients'], [ingredient.id])
+
+  def test_bulk_create_recipes_repeated_ids(self):
+    """Test a tag listed twice in one recipe is linked once"""
+    tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    res = self.client.post(RECIPE_BULK_URL, [recipe_payload(tags=[tag.id, tag.id], ingredients=[])], format='json')
+
+    self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+    self.assertEqual(res.data[0]['tags'], [tag.id])
+
+  def test_bulk_create_recipes_other_users_tags(self):
+    """Test recipes cannot reference another user's tags"""
+    user2 = get_user_model().objects.create_user(email='new@gmail.com', password='new12333')
+    tag = Tag.objects.create(user=user2, name='Fruity')
+
+    res = self.client.post(RECIPE_BULK_URL, [recipe_payload(tags=[tag.id])], format='json')
+
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertIn('tags', res.data[0])
+
+  def test_bulk_update_recipes(self):
+    """Test updating a list of recipes"""
+    recipe1 = Recipe.objects.create(user=self.user, title='Old 1', time_minutes=5, price=1)
+    recipe2 = Recipe.objects.create(user=self.user, title='Old 2', time_minutes=5, price=1)
+    tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    res = self.client.patch(RECIPE_BULK_URL, [
+      {'id': recipe1.id, 'title': 'New 1', 'tags': [tag.id]},
+      {'id': recipe2.id, 'time_minutes': 30},
+    ], format='json')
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    recipe1.refresh_from_db()
+    recipe2.refresh_from_db()
+    self.assertEqual(recipe1.title, 'New 1')
+    self.assertEqual(list(recipe1.tags.all()), [tag])
+    self.assertEqual(recipe2.title, 'Old 2')
+    self.assertEqual(recipe2.time_minutes, 30)
+
+  def test_bulk_update_unknown_id(self):
+    """Test updating a recipe of another user fails"""
+    user2 = get_user_model().objects.create_user(email='new@gmail.com', password='new12333')
+    recipe = Recipe.objects.create(user=user2, title='Theirs', time_minutes=5, price=1)
+
+    res = self.client.patch(RECIPE_BULK_URL, [{'id': recipe.id, 'title': 'Mine'}], format='json')
+
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+    recipe.refresh_from_db()
+    self.assertEqual(recipe.title, 'Theirs')
+
+  def test_bulk_update_tags(self):
+    """Test renaming a list of tags"""
+    tag = Tag.objects.create(user=self.user, name='Vegn')
+
+    res = self.client.patch(TAG_BULK_URL, [{'id': tag.id, 'name': 'Vegan'}], format='json')
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    tag.refresh_from_db()
+    self.assertEqual(tag.name, 'Vegan')
+
+  def test_bulk_update_rejects_taken_names(self):
+    """Test renaming onto an existing name is reported for that item"""
+    vegan = Tag.objects.create(user=self.user, name='Vegan')
+    vegn = Tag.objects.create(user=self.user, name='Vegn')
+
+    res = self.client.patch(TAG_BULK_URL, [{'id': vegn.id, 'name': 'vegan'}], format='json')
+
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertIn('name', res.data[0])
+    vegan.refresh_from_db()
+    vegn.refresh_from_db()
+    self.assertEqual((vegan.name, vegn.name), ('Vegan', 'Vegn'))
+
+  def cache_during_commit(self, recipe, write):
+    """Run write, caching recipe's committed detail before the transaction commits"""
+    cache.clear()
+    old = self.client.get(reverse('recipe:recipe-detail', args=[recipe.id])).data
+    request = RequestFactory().get('/')
+    request.user = self.user
+    with self.captureOnCommitCallbacks(execute=True):
+      write()
+      # a concurrent retrieve still reads the committed rows and caches them
+      _, version = recipe_detail_cache.get(recipe.id, request)
+      recipe_detail_cache.set(recipe.id, version, request, old)
+    return self.client.get(reverse('recipe:recipe-detail', args=[recipe.id])).data
+
+  def test_bulk_update_invalidates_after_commit(self):
+    """Test a detail cached during a bulk update is not served once it committed"""
+    recipe = Recipe.objects.create(user=self.user, title='Old', time_minutes=5, price=1)
+
+    detail = self.cache_during_commit(recipe, lambda: self.client.patch(
+      RECIPE_BULK_URL, [{'id': recipe.id, 'title': 'New'}], format='json',
+    ))
+
+    self.assertEqual(detail['title'], 'New')
+
+  def test_bulk_delete_invalidates_after_commit(self):
+    """Test a detail cached during a bulk tag delete is not served once it committed"""
+    recipe = Recipe.objects.create(user=self.user, title='Curry', time_minutes=5, price=1)
+    tag = Tag.objects.create(user=self.user, name='Vegan')
+    recipe.tags.add(tag)
+
+    detail = self.cache_during_commit(recipe, lambda: self.client.delete(TAG_BULK_URL, [tag.id], format='json'))
+
+    self.assertEqual(detail['tags'], [])
+
+  def test_bulk_delete(self):
+    """Test deleting a list of ids, all or nothing"""
+    tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(3)]
+
+    res = self.client.delete(TAG_BULK_URL, [tags[0].id, 999999], format='json')
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(Tag.objects.count(), 3)
+
+    res = self.client.delete(TAG_BULK_URL, [tags[0].id, tags[1].id], format='json')
+    self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+    self.assertEqual(list(Tag.objects.all()), [tags[2]])
@@ -5,7 +5,7 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 
 from recipe.serializers import IngredientSerializer
 
@@ -42,10 +42,10 @@ class PrivateIngredientsApiTests(TestCase):
 
     res = self.client.get(INGREDIENT_URL)
 
-    ingredients = Ingredient.objects.all().order_by('-name')
+    ingredients = Ingredient.objects.all().order_by('-id')
     serializer = IngredientSerializer(ingredients, many=True)
     self.assertEqual(res.status_code, status.HTTP_200_OK)
-    self.assertEqual(res.data, serializer.data)
+    self.assertEqual(res.data['results'], serializer.data)
 
   def test_ingredients_limited_to_authenticated_user(self):
     """Test that the ingrdients are returned to authenticacte user"""
@@ -56,8 +56,8 @@ class PrivateIngredientsApiTests(TestCase):
 
     res = self.client.get(INGREDIENT_URL)
     self.assertEqual(res.status_code, status.HTTP_200_OK)
-    self.assertEqual(len(res.data), 1)
-    self.assertEqual(res.data[0]['name'], ingredient.name)
+    self.assertEqual(len(res.data['results']), 1)
+    self.assertEqual(res.data['results'][0]['name'], ingredient.name)
 
   def test_create_ingredient_successful(self):
     """Test creste new ingredient"""
@@ -73,3 +73,28 @@ class PrivateIngredientsApiTests(TestCase):
     res = self.client.post(INGREDIENT_URL, payload)
 
     self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+  def test_retrieve_ingredients_assigned_to_recipes(self):
+    """Test filtering ingredients by those assigned to recipes"""
+    ingredient1 = Ingredient.objects.create(user=self.user, name='Breakfast')
+    ingredient2 = Ingredient.objects.create(user=self.user, name='Lunch')
+    recipe = Recipe.objects.create(user=self.user, title='Coriander eggs on toast', time_minutes=10, price=5.00)
+    recipe.ingredients.add(ingredient1)
+
+    res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+
+    names = [item['name'] for item in res.data['results']]
+    self.assertIn(ingredient1.name, names)
+    self.assertNotIn(ingredient2.name, names)
+
+  def test_retrieve_ingredients_assigned_unique(self):
+    """Test filtering ingredients by assigned returns unique items"""
+    ingredient = Ingredient.objects.create(user=self.user, name='Breakfast')
+    Ingredient.objects.create(user=self.user, name='Lunch')
+    for title in ('Pancakes', 'Porridge'):
+      recipe = Recipe.objects.create(user=self.user, title=title, time_minutes=5, price=3.00)
+      recipe.ingredients.add(ingredient)
+
+    res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+
+    self.assertEqual(len(res.data['results']), 1)
@@ -1,21 +1,29 @@
 import tempfile
+import time
+import shutil
 import os 
 
 from PIL import Image
 
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core import checks
 from django.urls import reverse
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
 from core import models
-from recipe import serializers
+from core.storage import recipe_image_storage
+from recipe import images, serializers
+from recipe.pagination import UserKeysetPagination
 
 
 RECIPE_URL = reverse('recipe:recipe-list')
@@ -93,8 +101,47 @@ class PrivateRecipeApiTests(TestCase):
     serializer = serializers.RecipeSerializer(recipes, many=True)
 
     self.assertEqual(res.status_code, status.HTTP_200_OK)
-    self.assertEqual(len(res.data), 1)
-    self.assertEqual(res.data, serializer.data)
+    self.assertEqual(len(res.data['results']), 1)
+    self.assertEqual(res.data['results'], serializer.data)
+
+  def test_recipes_paginated_by_cursor(self):
+    """Test walking recipe pages with the next cursor"""
+    recipes = [sample_recipe(user=self.user, title=f'Recipe {i}') for i in range(5)]
+
+    res = self.client.get(RECIPE_URL, {'page_size': 2})
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertEqual([r['id'] for r in res.data['results']], [recipes[4].id, recipes[3].id])
+
+    seen = [r['id'] for r in res.data['results']]
+    while res.data['next']:
+      res = self.client.get(res.data['next'])
+      seen += [r['id'] for r in res.data['results']]
+
+    self.assertEqual(seen, [r.id for r in reversed(recipes)])
+
+  def test_recipes_page_size_capped(self):
+    """Test the requested page size cannot exceed the server cap"""
+    Recipe.objects.bulk_create([
+      Recipe(user=self.user, title=f'Recipe {i}', time_minutes=10, price=5)
+      for i in range(UserKeysetPagination.max_page_size + 1)
+    ])
+
+    res = self.client.get(RECIPE_URL, {'page_size': 1000})
+
+    self.assertEqual(len(res.data['results']), UserKeysetPagination.max_page_size)
+    self.assertIsNotNone(res.data['next'])
+
+  def test_default_page_size(self):
+    """Test pages hold PAGE_SIZE recipes without a system check warning"""
+    Recipe.objects.bulk_create([
+      Recipe(user=self.user, title=f'Recipe {i}', time_minutes=10, price=5)
+      for i in range(settings.PAGE_SIZE + 1)
+    ])
+
+    res = self.client.get(RECIPE_URL)
+
+    self.assertEqual(len(res.data['results']), settings.PAGE_SIZE)
+    self.assertNotIn('rest_framework.W001', [message.id for message in checks.run_checks()])
 
   def test_view_recipe_detail(self):
     """Test viewing a recipe detail"""
@@ -163,6 +210,110 @@ class PrivateRecipeApiTests(TestCase):
     self.assertIn(ingredient1, ingredients)
     self.assertIn(ingredient2, ingredients)
 
+  def test_create_recipe_related_ids_single_query(self):
+    """Test related ids are validated with one query per field"""
+    ingredients = [sample_ingredient(user=self.user, name=f'Ingredient {i}') for i in range(40)]
+    tag = sample_tag(user=self.user)
+    payload = {
+      'title': 'Everything stew',
+      'ingredients': [i.id for i in ingredients],
+      'tags': [tag.id],
+      'time_minutes': 60,
+      'price': 20.00
+    }
+
+    with CaptureQueriesContext(connection) as ctx:
+      res = self.client.post(RECIPE_URL, payload)
+
+    self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+    lookups = [q for q in ctx.captured_queries if 'FROM "core_ingredient" WHERE' in q['sql']]
+    self.assertEqual(len(lookups), 1)
+    self.assertEqual(Recipe.objects.get(id=res.data['id']).ingredients.count(), 40)
+
+  def test_create_recipe_other_users_ingredients(self):
+    """Test ids of other users are reported together"""
+    user2 = get_user_model().objects.create_user(email='new@gmail.com', password='new12333')
+    theirs = [sample_ingredient(user=user2, name=f'Theirs {i}') for i in range(2)]
+    mine = sample_ingredient(user=self.user)
+    payload = {
+      'title': 'Borrowed stew',
+      'ingredients': [mine.id] + [i.id for i in theirs],
+      'time_minutes': 60,
+      'price': 20.00
+    }
+
+    res = self.client.post(RECIPE_URL, payload)
+
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(len(res.data['ingredients']), 1)
+    for ingredient in theirs:
+      self.assertIn(str(ingredient.id), res.data['ingredients'][0])
+    self.assertFalse(Recipe.objects.exists())
+
+  def test_filter_recipes_by_tags(self):
+    """Test returning recipes with any of the given tags"""
+    recipe1 = sample_recipe(user=self.user, title='Thai vegetable curry')
+    recipe2 = sample_recipe(user=self.user, title='Aubergine with tahini')
+    recipe3 = sample_recipe(user=self.user, title='Fish and chips')
+    tag1 = sample_tag(user=self.user, name='Vegan')
+    tag2 = sample_tag(user=self.user, name='Vegetarian')
+    recipe1.tags.add(tag1, tag2)
+    recipe2.tags.add(tag2)
+
+    res = self.client.get(RECIPE_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+    ids = [r['id'] for r in res.data['results']]
+    self.assertEqual(ids, [recipe2.id, recipe1.id])
+    self.assertNotIn(recipe3.id, ids)
+
+  def test_filter_recipes_by_ingredients(self):
+    """Test returning recipes with all the given filters applied"""
+    recipe1 = sample_recipe(user=self.user, title='Posh beans on toast')
+    recipe2 = sample_recipe(user=self.user, title='Chicken cacciatore')
+    ingredient = sample_ingredient(user=self.user, name='Feta cheese')
+    tag = sample_tag(user=self.user, name='Quick')
+    recipe1.ingredients.add(ingredient)
+    recipe1.tags.add(tag)
+    recipe2.ingredients.add(ingredient)
+
+    res = self.client.get(RECIPE_URL, {'ingredients': ingredient.id, 'tags': tag.id})
+
+    self.assertEqual([r['id'] for r in res.data['results']], [recipe1.id])
+
+  def test_filter_recipes_single_query(self):
+    """Test filtering adds no queries per recipe"""
+    tag = sample_tag(user=self.user)
+    for i in range(5):
+      sample_recipe(user=self.user, title=f'Recipe {i}').tags.add(tag)
+
+    with self.assertNumQueries(3):
+      self.client.get(RECIPE_URL, {'tags': tag.id})
+
+  def test_filter_recipes_invalid_ids(self):
+    """Test non integer filter ids are rejected"""
+    res = self.client.get(RECIPE_URL, {'tags': '1,abc'})
+
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+  def test_delete_recipe(self):
+    """Test deleting a recipe"""
+    recipe = sample_recipe(user=self.user)
+
+    res = self.client.delete(detail_url(recipe.id))
+
+    self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+    self.assertFalse(Recipe.objects.filter(id=recipe.id).exists())
+
+  def test_delete_other_users_recipe(self):
+    """Test recipes of other users cannot be deleted"""
+    user2 = get_user_model().objects.create_user(email='other@gmail.com', password='other12333')
+    recipe = sample_recipe(user=user2)
+
+    res = self.client.delete(detail_url(recipe.id))
+
+    self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+    self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
   @patch('uuid.uuid4')
   def test_recipe_file_name_uuid(self, mock_uuid):
     """Test that image is saved in correct location"""
@@ -174,6 +325,47 @@ class PrivateRecipeApiTests(TestCase):
     self.assertEqual(file_path, exp_path)
 
 
+class RecipeQueryCountTests(TestCase):
+  """Test the recipe endpoints cost a fixed number of queries"""
+
+  def setUp(self):
+    self.client = APIClient()
+    self.user = get_user_model().objects.create_user(email='test@gmail.com', password='testpass123')
+    self.client.force_authenticate(self.user)
+
+  def create_recipes(self, count):
+    """Create recipes that each have a tag and an ingredient"""
+    for i in range(count):
+      recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+      recipe.tags.add(sample_tag(user=self.user, name=f'Tag {count}.{i}'))
+      recipe.ingredients.add(sample_ingredient(user=self.user, name=f'Ingredient {count}.{i}'))
+
+  def count_queries(self, url):
+    """Return the number of queries a GET to url runs"""
+    with CaptureQueriesContext(connection) as ctx:
+      res = self.client.get(url)
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    return len(ctx.captured_queries)
+
+  def test_list_query_count_is_constant(self):
+    """Test listing recipes does not run a query per recipe"""
+    self.create_recipes(1)
+    small = self.count_queries(RECIPE_URL)
+    self.create_recipes(10)
+    large = self.count_queries(RECIPE_URL)
+
+    self.assertEqual(small, large)
+    self.assertEqual(large, 3)
+
+  def test_detail_query_count(self):
+    """Test retrieving a recipe prefetches tags and ingredients"""
+    self.create_recipes(1)
+    recipe = Recipe.objects.get()
+
+    with self.assertNumQueries(3):
+      self.client.get(detail_url(recipe.id))
+
+
 class RecipeImageUploadTest(TestCase):
   
   def setUp(self):
@@ -207,4 +399,129 @@ class RecipeImageUploadTest(TestCase):
     url = image_upload_url(self.recipe.id)
     res = self.client.post(url, {'image': 'notimage'}, format='multipart')
 
-    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(RECIPE_IMAGE_WORKERS=0)
+class RecipeImageProcessingTest(TestCase):
+  """Test uploaded images are verified and resized after the upload"""
+
+  def setUp(self):
+    self.media_root = tempfile.mkdtemp()
+    self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+    self.settings_override.enable()
+    self.client = APIClient()
+    self.user = get_user_model().objects.create_user(
+      email='test@gmail.com',
+      password='testpass123'
+    )
+    self.client.force_authenticate(self.user)
+    self.recipe = sample_recipe(user=self.user)
+
+  def tearDown(self):
+    self.settings_override.disable()
+    shutil.rmtree(self.media_root)
+
+  def upload(self, content, suffix='.jpg'):
+    """Upload content as the recipe image and run the image workers"""
+    with tempfile.NamedTemporaryFile(suffix=suffix) as ntf:
+      ntf.write(content)
+      ntf.seek(0)
+      with self.captureOnCommitCallbacks(execute=True):
+        res = self.client.post(image_upload_url(self.recipe.id), {'image': ntf}, format='multipart')
+    self.recipe.refresh_from_db()
+    return res
+
+  def test_upload_reports_pending(self):
+    """Test the upload response reports the image as pending"""
+    with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+      Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+      ntf.seek(0)
+      res = self.client.post(image_upload_url(self.recipe.id), {'image': ntf}, format='multipart')
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertEqual(res.data['image_status'], Recipe.ImageStatus.PENDING)
+
+  def test_image_variants_created(self):
+    """Test thumbnail and medium variants are written and metadata stripped"""
+    img = Image.new('RGB', (1200, 800))
+    exif = Image.Exif()
+    exif[0x010e] = 'secret description'
+    buffer = tempfile.SpooledTemporaryFile()
+    img.save(buffer, format='JPEG', exif=exif)
+    buffer.seek(0)
+
+    res = self.upload(buffer.read())
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.READY)
+    with Image.open(self.recipe.image.path) as full:
+      self.assertEqual(full.size, (1200, 800))
+      self.assertEqual(len(full.getexif()), 0)
+    with Image.open(self.recipe.image_thumbnail.path) as thumb:
+      self.assertEqual(max(thumb.size), 150)
+    with Image.open(self.recipe.image_medium.path) as medium:
+      self.assertEqual(max(medium.size), 600)
+
+  def test_invalid_image_marked_failed(self):
+    """Test a file that is not an image is marked as failed"""
+    res = self.upload(b'not really a jpeg')
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertEqual(self.recipe.image_status, Recipe.ImageStatus.FAILED)
+    self.assertFalse(self.recipe.image_thumbnail)
+
+  def test_raw_upload_collected_after_grace_period(self):
+    """Test the raw upload, metadata and all, stops being served once the grace period passed"""
+    timers = []
+    with patch('recipe.images.threading.Timer', side_effect=lambda *args, **kwargs: timers.append((args, kwargs)) or Mock()):
+      with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+        Image.new('RGB', (10, 10)).save(ntf, format='JPEG', exif=Image.Exif())
+        ntf.seek(0)
+        with self.captureOnCommitCallbacks() as callbacks:
+          self.client.post(image_upload_url(self.recipe.id), {'image': ntf}, format='multipart')
+      self.recipe.refresh_from_db()
+      raw, raw_url = self.recipe.image.name, self.recipe.image.url
+
+      for callback in callbacks:
+        callback()
+    self.recipe.refresh_from_db()
+
+    # kept while another upload of the same bytes may still commit
+    self.assertNotEqual(self.recipe.image.name, raw)
+    self.assertEqual(self.client.get(raw_url).status_code, status.HTTP_200_OK)
+
+    (delay, collect), kwargs = timers[0]
+    self.assertGreater(delay, settings.RECIPE_IMAGE_ORPHAN_GRACE)
+    past = time.time() - delay
+    os.utime(recipe_image_storage.path(raw), (past, past))
+    # the timer thread closes its connections, not the test's
+    with patch('recipe.images.connections'):
+      collect(*kwargs['args'])
+
+    self.assertFalse(recipe_image_storage.exists(raw))
+    self.assertEqual(self.client.get(raw_url).status_code, status.HTTP_404_NOT_FOUND)
+    self.assertTrue(recipe_image_storage.exists(self.recipe.image.name))
+
+  def test_full_size_quality(self):
+    """Test the full size image is written at RECIPE_IMAGE_QUALITY"""
+    img = Image.effect_noise((400, 400), 64).convert('RGB')
+    buffer = tempfile.SpooledTemporaryFile()
+    img.save(buffer, format='JPEG', quality=100)
+    sizes = []
+    for quality in (50, 95):
+      buffer.seek(0)
+      with self.settings(RECIPE_IMAGE_QUALITY=quality):
+        self.upload(buffer.read())
+      sizes.append(self.recipe.image.size)
+
+    self.assertLess(sizes[0], sizes[1])
+
+  def test_worker_refreshes_connections(self):
+    """Test pool tasks close stale database connections before and after running"""
+    with patch('recipe.images.close_old_connections') as close, \
+         patch('recipe.images.process_recipe_image') as process:
+      images._process_in_worker(self.recipe.id, 'name.jpg')
+
+    process.assert_called_once_with(self.recipe.id, 'name.jpg')
+    self.assertEqual(close.call_count, 2)
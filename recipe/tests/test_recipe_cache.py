@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import RequestFactory, TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe.cache import recipe_detail_cache
+
+
+CACHE_STATS_URL = reverse('recipe:cache-stats')
+
+
+def detail_url(recipe_id):
+  """Return recipe detail url"""
+  return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class RecipeDetailCacheTests(TestCase):
+  """Test recipe detail responses are cached and invalidated"""
+
+  def setUp(self):
+    cache.clear()
+    self.client = APIClient()
+    self.user = get_user_model().objects.create_user(email='test@gmail.com', password='testpass123')
+    self.client.force_authenticate(self.user)
+    self.recipe = Recipe.objects.create(user=self.user, title='Pad thai', time_minutes=20, price=8.00)
+    self.tag = Tag.objects.create(user=self.user, name='Thai')
+    self.recipe.tags.add(self.tag)
+
+  def test_second_retrieve_served_from_cache(self):
+    """Test a repeated retrieve runs no queries"""
+    first = self.client.get(detail_url(self.recipe.id))
+
+    with self.assertNumQueries(0):
+      second = self.client.get(detail_url(self.recipe.id))
+
+    self.assertEqual(second.status_code, status.HTTP_200_OK)
+    self.assertEqual(first.data, second.data)
+
+  def test_update_invalidates_cache(self):
+    """Test updating a recipe replaces the cached detail"""
+    self.client.get(detail_url(self.recipe.id))
+
+    self.client.patch(detail_url(self.recipe.id), {'title': 'Green curry'})
+    res = self.client.get(detail_url(self.recipe.id))
+
+    self.assertEqual(res.data['title'], 'Green curry')
+
+  def test_retrieve_before_commit_not_kept(self):
+    """Test a detail cached from old rows between invalidation and commit is not served"""
+    old = self.client.get(detail_url(self.recipe.id)).data
+    request = RequestFactory().get('/')
+    request.user = self.user
+
+    with self.captureOnCommitCallbacks(execute=True):
+      self.recipe.tags.remove(self.tag)
+      # a concurrent retrieve still reads the committed rows and caches them
+      _, version = recipe_detail_cache.get(self.recipe.id, request)
+      recipe_detail_cache.set(self.recipe.id, version, request, old)
+
+    res = self.client.get(detail_url(self.recipe.id))
+
+    self.assertEqual(res.data['tags'], [])
+
+  def test_padded_id_invalidated(self):
+    """Test a detail cached under a zero padded id is invalidated like the plain id"""
+    padded = detail_url(f'0{self.recipe.id}')
+    self.client.get(padded)
+
+    self.client.patch(detail_url(self.recipe.id), {'title': 'Green curry'})
+    res = self.client.get(padded)
+
+    self.assertEqual(res.data['title'], 'Green curry')
+
+  def test_non_numeric_id_not_found(self):
+    """Test an id that is not a number gets a 404"""
+    res = self.client.get(detail_url('abc'))
+
+    self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+  def test_m2m_change_invalidates_cache(self):
+    """Test adding and removing tags and ingredients invalidates the detail"""
+    self.client.get(detail_url(self.recipe.id))
+
+    ingredient = Ingredient.objects.create(user=self.user, name='Noodles')
+    self.recipe.ingredients.add(ingredient)
+    self.recipe.tags.remove(self.tag)
+    res = self.client.get(detail_url(self.recipe.id))
+
+    self.assertEqual([i['name'] for i in res.data['ingredients']], ['Noodles'])
+    self.assertEqual(res.data['tags'], [])
+
+  def test_tag_rename_invalidates_cache(self):
+    """Test renaming a tag invalidates recipes showing it"""
+    self.client.get(detail_url(self.recipe.id))
+
+    self.tag.name = 'Thai food'
+    self.tag.save()
+    res = self.client.get(detail_url(self.recipe.id))
+
+    self.assertEqual(res.data['tags'][0]['name'], 'Thai food')
+
+  def test_delete_invalidates_cache(self):
+    """Test a deleted recipe is not served from cache"""
+    self.client.get(detail_url(self.recipe.id))
+
+    self.recipe.delete()
+    res = self.client.get(detail_url(self.recipe.id))
+
+    self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+  def test_cached_detail_limited_to_owner(self):
+    """Test another user cannot read a cached recipe"""
+    self.client.get(detail_url(self.recipe.id))
+    user2 = get_user_model().objects.create_user(email='new@gmail.com', password='new12333')
+    self.client.force_authenticate(user2)
+
+    res = self.client.get(detail_url(self.recipe.id))
+
+    self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+  def test_cache_stats(self):
+    """Test hit and miss counters are exposed to admins"""
+    before = recipe_detail_cache.stats()
+    self.client.get(detail_url(self.recipe.id))
+    self.client.get(detail_url(self.recipe.id))
+    admin = get_user_model().objects.create_superuser('admin@gmail.com', 'admin123')
+    self.client.force_authenticate(admin)
+
+    res = self.client.get(CACHE_STATS_URL)
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertEqual(res.data['hits'], before['hits'] + 1)
+    self.assertEqual(res.data['misses'], before['misses'] + 1)
+
+  def test_cache_stats_admin_only(self):
+    """Test regular users cannot read cache counters"""
+    res = self.client.get(CACHE_STATS_URL)
+
+    self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
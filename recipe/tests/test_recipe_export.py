@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class RecipeExportTests(TestCase):
+  """Test streaming exports of a user's recipes"""
+
+  def setUp(self):
+    cache.clear()
+    self.client = APIClient()
+    self.user = get_user_model().objects.create_user(email='test@gmail.com', password='testpass123')
+    self.client.force_authenticate(self.user)
+    self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+    self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+    self.beans = Ingredient.objects.create(user=self.user, name='Beans')
+
+  def sample_recipe(self, title, **params):
+    recipe = Recipe.objects.create(user=self.user, title=title, time_minutes=10, price=5.00, **params)
+    recipe.tags.add(self.vegan)
+    recipe.ingredients.add(self.rice, self.beans)
+    return recipe
+
+  def export(self, **params):
+    res = self.client.get(EXPORT_URL, params)
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertTrue(res.streaming)
+    return res, b''.join(res.streaming_content).decode()
+
+  def test_export_ndjson(self):
+    """Test recipes are exported one JSON object per line in id order"""
+    first = self.sample_recipe('Burrito bowl', link='https://example.com')
+    second = self.sample_recipe('Rice and beans')
+
+    res, body = self.export()
+
+    self.assertEqual(res['Content-Type'], 'application/x-ndjson; charset=utf-8')
+    self.assertIn('recipes.ndjson', res['Content-Disposition'])
+    rows = [json.loads(line) for line in body.splitlines()]
+    self.assertEqual([row['id'] for row in rows], [first.id, second.id])
+    self.assertEqual(rows[0], {
+      'id': first.id,
+      'title': 'Burrito bowl',
+      'time_minutes': 10,
+      'price': '5.00',
+      'link': 'https://example.com',
+      'image': None,
+      'tags': ['Vegan'],
+      'ingredients': ['Beans', 'Rice'],
+    })
+
+  def test_export_csv(self):
+    """Test ?format=csv exports a header and one row per recipe"""
+    recipe = self.sample_recipe('Rice, beans and "salsa"')
+
+    res, body = self.export(format='csv')
+
+    self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+    rows = list(csv.DictReader(io.StringIO(body)))
+    self.assertEqual(len(rows), 1)
+    self.assertEqual(rows[0]['id'], str(recipe.id))
+    self.assertEqual(rows[0]['title'], 'Rice, beans and "salsa"')
+    self.assertEqual(rows[0]['ingredients'], 'Beans|Rice')
+
+  def test_export_limited_to_user(self):
+    """Test other users' recipes are not exported"""
+    other = get_user_model().objects.create_user(email='other@gmail.com', password='testpass123')
+    Recipe.objects.create(user=other, title='Not mine', time_minutes=5, price=1.00)
+    self.sample_recipe('Mine')
+
+    _, body = self.export()
+
+    self.assertEqual([json.loads(line)['title'] for line in body.splitlines()], ['Mine'])
+
+  @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+  def test_export_queries_per_chunk(self):
+    """Test recipes are read and prefetched a chunk at a time"""
+    for i in range(5):
+      self.sample_recipe(f'Recipe {i}')
+
+    res = self.client.get(EXPORT_URL)
+    with CaptureQueriesContext(connection) as ctx:
+      lines = b''.join(res.streaming_content).splitlines()
+
+    self.assertEqual(len(lines), 5)
+    # one recipe query plus a tag and an ingredient prefetch for each of 3 chunks
+    self.assertEqual(len(ctx.captured_queries), 7)
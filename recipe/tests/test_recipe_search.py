@@ -0,0 +1,134 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+from recipe.search import inverted_index
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def sample_recipe(user, title, tags=(), ingredients=()):
+  """Create a recipe with tags and ingredients named as given"""
+  recipe = Recipe.objects.create(user=user, title=title, time_minutes=10, price=5.00)
+  for name in tags:
+    recipe.tags.add(Tag.objects.get_or_create(user=user, name=name)[0])
+  for name in ingredients:
+    recipe.ingredients.add(Ingredient.objects.get_or_create(user=user, name=name)[0])
+  return recipe
+
+
+class RecipeSearchTests(TestCase):
+  """Test full text search of the recipe list"""
+
+  def setUp(self):
+    cache.clear()
+    inverted_index.clear()
+    self.client = APIClient()
+    self.user = get_user_model().objects.create_user(email='test@gmail.com', password='testpass123')
+    self.client.force_authenticate(self.user)
+
+  def search(self, query, **params):
+    res = self.client.get(RECIPES_URL, {'q': query, **params})
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    return res
+
+  def titles(self, res):
+    return [recipe['title'] for recipe in res.data['results']]
+
+  def test_search_matches_title_tags_and_ingredients(self):
+    """Test a query matches words of the title, tag names and ingredient names"""
+    sample_recipe(self.user, 'Tomato soup')
+    sample_recipe(self.user, 'Gazpacho', tags=['Tomato'])
+    sample_recipe(self.user, 'Bruschetta', ingredients=['Tomato'])
+    sample_recipe(self.user, 'Pancakes', ingredients=['Flour'])
+
+    res = self.search('tomato')
+
+    self.assertEqual(sorted(self.titles(res)), ['Bruschetta', 'Gazpacho', 'Tomato soup'])
+
+  def test_search_requires_every_word(self):
+    """Test recipes must match all words of the query"""
+    sample_recipe(self.user, 'Tomato soup')
+    sample_recipe(self.user, 'Onion soup')
+
+    res = self.search('tomato soup')
+
+    self.assertEqual(self.titles(res), ['Tomato soup'])
+
+  def test_search_ranks_title_above_tags_and_ingredients(self):
+    """Test title matches rank above tag matches, which rank above ingredient matches"""
+    sample_recipe(self.user, 'Bruschetta', ingredients=['Basil'])
+    sample_recipe(self.user, 'Basil pesto')
+    sample_recipe(self.user, 'Caprese', tags=['Basil'])
+
+    res = self.search('basil')
+
+    self.assertEqual(self.titles(res), ['Basil pesto', 'Caprese', 'Bruschetta'])
+
+  def test_search_pages_in_rank_order(self):
+    """Test pages go through results without gaps or repeats"""
+    for i in range(3):
+      sample_recipe(self.user, f'Rice bowl {i}')
+      sample_recipe(self.user, f'Stir fry {i}', ingredients=['Rice'])
+
+    first = self.search('rice', page_size=4)
+    second = self.client.get(first.data['next'])
+    titles = self.titles(first) + self.titles(second)
+
+    self.assertEqual(len(titles), 6)
+    self.assertEqual(len(set(titles)), 6)
+    self.assertTrue(all(title.startswith('Rice') for title in titles[:3]))
+
+  def test_search_pages_through_equal_ranks(self):
+    """Test recipes sharing a rank are paged by id without gaps or repeats"""
+    recipes = [sample_recipe(self.user, f'Rice bowl {i}') for i in range(5)]
+
+    titles = []
+    url, params = RECIPES_URL, {'q': 'rice bowl', 'page_size': 2}
+    while url:
+      res = self.client.get(url, params)
+      titles += self.titles(res)
+      url, params = res.data['next'], None
+
+    self.assertEqual(titles, [recipe.title for recipe in reversed(recipes)])
+
+  def test_search_limited_to_user(self):
+    """Test other users' recipes are not returned"""
+    other = get_user_model().objects.create_user(email='other@gmail.com', password='testpass123')
+    sample_recipe(other, 'Lentil curry')
+    sample_recipe(self.user, 'Lentil salad')
+
+    res = self.search('lentil')
+
+    self.assertEqual(self.titles(res), ['Lentil salad'])
+
+  def test_search_follows_tag_rename(self):
+    """Test renaming a tag updates the documents of its recipes"""
+    recipe = sample_recipe(self.user, 'Dal', tags=['Indian'])
+    self.assertEqual(self.titles(self.search('indian')), ['Dal'])
+
+    with self.captureOnCommitCallbacks(execute=True):
+      tag = recipe.tags.get()
+      tag.name = 'Nepali'
+      tag.save()
+
+    self.assertEqual(self.titles(self.search('indian')), [])
+    self.assertEqual(self.titles(self.search('nepali')), ['Dal'])
+
+  def test_search_follows_recipe_changes(self):
+    """Test new, edited and deleted recipes are reflected in results"""
+    recipe = sample_recipe(self.user, 'Fish tacos')
+    self.assertEqual(self.titles(self.search('tacos')), ['Fish tacos'])
+
+    with self.captureOnCommitCallbacks(execute=True):
+      sample_recipe(self.user, 'Beef tacos')
+      recipe.delete()
+
+    self.assertEqual(self.titles(self.search('tacos')), ['Beef tacos'])
@@ -5,7 +5,7 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Tag, Recipe
 
 from recipe.serializers import TagSerializer
 
@@ -41,10 +41,10 @@ class PrivateTagsApiTests(TestCase):
 
     res = self.client.get(TAGS_URL)
 
-    tags = Tag.objects.all().order_by('-name')
+    tags = Tag.objects.all().order_by('-id')
     serializer = TagSerializer(tags, many=True)
     self.assertEqual(res.status_code, status.HTTP_200_OK)
-    self.assertEqual(res.data, serializer.data)
+    self.assertEqual(res.data['results'], serializer.data)
 
   def test_tags_limited_to_user(self):
     """Test that tags are returned for authenticated user"""
@@ -55,8 +55,8 @@ class PrivateTagsApiTests(TestCase):
     res = self.client.get(TAGS_URL)
 
     self.assertEqual(res.status_code, status.HTTP_200_OK)
-    self.assertEqual(len(res.data), 1)
-    self.assertEqual(res.data[0]['name'], tag.name)
+    self.assertEqual(len(res.data['results']), 1)
+    self.assertEqual(res.data['results'][0]['name'], tag.name)
 
   def test_create_tag_successful(self):
     """Test creating a new tag"""
@@ -71,4 +71,39 @@ class PrivateTagsApiTests(TestCase):
     payload = {'name':''}
     res = self.client.post(TAGS_URL, payload)
 
-    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+  def test_create_existing_tag_returns_it(self):
+    """Test creating a tag named like an existing one returns that tag"""
+    tag = Tag.objects.create(user=self.user, name='Vegan')
+
+    res = self.client.post(TAGS_URL, {'name': ' VEGAN '})
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertEqual(res.data['id'], tag.id)
+    self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+  def test_retrieve_tags_assigned_to_recipes(self):
+    """Test filtering tags by those assigned to recipes"""
+    tag1 = Tag.objects.create(user=self.user, name='Breakfast')
+    tag2 = Tag.objects.create(user=self.user, name='Lunch')
+    recipe = Recipe.objects.create(user=self.user, title='Coriander eggs on toast', time_minutes=10, price=5.00)
+    recipe.tags.add(tag1)
+
+    res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+    names = [item['name'] for item in res.data['results']]
+    self.assertIn(tag1.name, names)
+    self.assertNotIn(tag2.name, names)
+
+  def test_retrieve_tags_assigned_unique(self):
+    """Test filtering tags by assigned returns unique items"""
+    tag = Tag.objects.create(user=self.user, name='Breakfast')
+    Tag.objects.create(user=self.user, name='Lunch')
+    for title in ('Pancakes', 'Porridge'):
+      recipe = Recipe.objects.create(user=self.user, title=title, time_minutes=5, price=3.00)
+      recipe.tags.add(tag)
+
+    res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+    self.assertEqual(len(res.data['results']), 1)
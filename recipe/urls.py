@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter # automatically generates url for viewsets
 
@@ -11,6 +12,17 @@ router.register('recipes', views.RecipeViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('cache-stats/', views.RecipeCacheStatsView.as_view(), name='cache-stats'),
+]
+
+if settings.ASYNC_READ_VIEWS:
+    # GET answered on the event loop, other methods still reach the viewset
+    urlpatterns += [
+        path('recipes/', views.RecipeListAsyncView.as_view(), name='recipe-list-async'),
+        path('recipes/<int:pk>/', views.RecipeDetailAsyncView.as_view(), name='recipe-detail-async'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls))
 ]
 
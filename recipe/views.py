@@ -1,29 +1,185 @@
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.exceptions import NotFound, ValidationError
+
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Exists, OuterRef
 
 from core.models import Tag, Ingredient, Recipe
+from core.etags import ConditionalGetMixin, bump_content_version
+from core.authentication import CachedTokenAuthentication
+from core.normalization import normalize_name
+from core.routers import ReplicaReadMixin
+from core.views import AsyncReadView, db_slot
+
+from recipe import serializers, search
+from recipe.pagination import RankedSearchPagination, UserKeysetPagination
+from recipe.cache import recipe_detail_cache
+from recipe.images import schedule_image_processing
+from recipe.autocomplete import autocomplete, trie_cache
+from recipe.export import CSVRenderer, NDJSONRenderer, export_rows
+
+
+def _params_to_ints(name, qs):
+  """Convert a comma separated list of ids to a list of integers"""
+  try:
+    return [int(str_id) for str_id in qs.split(',')]
+  except ValueError:
+    raise ValidationError({name: 'Expected a comma separated list of ids.'})
+
+
+class BulkModelMixin:
+  """Create, update and delete lists of objects in one request
+
+  POST takes a list of objects, PATCH a list of objects with their id and
+  DELETE a list of ids. Either every item is written in one transaction
+  or nothing is, with per-item errors reported in request order.
+  """
+  bulk_max_items = 1000
+
+  def get_bulk_data(self, request):
+    """Return request list or raise when it is not a list or too long"""
+    data = request.data
+    if not isinstance(data, list):
+      raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+    if len(data) > self.bulk_max_items:
+      raise ValidationError({'non_field_errors': [f'Ensure there are no more than {self.bulk_max_items} items.']})
+    return data
 
-from recipe import serializers
+  @action(methods=['POST', 'PATCH', 'DELETE'], detail=False, url_path='bulk')
+  def bulk(self, request):
+    """Dispatch bulk requests by method"""
+    data = self.get_bulk_data(request)
+    handler = {
+      'POST': self.bulk_create,
+      'PATCH': self.bulk_update,
+      'DELETE': self.bulk_destroy,
+    }[request.method]
 
+    with transaction.atomic():
+      response = handler(data)
+    # bulk writes skip model signals, so the etag version is bumped here
+    if response.status_code < 400:
+      bump_content_version(request.user.pk)
+    return response
+
+  def bulk_errors(self, errors, data):
+    """Return serializer errors as a list with one entry per item"""
+    if isinstance(errors, dict) and all(isinstance(key, int) for key in errors):
+      # newer DRF versions only report the failing indexes
+      errors = [errors.get(index, {}) for index in range(len(data))]
+    return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+  def bulk_create(self, data):
+    serializer = self.get_serializer(data=data, many=True)
+    if not serializer.is_valid():
+      return self.bulk_errors(serializer.errors, data)
+    serializer.save(user=self.request.user)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+  def bulk_update(self, data):
+    ids = [item.get('id') if isinstance(item, dict) else None for item in data]
+    instances = self.get_queryset().in_bulk([pk for pk in ids if isinstance(pk, int)])
+    errors = [{} if pk in instances else {'id': ['Not found.']} for pk in ids]
+    if any(errors):
+      return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = self.get_serializer([instances[pk] for pk in ids], data=data, many=True, partial=True)
+    if not serializer.is_valid():
+      return self.bulk_errors(serializer.errors, data)
+    serializer.save()
+    return Response(serializer.data)
+
+  def bulk_destroy(self, data):
+    queryset = self.get_queryset().filter(id__in=[pk for pk in data if isinstance(pk, int)])
+    found = set(queryset.values_list('id', flat=True))
+    errors = [{} if pk in found else {'id': ['Not found.']} for pk in data]
+    if any(errors):
+      return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset.delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
 
-class BaseRecipeAttributeViewSet(viewsets.GenericViewSet, 
+
+class BaseRecipeAttributeViewSet(BulkModelMixin,
+                                ReplicaReadMixin,
+                                ConditionalGetMixin,
+                                viewsets.GenericViewSet, 
                                 mixins.ListModelMixin,
                                 mixins.CreateModelMixin,
                                 ):
   """Base viewset fot user owned recipe viewset"""
-  authentication_classes = (TokenAuthentication,)
+  authentication_classes = (CachedTokenAuthentication,)
   permission_classes = (IsAuthenticated,)
+  pagination_class = UserKeysetPagination
+
+  def get_queryset(self):
+    """Return obj for current authenticated user"""
+    queryset = self.queryset.filter(user=self.request.user)
+
+    if self.request.query_params.get('assigned_only') in ('1', 'true'):
+      # single EXISTS probe on the through table's fk index, no DISTINCT needed
+      through = getattr(Recipe, self.recipe_relation).through
+      queryset = queryset.filter(Exists(through.objects.filter(
+        **{f'{self.queryset.model._meta.model_name}_id': OuterRef('pk')}
+      )))
+
+    return queryset.order_by('-id')
 
-  # def get_queryset(self):
-  #   """Return obj for current authenticated user"""
-  #   return self.queryset.filter(user=self.request.user).order_by('-name')
+  def get_search_limit(self):
+    """Return number of autocomplete matches asked for"""
+    limit = self.request.query_params.get('limit', settings.AUTOCOMPLETE_LIMIT)
+    try:
+      limit = int(limit)
+    except ValueError:
+      raise ValidationError({'limit': 'Expected an integer.'})
+    return max(1, min(limit, settings.AUTOCOMPLETE_MAX_LIMIT))
+
+  def list(self, request, *args, **kwargs):
+    """List objects, or the best matches of ?search= for autocomplete"""
+    query = request.query_params.get('search', '').strip()
+    if not query:
+      return super().list(request, *args, **kwargs)
+
+    limit = self.get_search_limit()
+    matches = []
+    if 'assigned_only' not in request.query_params:
+      trie = trie_cache.get(
+        self.queryset.model, request.user.pk,
+        lambda: self.queryset.filter(user=request.user).values_list('pk', 'name'),
+      )
+      if trie is not None:
+        matches = [self.queryset.model(pk=pk, name=name) for pk, name in trie.search(query, limit)]
+    if len(matches) < limit:
+      # the trie holds every prefix match, the database adds the substring
+      # and trigram ones after them, in the order it would rank them itself
+      matches += autocomplete(
+        self.get_queryset().exclude(pk__in=[match.pk for match in matches]), query, limit - len(matches),
+      )
+
+    serializer = self.get_serializer(matches, many=True)
+    return Response({'next': None, 'previous': None, 'results': serializer.data})
+
+  def create(self, request, *args, **kwargs):
+    response = super().create(request, *args, **kwargs)
+    if not self.created:
+      response.status_code = status.HTTP_200_OK
+    return response
 
   def perform_create(self, serializer):
-    """Create new ingredient"""
-    serializer.save(user=self.request.user)
+    """Create new object, or return the existing one with the same normalized name"""
+    name = serializer.validated_data['name']
+    # get_or_create retries the lookup when the unique constraint rejects a concurrent insert
+    serializer.instance, self.created = self.queryset.model.objects.get_or_create(
+      user=self.request.user,
+      normalized_name=normalize_name(name),
+      defaults={'name': name},
+    )
 
 
 class TagViewSet(BaseRecipeAttributeViewSet):
@@ -31,24 +187,54 @@ class TagViewSet(BaseRecipeAttributeViewSet):
  
   queryset = Tag.objects.all()
   serializer_class = serializers.TagSerializer
+  recipe_relation = 'tags'
 
 
 class IngredientViewSet(BaseRecipeAttributeViewSet):
   """Manage Ingredients in the database"""
   queryset = Ingredient.objects.all()
   serializer_class = serializers.IngredientSerializer
+  recipe_relation = 'ingredients'
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(BulkModelMixin, ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
   """Manage recipe in database"""
   serializer_class = serializers.RecipeSerializer
-  authentication_classes = (TokenAuthentication,)
+  authentication_classes = (CachedTokenAuthentication,)
   permission_classes = (IsAuthenticated,)
+  pagination_class = UserKeysetPagination
   queryset = Recipe.objects.all()
 
-  # def get_queryset(self):
-  #   """Retrieve recipies for authenticated user"""
-  #   return self.queryset.filter(user=self.request.user)
+  def get_queryset(self):
+    """Retrieve recipies for authenticated user with the related rows the serializer needs"""
+    serializer_class = self.get_serializer_class()
+    queryset = self.queryset.filter(user=self.request.user).order_by('-id')
+
+    if self.action == 'list':
+      queryset = self.filter_related(queryset)
+      query = self.request.query_params.get('q', '').strip()
+      if query:
+        queryset = search.search(queryset, self.request.user, query).order_by('-search_rank', '-id')
+        self.pagination_class = RankedSearchPagination
+
+    if hasattr(serializer_class, 'setup_eager_loading'):
+      queryset = serializer_class.setup_eager_loading(queryset)
+
+    return queryset
+
+  def filter_related(self, queryset):
+    """Keep recipes that have any of the requested tags and ingredients"""
+    for relation, column in (('tags', 'tag_id'), ('ingredients', 'ingredient_id')):
+      ids = self.request.query_params.get(relation)
+      if ids:
+        # EXISTS over the (recipe_id, *_id) unique index of the through table
+        through = getattr(Recipe, relation).through
+        queryset = queryset.filter(Exists(through.objects.filter(
+          recipe_id=OuterRef('pk'),
+          **{f'{column}__in': _params_to_ints(relation, ids)}
+        )))
+
+    return queryset
 
   def get_serializer_class(self):
     """Return appropriate serializer class"""
@@ -59,22 +245,24 @@ class RecipeViewSet(viewsets.ModelViewSet):
     
     return self.serializer_class
 
-  def perform_create(self, serializer):
-    """Create new recipe"""
-    serializer.save(user=self.request.user)
-
-  def destroy(self, request, *args, **kwargs):
+  def retrieve(self, request, *args, **kwargs):
+    """Return recipe detail, serving it from cache when possible"""
     try:
-        instance = self.get_object().filter(user=self.request.user)
+      pk = int(kwargs[self.lookup_field])
+    except ValueError:
+      # not an id, get_object answers 404
+      return super().retrieve(request, *args, **kwargs)
+    data, version = recipe_detail_cache.get(pk, request)
+    if data is not None:
+      return Response(data)
 
-        self.perform_destroy(instance)
-    
-    except:
-        print('BAD REQ')
-        return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
-
-    return Response(status=status.HTTP_204_NO_CONTENT)
+    response = super().retrieve(request, *args, **kwargs)
+    recipe_detail_cache.set(pk, version, request, response.data)
+    return response
 
+  def perform_create(self, serializer):
+    """Create new recipe"""
+    serializer.save(user=self.request.user)
 
   @action(methods=['POST'], detail=True, url_path='upload-image')
   def upload_image(self, request, pk=None):
@@ -86,9 +274,78 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
 
     if serializer.is_valid():
-      serializer.save()
+      recipe = serializer.save(
+        image_status=Recipe.ImageStatus.PENDING,
+        image_thumbnail=None,
+        image_medium=None,
+      )
+      schedule_image_processing(recipe)
       return Response(serializer.data, status.HTTP_200_OK
       )
     
     return Response(serializer.errors, status.HTTP_400_BAD_REQUEST
-    )
\ No newline at end of file
+    )
+
+  @action(methods=['GET'], detail=False, renderer_classes=(NDJSONRenderer, CSVRenderer))
+  def export(self, request):
+    """Stream all recipes of the user, as NDJSON or with ?format=csv as CSV"""
+    queryset = self.filter_related(self.queryset.filter(user=request.user)).order_by('id')
+    rows = export_rows(queryset, request, settings.RECIPE_EXPORT_CHUNK_SIZE)
+
+    renderer = request.accepted_renderer
+    response = StreamingHttpResponse(
+      renderer.stream(rows),
+      content_type=f'{renderer.media_type}; charset={renderer.charset}',
+    )
+    response['Content-Disposition'] = f'attachment; filename="recipes.{renderer.format}"'
+    return response
+
+
+class RecipeCacheStatsView(APIView):
+  """Expose recipe detail cache counters of this process"""
+  authentication_classes = (CachedTokenAuthentication,)
+  permission_classes = (IsAdminUser,)
+
+  def get(self, request):
+    return Response(recipe_detail_cache.stats())
+
+
+class RecipeListAsyncView(AsyncReadView):
+  """Recipe list answered on the event loop, search and creation by RecipeViewSet"""
+  read_from_replicas = True
+  sync_view = staticmethod(RecipeViewSet.as_view({'get': 'list', 'post': 'create'}))
+
+  def delegate(self, request):
+    # search may load the in-process index, which queries synchronously
+    return super().delegate(request) or 'q' in request.GET
+
+  async def get(self, request):
+    drf_request = self.drf_request(request)
+    viewset = RecipeViewSet(request=drf_request, action='list', format_kwarg=None, args=(), kwargs={})
+    paginator = UserKeysetPagination()
+    async with db_slot():
+      page = await paginator.apaginate_queryset(viewset.get_queryset(), drf_request, viewset)
+
+    serializer = serializers.RecipeSerializer(page, many=True, context={'request': drf_request})
+    return self.render(paginator.get_paginated_response(serializer.data).data)
+
+
+class RecipeDetailAsyncView(AsyncReadView):
+  """Recipe detail answered on the event loop, changes by RecipeViewSet"""
+  read_from_replicas = True
+  sync_view = staticmethod(RecipeViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+  }))
+
+  async def get(self, request, pk):
+    data, version = await recipe_detail_cache.aget(pk, request)
+    if data is None:
+      queryset = serializers.RecipeDetailSerializer.setup_eager_loading(Recipe.objects.filter(user=request.user))
+      async with db_slot():
+        recipe = await queryset.filter(pk=pk).afirst()
+      if recipe is None:
+        raise NotFound()
+
+      data = serializers.RecipeDetailSerializer(recipe, context={'request': self.drf_request(request)}).data
+      await recipe_detail_cache.aset(pk, version, request, data)
+    return self.render(data)
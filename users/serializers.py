@@ -3,8 +3,11 @@ from django.utils.translation import gettext_lazy as _
 
 from rest_framework import serializers
 
+from core.authentication import issued_token_cache
+from core.metrics import TimedSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
   """Serializer for ther users objects"""
 
   class Meta:
@@ -40,6 +43,13 @@ class AuthTokenSerializer(serializers.Serializer):
     email = attrs.get('email') 
     password = attrs.get('password')
 
+    # credentials verified recently are not hashed again
+    token = issued_token_cache.get(email, password)
+    if token is not None:
+      attrs['user'] = token.user
+      attrs['token'] = token
+      return attrs
+
     user = authenticate(
       request=self.context.get('request'),
       username=email,
@@ -0,0 +1,107 @@
+from unittest.mock import patch
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+
+TOKEN_URL = reverse('users:token')
+PAYLOAD = {'email': 'test@gmail.com', 'password': 'testpass123'}
+
+
+@override_settings(LOGIN_THROTTLE_RATE='3/min', LOGIN_IP_THROTTLE_RATE='10/min')
+class TokenLoginTests(TestCase):
+  """Test the cost controls of token login"""
+
+  def setUp(self):
+    cache.clear()
+    self.client = APIClient()
+    self.user = get_user_model().objects.create_user(**PAYLOAD)
+
+  def login(self, forwarded_for=None, **payload):
+    headers = {'HTTP_X_FORWARDED_FOR': forwarded_for} if forwarded_for else {}
+    return self.client.post(TOKEN_URL, {**PAYLOAD, **payload}, **headers)
+
+  def test_repeated_login_skips_hashing(self):
+    """Test verified credentials get their token without another password check"""
+    with patch('users.serializers.authenticate', wraps=authenticate) as auth:
+      first = self.login()
+      second = self.login()
+
+    self.assertEqual(second.status_code, status.HTTP_200_OK)
+    self.assertEqual(second.data['token'], first.data['token'])
+    self.assertEqual(auth.call_count, 1)
+
+  def test_password_change_invalidates_issued_token(self):
+    """Test the old password stops working at once after a change"""
+    self.login()
+    self.user.set_password('newpass123')
+    self.user.save()
+
+    self.assertEqual(self.login().status_code, status.HTTP_400_BAD_REQUEST)
+    self.assertEqual(self.login(password='newpass123').status_code, status.HTTP_200_OK)
+
+  def test_inactive_user_refused(self):
+    """Test deactivated users cannot log in with cached credentials"""
+    self.login()
+    self.user.is_active = False
+    self.user.save()
+
+    self.assertEqual(self.login().status_code, status.HTTP_400_BAD_REQUEST)
+
+  def test_failed_logins_throttled_before_hashing(self):
+    """Test an account is refused once its failures reach the rate, without checking the password"""
+    for _ in range(3):
+      self.assertEqual(self.login(password='wrong').status_code, status.HTTP_400_BAD_REQUEST)
+
+    with patch('users.serializers.authenticate') as auth:
+      res = self.login()
+
+    self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+    auth.assert_not_called()
+    # other accounts are not affected
+    get_user_model().objects.create_user('other@gmail.com', 'testpass123')
+    self.assertEqual(self.login(email='other@gmail.com').status_code, status.HTTP_200_OK)
+
+  def test_successful_logins_not_throttled(self):
+    """Test only failures count towards the rate"""
+    for _ in range(5):
+      self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+  def test_forwarded_for_not_trusted_without_proxies(self):
+    """Test clients cannot reset their address' failure count with a forged X-Forwarded-For"""
+    for i in range(10):
+      res = self.login(email=f'user{i}@gmail.com', forwarded_for=f'10.0.0.{i}')
+      self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    res = self.login(email='user10@gmail.com', forwarded_for='10.0.0.10')
+    self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+  @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1})
+  def test_forwarded_for_trusted_behind_proxy(self):
+    """Test behind a proxy failures are counted per forwarded client address"""
+    for i in range(10):
+      self.login(email=f'user{i}@gmail.com', forwarded_for='10.0.0.1')
+
+    self.assertEqual(self.login(forwarded_for='10.0.0.2').status_code, status.HTTP_200_OK)
+    self.assertEqual(self.login(forwarded_for='10.0.0.1').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+  @override_settings(PASSWORD_HASHERS=[
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+  ])
+  def test_rehash_on_login(self):
+    """Test a hash of an older hasher is replaced by the preferred one on login"""
+    self.user.password = make_password(PAYLOAD['password'], hasher='pbkdf2_sha1')
+    self.user.save()
+
+    self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    self.user.refresh_from_db()
+    self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+    self.assertEqual(self.login().status_code, status.HTTP_200_OK)
@@ -1,10 +1,19 @@
-from django.test import TestCase
+import json
+
+from asgiref.sync import async_to_sync
+
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status 
 
+from core.authentication import token_cache
+from users.views import ManageUserAsyncView
+
 
 
 CREATE_USER_URL = reverse('users:create')
@@ -20,6 +29,7 @@ class PublicUserApiTest(TestCase):
   """Test the users API (public i.e unauthenticated)"""
 
   def setUp(self):
+    cache.clear()
     self.client = APIClient()
 
 
@@ -160,4 +170,38 @@ class PrivateUserApiTests(TestCase):
 
     self.assertEqual(self.user.name, payload['name'])
     self.assertTrue(self.user.check_password(payload['password']))
-    self.assertEqual(res.status_code, status.HTTP_200_OK)
\ No newline at end of file
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+class AsyncManageUserViewTests(TestCase):
+  """Test the async view of the authenticated user"""
+
+  def setUp(self):
+    token_cache.clear()
+    self.user = create_user(email='test@gmail.com', password='testpass', name='name')
+    self.headers = {'Authorization': f'Token {Token.objects.create(user=self.user).key}'}
+
+  async def get(self, **headers):
+    request = AsyncRequestFactory().get(ME_URL, headers={**self.headers, **headers})
+    return await ManageUserAsyncView.as_view()(request)
+
+  def test_retrieve_with_warm_token_runs_no_queries(self):
+    """Test the profile is served from the token cache once it is warm"""
+    async_to_sync(self.get)()
+
+    with self.assertNumQueries(0):
+      res = async_to_sync(self.get)()
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    self.assertEqual(json.loads(res.content), {'email': 'test@gmail.com', 'name': 'name'})
+
+  async def test_update_reaches_sync_view(self):
+    """Test updates are handled by ManageUserView"""
+    request = AsyncRequestFactory().patch(
+      ME_URL, {'name': 'new name'}, content_type='application/json', headers=self.headers,
+    )
+
+    res = await ManageUserAsyncView.as_view()(request)
+
+    self.assertEqual(res.status_code, status.HTTP_200_OK)
+    await self.user.arefresh_from_db()
+    self.assertEqual(self.user.name, 'new name')
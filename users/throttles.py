@@ -0,0 +1,49 @@
+from django.conf import settings
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginFailureThrottle(SimpleRateThrottle):
+  """Refuse logins once too many attempts failed within the rate's window
+
+  allow_request() only reads the history, so it runs before any password
+  is hashed; the view calls record_failure() for rejected credentials.
+  """
+  rate_setting = None
+
+  def get_rate(self):
+    return getattr(settings, self.rate_setting)
+
+  def throttle_success(self):
+    # successful checks are not counted, only failures are
+    return True
+
+  def record_failure(self, request, view):
+    """Count a failed attempt of request"""
+    key = self.get_cache_key(request, view)
+    if key is None:
+      return
+    now = self.timer()
+    history = [at for at in self.cache.get(key, []) if at > now - self.duration]
+    self.cache.set(key, [now] + history, self.duration)
+
+
+class LoginAccountThrottle(LoginFailureThrottle):
+  """Limit failed logins per email, against password guessing"""
+  scope = 'login'
+  rate_setting = 'LOGIN_THROTTLE_RATE'
+
+  def get_cache_key(self, request, view):
+    email = request.data.get('email') if hasattr(request.data, 'get') else None
+    if not email:
+      return None
+    return self.cache_format % {'scope': self.scope, 'ident': str(email).strip().lower()}
+
+
+class LoginIPThrottle(LoginFailureThrottle):
+  """Limit failed logins per client address, against credential stuffing"""
+  scope = 'login_ip'
+  rate_setting = 'LOGIN_IP_THROTTLE_RATE'
+
+  def get_cache_key(self, request, view):
+    return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
@@ -1,11 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from users import views
 
 app_name='users'
 
+# GET /me/ answered on the event loop when serving async reads
+me_view = views.ManageUserAsyncView if settings.ASYNC_READ_VIEWS else views.ManageUserView
+
 urlpatterns = [
 	path('', views.ListUserView.as_view(), name='users'),
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.CreateTokenView.as_view(), name='token'),
-    path('me/', views.ManageUserView.as_view(), name='me')
+    path('me/', me_view.as_view(), name='me')
 ]
@@ -1,12 +1,18 @@
 from rest_framework import (
   generics,
-  authentication, 
   permissions
 )
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
 from users.serializers import UserSerializer, AuthTokenSerializer
+from users.throttles import LoginAccountThrottle, LoginIPThrottle
+from core.etags import ConditionalGetMixin
+from core.authentication import CachedTokenAuthentication, issued_token_cache
+from core.views import AsyncReadView
 
 from django.contrib.auth import get_user_model
 
@@ -25,13 +31,36 @@ class CreateTokenView(ObtainAuthToken):
   """Create new auth token for user"""
   serializer_class = AuthTokenSerializer
   renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+  throttle_classes = (LoginAccountThrottle, LoginIPThrottle)
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+  def post(self, request, *args, **kwargs):
+    serializer = self.get_serializer(data=request.data)
+    if not serializer.is_valid():
+      for throttle in self.get_throttles():
+        throttle.record_failure(request, self)
+      raise ValidationError(serializer.errors)
+
+    token = serializer.validated_data.get('token')
+    if token is None:
+      token, _ = Token.objects.get_or_create(user=serializer.validated_data['user'])
+      issued_token_cache.set(serializer.validated_data['email'], serializer.validated_data['password'], token)
+    return Response({'token': token.key})
+
+class ManageUserView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
   """Manage the authenticated user"""
   serializer_class = UserSerializer
-  authentication_classes = (authentication.TokenAuthentication,)
+  authentication_classes = (CachedTokenAuthentication,)
   permission_classes = (permissions.IsAuthenticated,)
 
   def get_object(self):
     """Retrieve and return authenticated user"""
-    return self.request.user
\ No newline at end of file
+    return self.request.user
+
+
+class ManageUserAsyncView(AsyncReadView):
+  """The authenticated user answered on the event loop, updates by ManageUserView"""
+  sync_view = staticmethod(ManageUserView.as_view())
+
+  async def get(self, request):
+    # a warm token cache means no query at all
+    return self.render(UserSerializer(request.user).data)